@@ -0,0 +1,42 @@
+"""Add indexes on lookup columns
+
+Revision ID: a3d1c7e92b5f
+Revises: 16b28ef31b5b
+Create Date: 2026-10-17 09:12:27.518304
+
+"""
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(__file__, "../../../..")))
+
+from alembic_db.alembic_post_utils import write_revision_post_alembic
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d1c7e92b5f'
+down_revision = '16b28ef31b5b'
+branch_labels = None
+depends_on = None
+
+# Name, table, columns (databases created after this revision already have them)
+INDEXES = [
+    ('ix_device_measurements_device_id_channel', 'device_measurements', 'device_id, channel'),
+    ('ix_function_actions_function_id', 'function_actions', 'function_id'),
+    ('ix_trigger_trigger_type_unique_id_1_unique_id_2', 'trigger', 'trigger_type, unique_id_1, unique_id_2'),
+    ('ix_conditional_data_conditional_id', 'conditional_data', 'conditional_id'),
+    ('ix_output_channel_output_id_channel', 'output_channel', 'output_id, channel'),
+    ('ix_notes_date_time', 'notes', 'date_time')
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})')
+
+
+def downgrade():
+    for name, _, _ in INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS {name}')
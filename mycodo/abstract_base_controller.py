@@ -19,6 +19,7 @@ from collections import OrderedDict
 
 from sqlalchemy import and_
 
+from mycodo.config import EVENT_QUEUE_SIZE
 from mycodo.config import MYCODO_DB_PATH
 from mycodo.databases.models import Conversion
 from mycodo.databases.models import DeviceMeasurements
@@ -27,9 +28,12 @@ from mycodo.databases.models import InputChannel
 from mycodo.databases.models import Output
 from mycodo.databases.models import OutputChannel
 from mycodo.databases.utils import session_scope
+from mycodo.utils.config_cache import device_config
 from mycodo.utils.database import db_retrieve_table_daemon
+from mycodo.utils.event_bus import event_bus
 from mycodo.utils.influx import get_last_measurement
 from mycodo.utils.influx import get_past_measurements
+from mycodo.utils.influx import get_past_statistics
 
 
 class AbstractBaseController(object):
@@ -46,6 +50,7 @@ class AbstractBaseController(object):
         self.channels_conversion = {}
         self.channels_measurement = {}
         self.device_measurements = None
+        self.event_subscriptions = []
 
     def initialize(self):
         pass
@@ -536,11 +541,35 @@ class AbstractBaseController(object):
     def get_past_measurements(device_id, measurement_id, max_age=None):
         return get_past_measurements(device_id, measurement_id, max_age=max_age)
 
+    @staticmethod
+    def get_past_statistics(device_id, measurement_id, max_age):
+        return get_past_statistics(device_id, measurement_id, max_age)
+
+    def subscribe_events(self, event_types, max_size=EVENT_QUEUE_SIZE):
+        """
+        Subscribe to events of the daemon (see mycodo.utils.event_bus.EVENT_TYPES)
+
+        Events are queued until read with get() or get_all() of the returned
+        Subscription. Subscriptions end when the controller stops.
+        """
+        subscription = event_bus.subscribe(event_types, max_size=max_size, name=self.logger.name)
+        self.event_subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe_events(self):
+        for each_subscription in self.event_subscriptions:
+            event_bus.unsubscribe(each_subscription)
+        self.event_subscriptions = []
+
     @staticmethod
     def get_output_channel_from_channel_id(channel_id):
         """Return channel number from channel ID."""
-        output_channel = db_retrieve_table_daemon(
-            OutputChannel).filter(
-            OutputChannel.unique_id == channel_id).first()
+        config = device_config.get()
+        if config is not None:
+            output_channel = config.output_channels.get(channel_id)
+        else:
+            output_channel = db_retrieve_table_daemon(
+                OutputChannel).filter(
+                OutputChannel.unique_id == channel_id).first()
         if output_channel:
             return output_channel.channel
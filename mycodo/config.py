@@ -14,7 +14,7 @@ sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 from config_translations import TRANSLATIONS as T
 
 MYCODO_VERSION = '8.15.9'
-ALEMBIC_VERSION = '16b28ef31b5b'
+ALEMBIC_VERSION = 'a3d1c7e92b5f'
 
 # FORCE UPGRADE MASTER
 # Set True to enable upgrading to the master branch of the Mycodo repository.
@@ -101,12 +101,127 @@ PATH_NOTE_ATTACHMENTS = os.path.join(INSTALL_DIRECTORY, 'note_attachments')
 # Determine if running in a Docker container
 DOCKER_CONTAINER = os.environ.get('DOCKER_CONTAINER', False) == 'TRUE'
 
+# Pyro5 transport between the frontend and daemon: 'tcp', or 'unix' for a Unix domain
+# socket (only if both run on the same host, so TCP is always used in Docker)
+PYRO_TRANSPORT = 'tcp'
+PYRO_UNIX_SOCKET = os.path.join(RUN_PATH, 'mycodo_pyro.sock')
+
 # Pyro5 URI/host, used by mycodo_client.py
 if DOCKER_CONTAINER:
     PYRO_URI = 'PYRO:mycodo.pyro_server@mycodo_daemon:9080'
+elif PYRO_TRANSPORT == 'unix':
+    PYRO_URI = f'PYRO:mycodo.pyro_server@./u:{PYRO_UNIX_SOCKET}'
 else:
     PYRO_URI = 'PYRO:mycodo.pyro_server@127.0.0.1:9080'
 
+# Pyro5 serializer of the methods in PYRO_FAST_METHODS: None (serpent, the default for all
+# methods), 'marshal', or 'msgpack' (if installed). The listed methods must only pass and
+# return builtin types (str, int, float, bool, None, list, dict), and for msgpack, dicts
+# must have string keys. See mycodo/scripts/benchmark_pyro_transport.py
+PYRO_FAST_SERIALIZER = None
+PYRO_FAST_METHODS = (
+    'controller_is_active',
+    'daemon_status',
+    'output_sec_currently_on',
+    'output_state',
+    'pid_get'
+)
+
+# Pyro5 proxy pool of DaemonControl (each connection holds a worker thread of the Pyro5 server)
+PYRO_PROXY_POOL_SIZE = 8  # Maximum idle connected proxies kept per process
+PYRO_PROXY_MAX_IDLE = 60  # Close proxies idle for longer than this, in seconds
+
+# Measurement writer (queued measurements are written to influxdb in batches)
+MEASUREMENT_WRITE_QUEUE_SIZE = 20000  # Maximum number of queued points
+MEASUREMENT_WRITE_BATCH_SIZE = 500  # Maximum number of points per write
+MEASUREMENT_WRITE_FLUSH_SEC = 1.0  # Maximum age of a queued point before writing
+MEASUREMENT_WRITE_DROP_POLICY = 'oldest'  # When the queue is full: 'oldest', 'newest', or 'block'
+MEASUREMENT_WRITE_BLOCK_SEC = 5.0  # Maximum wait for queue space with the 'block' policy
+
+# Measurement spool (measurements that could not be written to influxdb are
+# stored here and written when influxdb becomes available again)
+MEASUREMENT_SPOOL_FILE = os.path.join(DATABASE_PATH, 'measurement_spool.lp')
+MEASUREMENT_SPOOL_MAX_BYTES = 50 * 1024 * 1024  # Oldest measurements are discarded above this size
+MEASUREMENT_SPOOL_RETRY_SEC = 30  # Seconds between attempts to replay the spool
+
+# Measurement cache (values written by the daemon, used to answer queries without influxdb)
+MEASUREMENT_CACHE_MAX_SERIES = 5000  # Maximum number of measurement series to cache
+MEASUREMENT_RING_BUFFER_SIZE = 1024  # Maximum number of recent points kept for each series
+MEASUREMENT_RING_BUFFER_MAX_SERIES = 500  # Maximum number of series with recent points kept
+
+# Measurement rollups (the daemon keeps the min, max, mean, sum, and count of every
+# series in windows of each tier, used to answer queries over long periods)
+MEASUREMENT_ROLLUP_ENABLE = True
+MEASUREMENT_ROLLUP_TIERS = [('1m', 60), ('1h', 3600), ('1d', 86400)]  # Finest to coarsest
+MEASUREMENT_ROLLUP_STATE_FILE = os.path.join(DATABASE_PATH, 'measurement_rollups.json')
+MEASUREMENT_ROLLUP_PERIOD_SEC = 60  # Seconds between updates of the rollups
+MEASUREMENT_ROLLUP_LATENESS_SEC = 600  # Windows this recent are recomputed to include late points
+MEASUREMENT_ROLLUP_MAX_WINDOWS = 1440  # Maximum windows of a tier computed per update
+
+# Embedded measurement database (used instead of influxdb when the measurement
+# database is set to SQLite, stored in one table per partition period)
+MEASUREMENT_SQLITE_PATH = os.path.join(DATABASE_PATH, 'measurements.db')
+MEASUREMENT_SQLITE_PARTITION_SEC = 7 * 86400
+
+# Streamed measurements (raw measurements of exports and graphs are sent in chunks
+# of this many rows as they are read, instead of being loaded into memory)
+MEASUREMENT_STREAM_CHUNK_ROWS = 5000
+
+# Measurement export jobs (several measurements exported in the background into
+# one compressed CSV file, with a column for each measurement)
+MEASUREMENT_EXPORT_PATH = os.path.join(INSTALL_DIRECTORY, 'mycodo/export_measurements')
+MEASUREMENT_EXPORT_CHUNK_SEC = 86400  # Period of measurements queried at a time
+MEASUREMENT_EXPORT_KEEP_SEC = 86400  # Exported files are deleted this long after the export finishes
+MEASUREMENT_EXPORT_MAX_RUNNING = 2  # Maximum number of exports running at once
+
+# Settings database connections (a pool of readers and one writer per process, in WAL mode)
+SETTINGS_DB_POOL_SIZE = 10  # Reader connections kept open
+SETTINGS_DB_POOL_OVERFLOW = 20  # Additional reader connections opened when all are in use
+SETTINGS_DB_POOL_TIMEOUT = 30  # Seconds to wait for a connection when the pool is exhausted
+SETTINGS_DB_BUSY_TIMEOUT_MS = 10000  # Milliseconds to wait for a lock held by another process
+SETTINGS_DB_CACHE_KB = 8192  # Page cache of each connection
+
+# Settings snapshot (the first row of the Misc table, cached in each process)
+MISC_SETTINGS_MAX_AGE = 60  # Reload at least this often, in case the settings are changed by another process
+
+# Device configuration cache of the daemon (measurements, conversions and output channels)
+DEVICE_CONFIG_MAX_AGE = 300  # Rebuild at least this often, in addition to when the settings change
+
+# Event bus of the daemon (measurement, output, controller and PID setpoint events)
+EVENT_QUEUE_SIZE = 1000  # Events queued per subscriber before the oldest are dropped
+
+# Live stream of measurement and output updates to dashboard widgets (server-sent events)
+# Each open stream holds a thread of the web server, so streams may only use a quarter
+# of the threads and the rest are left for page loads, widget polls, and API requests
+WEB_SERVER_THREADS = 16  # Must match --threads in mycodoflask.service and docker-compose.yml
+LIVE_STREAM_ENABLED = True  # If False, widgets only poll
+LIVE_STREAM_LOG_SIZE = 1000  # Recent events the daemon keeps for the web server to read
+LIVE_STREAM_POLL_SEC = 20  # Longest wait of the web server for new events from the daemon
+LIVE_STREAM_MAX_CLIENTS = WEB_SERVER_THREADS // 4  # Open streams per web server process, further dashboards poll
+LIVE_STREAM_MAX_SEC = 600  # Streams are closed after this long, and the browser reconnects
+LIVE_STREAM_KEEPALIVE_SEC = 15  # Comment sent on an idle stream, so proxies keep it open
+LIVE_STREAM_RETRY_SEC = 10  # Delay before the browser reconnects a closed stream
+LIVE_STREAM_QUEUE_SIZE = 200  # Updates queued per stream before the oldest are dropped
+
+# SQL query counters (per web request and controller loop, shown on the System Information page)
+QUERY_STATS_ENABLED = True
+QUERY_STATS_LOG_QUERIES = 50  # Log a request or loop with more queries than this
+QUERY_STATS_LOG_MS = 500  # Log a request or loop with more query time than this
+QUERY_STATS_SLOWEST = 10  # Number of slowest statements kept
+QUERY_STATS_STATEMENT_LENGTH = 300  # Statements are shortened to this length
+
+# Query result cache (measurement endpoints of the web interface share query results)
+QUERY_CACHE_TTL_SEC = 2  # Results are reused for this many seconds (0 to disable)
+QUERY_CACHE_IMMUTABLE_AGE_SEC = 600  # Periods that ended this long ago are cached without expiring
+QUERY_CACHE_MAX_ENTRIES = 2000  # Maximum number of cached results
+QUERY_CACHE_MAX_BYTES = 32 * 1024 * 1024  # Maximum (approximate) memory used by cached results
+
+# Asynchronous graphs (data is averaged so no more than this many points are returned per series)
+GRAPH_ASYNC_MAX_POINTS = 700
+# Largest-Triangle-Three-Buckets downsampling selects points from data averaged into
+# windows this many times smaller than the averaging windows above
+GRAPH_LTTB_OVERSAMPLE = 10
+
 # Anonymous statistics
 STATS_INTERVAL = 86400
 STATS_HOST = 'fungi.kylegabriel.com'
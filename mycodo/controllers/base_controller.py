@@ -15,6 +15,7 @@ import timeit
 import Pyro5
 
 from mycodo.abstract_base_controller import AbstractBaseController
+from mycodo.utils.query_stats import query_scope
 
 
 class AbstractController(AbstractBaseController):
@@ -38,6 +39,10 @@ class AbstractController(AbstractBaseController):
             self.setup_device_measurement(unique_id)
         self.logger = logging.getLogger(logger_name)
 
+        self.query_scope_name = f"{type(self).__name__} loop"
+        if self.unique_id:
+            self.query_scope_name += f" ({unique_id})"
+
     #
     # Begin functions the user is expected to overwrite
     #
@@ -78,7 +83,8 @@ class AbstractController(AbstractBaseController):
 
             while self.running:
                 try:
-                    self.loop()
+                    with query_scope(self.query_scope_name):
+                        self.loop()
                 except Pyro5.errors.TimeoutError:
                     self.logger.exception("Pyro5 TimeoutError")
                 except Exception:
@@ -91,6 +97,7 @@ class AbstractController(AbstractBaseController):
             self.thread_shutdown_timer = timeit.default_timer()
         finally:
             self.run_finally()
+            self.unsubscribe_events()
             self.running = False
             if self.thread_shutdown_timer:
                 dur = (timeit.default_timer() - self.thread_shutdown_timer) * 1000
@@ -33,9 +33,9 @@ from mycodo.controllers.base_controller import AbstractController
 from mycodo.databases.models import Actions
 from mycodo.databases.models import Conditional
 from mycodo.databases.models import ConditionalConditions
-from mycodo.databases.models import Misc
 from mycodo.utils.conditional import save_conditional_code
 from mycodo.utils.database import db_retrieve_table_daemon
+from mycodo.utils.database import misc_settings
 
 
 class ConditionalController(AbstractController, threading.Thread):
@@ -105,8 +105,7 @@ class ConditionalController(AbstractController, threading.Thread):
         self.use_pylint = cond.use_pylint
         self.message_include_code = cond.message_include_code
 
-        self.sample_rate = db_retrieve_table_daemon(
-            Misc, entry='first').sample_rate_controller_conditional
+        self.sample_rate = misc_settings.get().sample_rate_controller_conditional
 
         self.set_log_level_debug(self.log_level_debug)
 
@@ -28,9 +28,9 @@ from mycodo.controllers.base_controller import AbstractController
 from mycodo.databases.models import Conversion
 from mycodo.databases.models import CustomController
 from mycodo.databases.models import DeviceMeasurements
-from mycodo.databases.models import Misc
 from mycodo.mycodo_client import DaemonControl
 from mycodo.utils.database import db_retrieve_table_daemon
+from mycodo.utils.database import misc_settings
 from mycodo.utils.functions import parse_function_information
 from mycodo.utils.modules import load_module_from_file
 
@@ -85,6 +85,8 @@ class FunctionController(AbstractController, threading.Thread):
             self.run_function.stop_function()
         except:
             pass
+        if self.run_function:
+            self.run_function.unsubscribe_events()
 
     def initialize_variables(self):
         function = db_retrieve_table_daemon(
@@ -95,8 +97,7 @@ class FunctionController(AbstractController, threading.Thread):
 
         self.dict_function = parse_function_information()
 
-        self.sample_rate = db_retrieve_table_daemon(
-            Misc, entry='first').sample_rate_controller_function
+        self.sample_rate = misc_settings.get().sample_rate_controller_function
 
         self.device_measurements = db_retrieve_table_daemon(
             DeviceMeasurements).filter(
@@ -27,11 +27,12 @@ import time
 
 from mycodo.controllers.base_controller import AbstractController
 from mycodo.databases.models import (SMTP, Actions, Conversion,
-                                     DeviceMeasurements, Input, Misc, Output,
+                                     DeviceMeasurements, Input, Output,
                                      OutputChannel)
 from mycodo.inputs.base_input import AbstractInput
 from mycodo.mycodo_client import DaemonControl
-from mycodo.utils.database import db_retrieve_table_daemon
+from mycodo.utils.config_cache import device_config
+from mycodo.utils.database import db_retrieve_table_daemon, misc_settings
 from mycodo.utils.influx import add_measurements_influxdb
 from mycodo.utils.inputs import parse_input_information, parse_measurement
 from mycodo.utils.lockfile import LockFile
@@ -265,8 +266,7 @@ class InputController(AbstractController, threading.Thread):
 
         self.dict_inputs = parse_input_information()
 
-        self.sample_rate = db_retrieve_table_daemon(
-            Misc, entry='first').sample_rate_controller_input
+        self.sample_rate = misc_settings.get().sample_rate_controller_input
 
         self.device_measurements = db_retrieve_table_daemon(
             DeviceMeasurements).filter(
@@ -413,13 +413,20 @@ class InputController(AbstractController, threading.Thread):
 
     def create_measurements_dict(self):
         measurements_record = {}
+        config = device_config.get()
         for each_channel, each_measurement in self.measurement.values.items():
-            measurement = self.device_measurements.filter(
-                DeviceMeasurements.channel == each_channel).first()
+            if config is not None:
+                measurement = config.channel_measurements.get((self.unique_id, each_channel))
+            else:
+                measurement = self.device_measurements.filter(
+                    DeviceMeasurements.channel == each_channel).first()
 
             if measurement and 'value' in each_measurement:
-                conversion = self.conversions.filter(
-                    Conversion.unique_id == measurement.conversion_id).first()
+                if config is not None:
+                    conversion = config.conversions.get(measurement.conversion_id)
+                else:
+                    conversion = self.conversions.filter(
+                        Conversion.unique_id == measurement.conversion_id).first()
 
                 # If a timestamp is passed from the module, use it
                 if 'timestamp_utc' in each_measurement:
@@ -26,11 +26,11 @@ import time
 import timeit
 
 from mycodo.controllers.base_controller import AbstractController
-from mycodo.databases.models import Misc
 from mycodo.databases.models import Output
 from mycodo.databases.models import SMTP
 from mycodo.mycodo_client import DaemonControl
 from mycodo.utils.database import db_retrieve_table_daemon
+from mycodo.utils.database import misc_settings
 from mycodo.utils.modules import load_module_from_file
 from mycodo.utils.outputs import output_types
 from mycodo.utils.outputs import parse_output_information
@@ -61,7 +61,7 @@ class OutputController(AbstractController, threading.Thread):
 
     def initialize_variables(self):
         """Begin initializing output parameters."""
-        self.sample_rate = db_retrieve_table_daemon(Misc, entry='first').sample_rate_controller_output
+        self.sample_rate = misc_settings.get().sample_rate_controller_output
 
         self.logger.debug("Initializing Outputs")
         try:
@@ -59,12 +59,14 @@ from mycodo.config import MYCODO_DB_PATH
 from mycodo.controllers.base_controller import AbstractController
 from mycodo.databases.models import Conversion
 from mycodo.databases.models import DeviceMeasurements
-from mycodo.databases.models import Misc
 from mycodo.databases.models import OutputChannel
 from mycodo.databases.models import PID
 from mycodo.databases.utils import session_scope
 from mycodo.mycodo_client import DaemonControl
+from mycodo.utils.config_cache import device_config
 from mycodo.utils.database import db_retrieve_table_daemon
+from mycodo.utils.database import misc_settings
+from mycodo.utils.event_bus import event_bus
 from mycodo.utils.influx import add_measurements_influxdb
 from mycodo.utils.influx import read_influxdb_single
 from mycodo.utils.influx import write_influxdb_value
@@ -153,7 +155,7 @@ class PIDController(AbstractController, threading.Thread):
         """Set PID parameters."""
         self.dict_outputs = parse_output_information()
 
-        self.sample_rate = db_retrieve_table_daemon(Misc, entry='first').sample_rate_controller_pid
+        self.sample_rate = misc_settings.get().sample_rate_controller_pid
 
         self.device_measurements = db_retrieve_table_daemon(DeviceMeasurements)
 
@@ -273,10 +275,10 @@ class PIDController(AbstractController, threading.Thread):
 
                     if new_setpoint is not None:
                         self.logger.debug(f"New setpoint = {new_setpoint} {ended}")
-                        self.PID_Controller.setpoint = new_setpoint
+                        self.update_setpoint(new_setpoint)
                     else:
                         self.logger.debug(f"New setpoint = default {self.setpoint} {ended}")
-                        self.PID_Controller.setpoint = self.setpoint
+                        self.update_setpoint(self.setpoint)
 
                 if self.setpoint_tracking_type == 'input-math' and self.setpoint_tracking_id != '':
                     # Update setpoint using an Input
@@ -301,13 +303,13 @@ class PIDController(AbstractController, threading.Thread):
                         value='LAST')
 
                     if last_measurement[1] is not None:
-                        self.PID_Controller.setpoint = last_measurement[1]
+                        self.update_setpoint(last_measurement[1])
                     else:
                         self.logger.debug(
                             "Could not find measurement for Setpoint "
                             f"Tracking. Max Age of {self.setpoint_tracking_max_age} exceeded for measuring "
                             f"device ID {device_id} (measurement {measurement_id})")
-                        self.PID_Controller.setpoint = None
+                        self.update_setpoint(None)
 
                 # Calculate new control variable (output) from PID Controller
                 self.PID_Controller.update_pid_output(self.last_measurement)
@@ -384,8 +386,12 @@ class PIDController(AbstractController, threading.Thread):
         ]
 
         measurement_dict = {}
-        measurements = self.device_measurements.filter(
-            DeviceMeasurements.device_id == self.unique_id).all()
+        config = device_config.get()
+        if config is not None:
+            measurements = config.device_measurements.get(self.unique_id, [])
+        else:
+            measurements = self.device_measurements.filter(
+                DeviceMeasurements.device_id == self.unique_id).all()
         for each_channel, each_measurement in enumerate(measurements):
             if (each_measurement.channel not in measurement_dict and
                     each_measurement.channel < len(list_measurements)):
@@ -851,9 +857,15 @@ class PIDController(AbstractController, threading.Thread):
         self.logger.info("PID Resumed")
         return "success"
 
+    def update_setpoint(self, setpoint):
+        """Set the setpoint of the PID controller, and publish it if it changed."""
+        if setpoint != self.PID_Controller.setpoint:
+            self.PID_Controller.setpoint = setpoint
+            event_bus.publish('pid_setpoint_changed', pid_id=self.unique_id, setpoint=setpoint)
+
     def set_setpoint(self, setpoint):
         """Set the setpoint of PID."""
-        self.PID_Controller.setpoint = float(setpoint)
+        self.update_setpoint(float(setpoint))
         with session_scope(MYCODO_DB_PATH) as db_session:
             mod_pid = db_session.query(PID).filter(PID.unique_id == self.unique_id).first()
             mod_pid.setpoint = setpoint
@@ -30,7 +30,6 @@ from mycodo.config import MYCODO_DB_PATH
 from mycodo.controllers.base_controller import AbstractController
 from mycodo.databases.models import CustomController
 from mycodo.databases.models import Input
-from mycodo.databases.models import Misc
 from mycodo.databases.models import Output
 from mycodo.databases.models import OutputChannel
 from mycodo.databases.models import PID
@@ -41,6 +40,7 @@ from mycodo.mycodo_client import DaemonControl
 from mycodo.utils.actions import parse_action_information
 from mycodo.utils.actions import trigger_controller_actions
 from mycodo.utils.database import db_retrieve_table_daemon
+from mycodo.utils.database import misc_settings
 from mycodo.utils.method import load_method_handler, parse_db_time
 from mycodo.utils.sunriseset import suntime_calculate_next_sunrise_sunset_epoch
 from mycodo.utils.system_pi import epoch_of_next_time
@@ -179,8 +179,7 @@ class TriggerController(AbstractController, threading.Thread):
         self.email_count = 0
         self.allowed_to_send_notice = True
 
-        self.sample_rate = db_retrieve_table_daemon(
-            Misc, entry='first').sample_rate_controller_conditional
+        self.sample_rate = misc_settings.get().sample_rate_controller_conditional
 
         self.smtp_max_count = db_retrieve_table_daemon(
             SMTP, entry='first').hourly_max
@@ -24,10 +24,10 @@ import threading
 import timeit
 
 from mycodo.controllers.base_controller import AbstractController
-from mycodo.databases.models import Misc
 from mycodo.databases.models import Widget
 from mycodo.mycodo_client import DaemonControl
 from mycodo.utils.database import db_retrieve_table_daemon
+from mycodo.utils.database import misc_settings
 from mycodo.utils.modules import load_module_from_file
 from mycodo.utils.widgets import parse_widget_information
 
@@ -50,8 +50,7 @@ class WidgetController(AbstractController, threading.Thread):
         """Begin initializing widget parameters."""
         self.dict_widgets = parse_widget_information()
 
-        self.sample_rate = db_retrieve_table_daemon(
-            Misc, entry='first').sample_rate_controller_widget
+        self.sample_rate = misc_settings.get().sample_rate_controller_widget
 
         self.logger.debug("Initializing Widgets")
         try:
@@ -43,7 +43,9 @@ class Conditional(CRUDMixin, db.Model):
 
 class ConditionalConditions(CRUDMixin, db.Model):
     __tablename__ = "conditional_data"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        db.Index('ix_conditional_data_conditional_id', 'conditional_id'),
+        {'extend_existing': True})
 
     id = db.Column(db.Integer, unique=True, primary_key=True)
     unique_id = db.Column(db.String, nullable=False, unique=True, default=set_uuid)
@@ -69,7 +71,9 @@ class ConditionalConditions(CRUDMixin, db.Model):
 
 class Trigger(CRUDMixin, db.Model):
     __tablename__ = "trigger"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        db.Index('ix_trigger_trigger_type_unique_id_1_unique_id_2', 'trigger_type', 'unique_id_1', 'unique_id_2'),
+        {'extend_existing': True})
 
     id = db.Column(db.Integer, unique=True, primary_key=True)
     unique_id = db.Column(db.String, nullable=False, unique=True, default=set_uuid)
@@ -127,7 +131,9 @@ class TriggerSchema(ma.SQLAlchemyAutoSchema):
 
 class Actions(CRUDMixin, db.Model):
     __tablename__ = "function_actions"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        db.Index('ix_function_actions_function_id', 'function_id'),
+        {'extend_existing': True})
 
     id = db.Column(db.Integer, unique=True, primary_key=True)
     unique_id = db.Column(db.String, nullable=False, unique=True, default=set_uuid)
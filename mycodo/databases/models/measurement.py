@@ -68,7 +68,9 @@ class ConversionSchema(ma.SQLAlchemyAutoSchema):
 
 class DeviceMeasurements(CRUDMixin, db.Model):
     __tablename__ = "device_measurements"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        db.Index('ix_device_measurements_device_id_channel', 'device_id', 'channel'),
+        {'extend_existing': True})
 
     id = db.Column(db.Integer, unique=True, primary_key=True)
     unique_id = db.Column(db.String, nullable=False, unique=True, default=set_uuid)
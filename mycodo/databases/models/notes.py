@@ -8,7 +8,9 @@ from mycodo.mycodo_flask.extensions import db
 
 class Notes(CRUDMixin, db.Model):
     __tablename__ = "notes"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        db.Index('ix_notes_date_time', 'date_time'),
+        {'extend_existing': True})
 
     id = db.Column(db.Integer, unique=True, primary_key=True)
     unique_id = db.Column(db.String, nullable=False, unique=True, default=set_uuid)  # ID for influxdb entries
@@ -72,7 +72,9 @@ class OutputSchema(ma.SQLAlchemyAutoSchema):
 
 class OutputChannel(CRUDMixin, db.Model):
     __tablename__ = "output_channel"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        db.Index('ix_output_channel_output_id_channel', 'output_id', 'channel'),
+        {'extend_existing': True})
 
     id = db.Column(db.Integer, unique=True, primary_key=True)
     unique_id = db.Column(db.String, nullable=False, unique=True, default=set_uuid)  # ID for influxdb entries
@@ -1,27 +1,188 @@
 # coding=utf-8
 import logging
+import os
+import sqlite3
+import threading
 from contextlib import contextmanager
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.dml import UpdateBase
+
+from mycodo.config import (SETTINGS_DB_BUSY_TIMEOUT_MS, SETTINGS_DB_CACHE_KB,
+                           SETTINGS_DB_POOL_OVERFLOW, SETTINGS_DB_POOL_SIZE,
+                           SETTINGS_DB_POOL_TIMEOUT)
 
 logger = logging.getLogger(__name__)
 
 
-@contextmanager
-def session_scope(db_uri):
-    """Provide a transactional scope around a series of operations."""
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Configure a new SQLite connection of the settings database
+
+    WAL mode lets readers continue while another connection (or process)
+    writes, and busy_timeout makes a connection wait for a lock held by
+    another process instead of failing with "database is locked".
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout={SETTINGS_DB_BUSY_TIMEOUT_MS}")
+        if cursor.execute("PRAGMA journal_mode").fetchone()[0] not in ('wal', 'memory'):
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA cache_size=-{SETTINGS_DB_CACHE_KB}")
+    except sqlite3.OperationalError:
+        logger.exception("Could not configure the settings database connection")
+    finally:
+        cursor.close()
+
+
+def checkpoint_sqlite(path):
+    """Write the changes held in the WAL file of an SQLite database into the database file."""
+    conn = sqlite3.connect(path, timeout=SETTINGS_DB_BUSY_TIMEOUT_MS / 1000)
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+
+
+class RoutingSession(Session):
+    """
+    Session that writes with the writer engine of its database and reads with the reader engine
+
+    After the first write of a transaction, reads also use the writer
+    engine, so they include the changes not yet committed.
+    """
+    def __init__(self, reader=None, writer=None, **kwargs):
+        super().__init__(**kwargs)
+        self.reader = reader
+        self.writer = writer
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info['writing'] = True
+        if self.info.get('writing'):
+            return self.writer
+        return self.reader
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def end_writing(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('writing', None)
+
+
+class EngineRegistry:
+    """
+    Engines and sessionmakers of the process, one per database URI
 
-    # configure Session class with desired options
-    Session = sessionmaker()
+    Each database has a reader engine with a pool of connections shared by
+    the threads of the process, and a writer engine with a single
+    connection, so writes of the threads of a process queue for the writer
+    connection instead of competing for the database lock, and never block
+    reads. Each engine counts the connections opened and checked out of its
+    pool. In-memory databases use one engine for both.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.engines = {}
+        self.sessionmakers = {}
+        self.stats = {}
 
-    # later, we create the engine
-    engine = create_engine(f"{db_uri}?check_same_thread=False")
+    def create_engine(self, db_uri, pool_size, max_overflow):
+        engine = create_engine(
+            f"{db_uri}?check_same_thread=False",
+            poolclass=QueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=SETTINGS_DB_POOL_TIMEOUT)
+        event.listen(engine, "connect", set_sqlite_pragmas)
 
-    # associate it with our custom Session class
-    Session.configure(bind=engine)
+        stats = {'connects': 0, 'checkouts': 0, 'checkins': 0}
 
-    session = Session()
+        @event.listens_for(engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            with self.stats_lock:
+                stats['connects'] += 1
+
+        @event.listens_for(engine, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            with self.stats_lock:
+                stats['checkouts'] += 1
+
+        @event.listens_for(engine, "checkin")
+        def on_checkin(dbapi_connection, connection_record):
+            with self.stats_lock:
+                stats['checkins'] += 1
+
+        return engine, stats
+
+    def get_sessionmaker(self, db_uri):
+        """Return the sessionmaker of the database, creating its engines if needed."""
+        session_maker = self.sessionmakers.get(db_uri)
+        if session_maker is None:
+            with self.lock:
+                session_maker = self.sessionmakers.get(db_uri)
+                if session_maker is None:
+                    reader, reader_stats = self.create_engine(
+                        db_uri, SETTINGS_DB_POOL_SIZE, SETTINGS_DB_POOL_OVERFLOW)
+                    if db_uri in ('sqlite://', 'sqlite:///:memory:'):
+                        writer, writer_stats = reader, reader_stats
+                    else:
+                        writer, writer_stats = self.create_engine(db_uri, 1, 0)
+                    self.engines[db_uri] = {'reader': reader, 'writer': writer}
+                    self.stats[db_uri] = {'reader': reader_stats, 'writer': writer_stats}
+                    session_maker = sessionmaker(
+                        class_=RoutingSession, reader=reader, writer=writer)
+                    self.sessionmakers[db_uri] = session_maker
+        return session_maker
+
+    def get_engine(self, db_uri, role='reader'):
+        self.get_sessionmaker(db_uri)
+        return self.engines[db_uri][role]
+
+    def get_stats(self):
+        """Return the pool counters of the reader and writer engines of each database."""
+        with self.lock:
+            stats = {}
+            for db_uri, db_engines in self.engines.items():
+                stats[db_uri] = {}
+                for role, engine in db_engines.items():
+                    with self.stats_lock:
+                        stats[db_uri][role] = dict(self.stats[db_uri][role])
+                    stats[db_uri][role]['checked_out'] = engine.pool.checkedout()
+                    stats[db_uri][role]['pool_size'] = engine.pool.size()
+            return stats
+
+    def dispose_all(self, close=True):
+        """Remove all engines. With close=False, connections are left open (for a forked child)."""
+        with self.lock:
+            for db_engines in self.engines.values():
+                for engine in set(db_engines.values()):
+                    engine.dispose(close=close)
+            self.engines.clear()
+            self.sessionmakers.clear()
+            self.stats.clear()
+
+
+engines = EngineRegistry()
+
+
+def engine_stats():
+    """Return the connection pool counters of the databases opened by this process."""
+    return engines.get_stats()
+
+
+# Connections must not be shared with a forked child process
+os.register_at_fork(after_in_child=lambda: engines.dispose_all(close=False))
+
+
+@contextmanager
+def session_scope(db_uri):
+    """Provide a transactional scope around a series of operations."""
+    session = engines.get_sessionmaker(db_uri)()
     try:
         yield session
         session.commit()
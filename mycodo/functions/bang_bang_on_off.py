@@ -7,7 +7,7 @@ from flask_babel import lazy_gettext
 
 from mycodo.databases.models import CustomController
 from mycodo.functions.base_function import AbstractFunction
-from mycodo.mycodo_client import DaemonControl
+from mycodo.mycodo_client import DaemonControl, batch_values
 from mycodo.utils.constraints_pass import constraints_pass_positive_value
 from mycodo.utils.database import db_retrieve_table_daemon
 
@@ -245,10 +245,13 @@ class CustomModule(AbstractFunction):
             self.logger.error(
                 "Unknown controller direction: '{}'".format(self.direction))
 
-        output_raise_state = self.control.output_state(
-            self.output_raise_device_id, self.output_raise_channel)
-        output_lower_state = self.control.output_state(
-            self.output_lower_device_id, self.output_lower_channel)
+        try:
+            output_raise_state, output_lower_state = batch_values(self.control.batch([
+                ('output_state', (self.output_raise_device_id, self.output_raise_channel)),
+                ('output_state', (self.output_lower_device_id, self.output_lower_channel))]))
+        except Exception:
+            self.logger.exception("Querying output states")
+            return
 
         self.logger.debug(
             f"Before execution: Input: {last_measurement[1]}, "
@@ -22,8 +22,6 @@
 #  Contact at kylegabriel.com
 #
 import time
-from statistics import median
-from statistics import stdev
 
 from flask_babel import lazy_gettext
 
@@ -35,6 +33,8 @@ from mycodo.utils.constraints_pass import constraints_pass_positive_value
 from mycodo.utils.database import db_retrieve_table_daemon
 from mycodo.utils.influx import read_influxdb_single
 from mycodo.utils.influx import write_influxdb_value
+from mycodo.utils.measurement_cache import WINDOW_STATISTICS
+from mycodo.utils.measurement_cache import window_statistics
 from mycodo.utils.system_pi import get_measurement
 from mycodo.utils.system_pi import return_measurement_info
 
@@ -197,23 +197,8 @@ class CustomModule(AbstractFunction):
                 measure.append(last_measurement[1])
 
         if len(measure) > 1:
-            stat_mean = float(sum(measure) / float(len(measure)))
-            stat_median = median(measure)
-            stat_minimum = min(measure)
-            stat_maximum = max(measure)
-            stdev_ = stdev(measure)
-            stdev_mean_upper = stat_mean + stdev_
-            stdev_mean_lower = stat_mean - stdev_
-
-            list_measurement = [
-                stat_mean,
-                stat_median,
-                stat_minimum,
-                stat_maximum,
-                stdev_,
-                stdev_mean_upper,
-                stdev_mean_lower
-            ]
+            stats = window_statistics(measure)
+            list_measurement = [stats[each] for each in WINDOW_STATISTICS]
 
             for each_channel, each_measurement in self.channels_measurement.items():
                 if each_measurement.is_enabled:
@@ -22,8 +22,6 @@
 #  Contact at kylegabriel.com
 #
 import time
-from statistics import median
-from statistics import stdev
 
 from flask_babel import lazy_gettext
 
@@ -33,6 +31,7 @@ from mycodo.mycodo_client import DaemonControl
 from mycodo.utils.constraints_pass import constraints_pass_positive_value
 from mycodo.utils.database import db_retrieve_table_daemon
 from mycodo.utils.influx import write_influxdb_value
+from mycodo.utils.measurement_cache import WINDOW_STATISTICS
 from mycodo.utils.system_pi import get_measurement
 from mycodo.utils.system_pi import return_measurement_info
 
@@ -160,41 +159,20 @@ class CustomModule(AbstractFunction):
             self.logger.error("Could not find Device Measurement")
             return
 
-        past_measurements = self.get_past_measurements(
+        stats = self.get_past_statistics(
             self.select_measurement_device_id,
             self.select_measurement_measurement_id,
-            max_age=self.max_measure_age)
+            self.max_measure_age)
 
-        self.logger.debug("Past Measurements returned: {}".format(
-            past_measurements))
+        self.logger.debug("Past statistics returned: {}".format(stats))
 
-        if not past_measurements:
+        if not stats or not stats['count']:
             self.logger.error(
                 "Could not find measurements within the set Max Age")
             return False
 
-        measure = []
-        for each_measure in past_measurements:
-            measure.append(each_measure[1])
-
-        if len(measure) > 1:
-            stat_mean = float(sum(measure) / float(len(measure)))
-            stat_median = median(measure)
-            stat_minimum = min(measure)
-            stat_maximum = max(measure)
-            stdev_ = stdev(measure)
-            stdev_mean_upper = stat_mean + stdev_
-            stdev_mean_lower = stat_mean - stdev_
-
-            list_measurement = [
-                stat_mean,
-                stat_median,
-                stat_minimum,
-                stat_maximum,
-                stdev_,
-                stdev_mean_upper,
-                stdev_mean_lower
-            ]
+        if stats['count'] > 1:
+            list_measurement = [stats[each] for each in WINDOW_STATISTICS]
 
             for each_channel, each_measurement in self.channels_measurement.items():
                 if each_measurement.is_enabled:
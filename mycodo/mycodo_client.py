@@ -25,7 +25,10 @@ import argparse
 import datetime
 import logging
 import os
+import select
 import sys
+import threading
+import time
 import traceback
 
 import Pyro5.errors
@@ -33,9 +36,11 @@ from Pyro5.api import Proxy
 
 sys.path.append(os.path.abspath(os.path.join(os.path.realpath(__file__), '../..')))
 
-from mycodo.config import PYRO_URI
-from mycodo.databases.models import SMTP, Misc
-from mycodo.utils.database import db_retrieve_table_daemon
+from mycodo.config import (PYRO_FAST_METHODS, PYRO_FAST_SERIALIZER,
+                           PYRO_PROXY_MAX_IDLE, PYRO_PROXY_POOL_SIZE,
+                           PYRO_URI)
+from mycodo.databases.models import SMTP
+from mycodo.utils.database import db_retrieve_table_daemon, misc_settings
 from mycodo.utils.send_data import send_email as send_email_notification
 from mycodo.utils.widget_generate_html import generate_widget_html
 
@@ -47,39 +52,236 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def proxy_is_connected(proxy):
+    """Return whether an idle proxy is still connected (the daemon has not closed the connection)."""
+    connection = proxy._pyroConnection
+    if connection is None:
+        return False
+    try:
+        readable, _, _ = select.select([connection.sock], [], [], 0)
+    except (OSError, ValueError):
+        return False
+    # Nothing is sent to an idle connection, so a readable one has been closed
+    return not readable
+
+
+class ProxyPool:
+    """
+    Connected Pyro5 proxies to the daemon, shared by the threads of a process
+
+    A proxy is taken from the pool for each call and returned after it, so
+    the connection and metadata exchange of a new proxy are only needed when
+    no idle proxy is available. Idle proxies are checked before they are
+    reused, since the daemon may have been restarted, and a proxy whose
+    call fails with a communication error (including a timeout) is closed
+    instead of being returned. At most max_size idle proxies are kept, and
+    proxies idle for max_idle seconds are closed, since each connection
+    holds a worker thread of the Pyro5 server.
+    """
+    def __init__(self, uri, max_size=PYRO_PROXY_POOL_SIZE, max_idle=PYRO_PROXY_MAX_IDLE):
+        self.uri = uri
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.lock = threading.Lock()
+        self.idle = []  # (time returned, proxy), most recently returned last
+        self.in_use = 0
+        self.stats = {
+            'calls': 0,
+            'created': 0,
+            'reused': 0,
+            'stale': 0,
+            'errors': 0
+        }
+
+    def acquire(self):
+        """Return a connected idle proxy for the current thread, or a new proxy."""
+        while True:
+            with self.lock:
+                if not self.idle:
+                    self.stats['created'] += 1
+                    self.in_use += 1
+                    break
+                returned, proxy = self.idle.pop()
+                self.in_use += 1
+            proxy._pyroClaimOwnership()
+            if time.monotonic() - returned < self.max_idle and proxy_is_connected(proxy):
+                with self.lock:
+                    self.stats['reused'] += 1
+                return proxy
+            self.close(proxy)
+            with self.lock:
+                self.stats['stale'] += 1
+                self.in_use -= 1
+        return Proxy(self.uri)
+
+    def release(self, proxy, failed=False):
+        """Return a proxy to the pool, or close it if its call failed or the pool is full."""
+        now = time.monotonic()
+        expired = []
+        with self.lock:
+            self.in_use -= 1
+            if failed:
+                self.stats['errors'] += 1
+            while self.idle and now - self.idle[0][0] >= self.max_idle:
+                expired.append(self.idle.pop(0)[1])
+            if not failed and len(self.idle) < self.max_size:
+                self.idle.append((now, proxy))
+                proxy = None
+        if proxy is not None:
+            self.close(proxy)
+        for each_proxy in expired:
+            each_proxy._pyroClaimOwnership()
+            self.close(each_proxy)
+
+    @staticmethod
+    def close(proxy):
+        try:
+            proxy._pyroRelease()
+        except Exception:
+            pass
+
+    def call(self, name, timeout, args, kwargs, serializer=None):
+        """Call a method of the daemon with a proxy from the pool."""
+        proxy = self.acquire()
+        with self.lock:
+            self.stats['calls'] += 1
+        failed = True
+        try:
+            proxy._pyroTimeout = timeout
+            proxy._pyroSerializer = serializer
+            result = getattr(proxy, name)(*args, **kwargs)
+            failed = False
+            return result
+        except Pyro5.errors.CommunicationError:
+            raise
+        except Exception:
+            # An exception raised by the method in the daemon leaves the connection usable
+            failed = False
+            raise
+        finally:
+            self.release(proxy, failed=failed)
+
+    def detach(self):
+        """Forget the idle proxies without closing their connections (for a forked child)."""
+        with self.lock:
+            for _, proxy in self.idle:
+                if proxy._pyroConnection is not None:
+                    proxy._pyroConnection.keep_open = True
+            self.idle.clear()
+            self.in_use = 0
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['idle'] = len(self.idle)
+            stats['in_use'] = self.in_use
+        return stats
+
+
+class PooledProxy:
+    """
+    Call methods of the daemon like a Proxy, e.g. PooledProxy(pool, 30).daemon_status()
+
+    The methods in fast_methods are called with fast_serializer, and the
+    others with the default serializer (serpent).
+    """
+    def __init__(self, pool, timeout,
+                 fast_serializer=PYRO_FAST_SERIALIZER, fast_methods=PYRO_FAST_METHODS):
+        self._pool = pool
+        self._timeout = timeout
+        self._fast_serializer = fast_serializer
+        self._fast_methods = fast_methods
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        serializer = self._fast_serializer if name in self._fast_methods else None
+
+        def remote_method(*args, **kwargs):
+            return self._pool.call(name, self._timeout, args, kwargs, serializer=serializer)
+        return remote_method
+
+
+proxy_pools = {}
+proxy_pools_lock = threading.Lock()
+
+
+def get_proxy_pool(uri):
+    pool = proxy_pools.get(uri)
+    if pool is None:
+        with proxy_pools_lock:
+            pool = proxy_pools.setdefault(uri, ProxyPool(uri))
+    return pool
+
+
+def proxy_pool_stats():
+    """Return the counters of the proxy pool of each daemon URI of this process."""
+    with proxy_pools_lock:
+        pools = list(proxy_pools.values())
+    return {pool.uri: pool.get_stats() for pool in pools}
+
+
+def detach_proxy_pools():
+    with proxy_pools_lock:
+        for pool in proxy_pools.values():
+            pool.detach()
+
+
+# Connections must not be shared with a forked child process
+os.register_at_fork(after_in_child=detach_proxy_pools)
+
+
+def batch_values(results):
+    """
+    Return the values of the results of DaemonControl.batch()
+
+    Raises an exception with the error of the first call that failed.
+    """
+    values = []
+    for error, value in results:
+        if error:
+            raise Exception(f"Daemon call failed: {error}")
+        values.append(value)
+    return values
+
+
 class DaemonControl:
     """Communicate with the daemon to execute commands or retrieve information."""
     def __init__(self, pyro_uri=PYRO_URI, pyro_timeout=None):
-        self.pyro_timeout = 30
+        self.uri = pyro_uri
+        self.pool = get_proxy_pool(pyro_uri)
+        self._pyro_timeout = pyro_timeout
+
+    @property
+    def pyro_timeout(self):
+        """The timeout given, or else the timeout of the settings, in seconds."""
+        if self._pyro_timeout:
+            return self._pyro_timeout
         try:
-            if pyro_timeout:
-                self.pyro_timeout = pyro_timeout
-            else:
-                misc = db_retrieve_table_daemon(Misc, entry='first')
-                self.pyro_timeout = misc.rpyc_timeout  # TODO: Rename to rpc_timeout at next major revision
+            return misc_settings.get().rpyc_timeout  # TODO: Rename to rpc_timeout at next major revision
         except Exception:
             logger.exception("Could not access SQL table to determine Pyro Timeout. Using 30 seconds.")
+            return 30
 
-        self.uri= pyro_uri
+    def proxy(self, timeout=None):
+        return PooledProxy(self.pool, timeout or self.pyro_timeout)
 
-    def proxy(self):
-        try:
-            proxy = Proxy(self.uri)
-            proxy._pyroTimeout = self.pyro_timeout
-            return proxy
-        except Exception as e:
-            logger.error(f"Pyro5 proxy error: {e}")
+    def batch(self, calls):
+        """
+        Call several methods of the daemon in one round-trip
+
+        :param calls: list of (method name, args, kwargs), with args and kwargs optional
+        :return: list of (error message or None, return value), in the order of the calls
+        """
+        return [tuple(each) for each in self.proxy().batch([list(each) for each in calls])]
 
     #
     # Status functions
     #
 
     def check_daemon(self):
-        proxy = self.proxy()
-        old_timeout = proxy._pyroTimeout
         try:
-            proxy._pyroTimeout = 10
-            result = proxy.check_daemon()
+            result = self.proxy(timeout=10).check_daemon()
             if result:
                 return result
             else:
@@ -100,8 +302,6 @@ class DaemonControl:
             msg = f"Pyro Exception: {err}"
             logger.error(msg)
             return msg
-        finally:
-            proxy._pyroTimeout = old_timeout
 
     def controller_is_active(self, controller_id):
         return self.proxy().controller_is_active(controller_id)
@@ -115,6 +315,21 @@ class DaemonControl:
     def ram_use(self):
         return self.proxy().ram_use()
 
+    def query_stats(self):
+        return self.proxy().query_stats()
+
+    def proxy_pool_stats(self):
+        return self.proxy().proxy_pool_stats()
+
+    def record_measurement(self, unique_id, unit, value, measure=None, channel=None, timestamp=None):
+        """Add a measurement written by this process to the measurement caches of the daemon (timestamp in epoch seconds)."""
+        return self.proxy().record_measurement(
+            unique_id, unit, value, measure=measure, channel=channel, timestamp=timestamp)
+
+    def live_events(self, sequence=None, timeout=0):
+        """Return the measurement and output events after an event number, waiting up to timeout seconds."""
+        return self.proxy(timeout=timeout + self.pyro_timeout).live_events(sequence, timeout)
+
     #
     # Daemon
     #
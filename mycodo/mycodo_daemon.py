@@ -38,11 +38,13 @@ import timeit
 import traceback
 from logging import handlers
 
-from Pyro5.api import Proxy, expose, serve
+from Pyro5.api import Daemon, Proxy, expose, serve
 
-from mycodo.config import (DAEMON_LOG_FILE, DOCKER_CONTAINER, MYCODO_DB_PATH,
-                           MYCODO_VERSION, STATS_CSV, STATS_INTERVAL,
-                           UPGRADE_CHECK_INTERVAL)
+from mycodo.config import (DAEMON_LOG_FILE, DOCKER_CONTAINER,
+                           LIVE_STREAM_ENABLED, LIVE_STREAM_POLL_SEC,
+                           MYCODO_DB_PATH, MYCODO_VERSION, PYRO_TRANSPORT,
+                           PYRO_UNIX_SOCKET, PYRO_URI, STATS_CSV,
+                           STATS_INTERVAL, UPGRADE_CHECK_INTERVAL)
 from mycodo.controllers.controller_conditional import ConditionalController
 from mycodo.controllers.controller_function import FunctionController
 from mycodo.controllers.controller_input import InputController
@@ -54,14 +56,22 @@ from mycodo.databases.models import (PID, Camera, Conditional,
                                      CustomController, Input, Misc, Trigger)
 from mycodo.databases.utils import session_scope
 from mycodo.devices.camera import camera_record
+from mycodo.mycodo_client import proxy_pool_stats
 from mycodo.utils.actions import (get_condition_value,
                                   get_condition_value_dict,
                                   parse_action_information, trigger_action,
                                   trigger_controller_actions)
-from mycodo.utils.database import db_retrieve_table_daemon
+from mycodo.utils.config_cache import device_config
+from mycodo.utils.database import db_retrieve_table_daemon, misc_settings
+from mycodo.utils.event_bus import EventLog, event_bus
 from mycodo.utils.github_release_info import MycodoRelease
+from mycodo.utils.influx import (influxdb_clients, influxdb_writer,
+                                 measurement_rollups)
+from mycodo.utils.measurement_cache import record_value, series_key
+from mycodo.utils.query_stats import query_stats_summary
 from mycodo.utils.stats import (add_update_csv, recreate_stat_file,
                                 return_stat_file_dict, send_anonymous_stats)
+from mycodo.utils.system_pi import set_user_grp
 from mycodo.utils.tools import generate_output_usage_report, next_schedule
 
 
@@ -117,12 +127,24 @@ class DaemonController:
         # Dashboard widgets
         self.dashboard_widget = {}
 
+        # Measurement, output, controller and PID setpoint events, for subscribers within the daemon
+        self.event_bus = event_bus
+
+        # Recent measurement and output events, read by the web server for the live dashboard stream
+        self.live_event_log = EventLog(
+            ['measurement_written', 'output_state_changed'], name='live_stream')
+        if LIVE_STREAM_ENABLED:
+            self.event_bus.add(self.live_event_log)
+
         self.thread_shutdown_timer = None
         self.start_time = time.time()
         self.timer_stats = time.time() + 120
         self.timer_upgrade = time.time() + 120
         self.timer_upgrade_message = time.time()
 
+        # Look up device measurements, conversions and output channels in memory
+        device_config.enable()
+
         # Update Misc settings
         self.output_usage_report_gen = None
         self.output_usage_report_span = None
@@ -140,6 +162,12 @@ class DaemonController:
     def run(self):
         self.load_actions()
 
+        # Start the measurement writer (replays any spooled measurements)
+        influxdb_writer.start()
+
+        # Start updating the measurement rollups
+        measurement_rollups.start()
+
         try:
             self.start_all_controllers()
         except Exception:
@@ -194,6 +222,10 @@ class DaemonController:
         self.logger.debug("Stopping all running controllers")
         self.stop_all_controllers()
 
+        self.logger.debug("Writing queued measurements")
+        measurement_rollups.stop()
+        influxdb_writer.flush()
+
         timer = timeit.default_timer() - self.thread_shutdown_timer
         self.logger.info(f"Mycodo daemon terminated in {timer:.3f} seconds\n\n")
         self.terminated = True
@@ -238,6 +270,9 @@ class DaemonController:
         """
         cont_type = self.determine_controller_type(cont_id)
 
+        # The measurements of a controller may only be changed while it is inactive
+        device_config.invalidate()
+
         if cont_id in self.controller[cont_type]:
             if self.controller[cont_type][cont_id].is_running():
                 message = f"Cannot activate {cont_type} controller with ID {cont_id}: " \
@@ -286,6 +321,8 @@ class DaemonController:
 
         message = f"{cont_type} controller with ID {cont_id} activated."
         self.logger.debug(message)
+        self.event_bus.publish(
+            'controller_activated', controller_id=cont_id, controller_type=cont_type)
         return 0, message
 
 
@@ -339,6 +376,8 @@ class DaemonController:
 
                     message = f"{cont_type} controller with ID {cont_id} deactivated."
                     self.logger.debug(message)
+                    self.event_bus.publish(
+                        'controller_deactivated', controller_id=cont_id, controller_type=cont_type)
                     return 0, message
                 except Exception as except_msg:
                     message = f"Could not deactivate {cont_type} controller with " \
@@ -701,6 +740,7 @@ class DaemonController:
 
     def refresh_daemon_conditional_settings(self, unique_id):
         try:
+            device_config.invalidate()
             return self.controller['Conditional'][unique_id].refresh_settings()
         except Exception as except_msg:
             message = f"Could not refresh conditional settings: {except_msg}"
@@ -710,19 +750,23 @@ class DaemonController:
     def refresh_daemon_misc_settings(self):
         try:
             self.logger.debug("Refreshing misc settings")
-            misc = db_retrieve_table_daemon(Misc, entry='first')
+            misc_settings.invalidate()
+            device_config.invalidate()
+            misc = misc_settings.get()
             self.opt_out_statistics = misc.stats_opt_out
             self.enable_upgrade_check = misc.enable_upgrade_check
             self.output_usage_report_gen = misc.output_usage_report_gen
             self.output_usage_report_span = misc.output_usage_report_span
             self.output_usage_report_day = misc.output_usage_report_day
             self.output_usage_report_hour = misc.output_usage_report_hour
+            influxdb_clients.prune(misc)
         except Exception:
             self.logger.exception("Could not refresh misc settings")
 
 
     def refresh_daemon_trigger_settings(self, unique_id):
         try:
+            device_config.invalidate()
             return self.controller['Trigger'][unique_id].refresh_settings()
         except Exception:
             self.logger.exception("Could not refresh trigger settings")
@@ -806,6 +850,7 @@ class DaemonController:
         :type output_id: str
         """
         try:
+            device_config.invalidate()
             return self.controller['Output'].output_setup(action, output_id)
         except Exception as except_msg:
             message = f"Could not set up output: {except_msg}"
@@ -837,6 +882,40 @@ class DaemonController:
             self.logger.exception(f"Could not query all output state")
 
 
+    def live_events(self, sequence=None, timeout=0):
+        """
+        Return the measurement and output events after an event number
+
+        :param sequence: number of the last event received (None to only get the current number)
+        :type sequence: int or None
+        :param timeout: seconds to wait if there are no newer events
+        :type timeout: float
+        :return: dict of the number of the last event, the events, and
+            whether any events after sequence are missing
+        """
+        sequence, events, complete = self.live_event_log.since(
+            sequence, timeout=min(timeout, LIVE_STREAM_POLL_SEC))
+        list_events = []
+        for each_event in events:
+            if each_event.type == 'measurement_written':
+                data = each_event.data
+                list_events.append({
+                    'type': 'measurement',
+                    'key': [data['device_id'], data['unit'], data['channel'], data['measure']],
+                    'timestamp': data['timestamp'],
+                    'value': data['value']
+                })
+            elif each_event.type == 'output_state_changed':
+                data = each_event.data
+                list_events.append({
+                    'type': 'output',
+                    'key': [data['output_id'], data['channel']],
+                    'timestamp': each_event.timestamp,
+                    'value': data['state']
+                })
+        return {'sequence': sequence, 'events': list_events, 'complete': complete}
+
+
     def startup_stats(self):
         """Ensure existence of statistics file and save daemon startup time."""
         # if statistics file doesn't exist, create it
@@ -1110,8 +1189,31 @@ class PyroServer(object):
     Pyro for communicating between the client and the daemon
     """
     def __init__(self, mycodo):
+        self.logger = logging.getLogger('mycodo.pyro_server')
         self.mycodo = mycodo
 
+    def batch(self, calls):
+        """
+        Call several methods in one request
+
+        :param calls: list of [method name, args list, kwargs dict], with args and kwargs optional
+        :return: list of [error message or None, return value], in the order of the calls
+        """
+        results = []
+        for each_call in calls:
+            name = each_call[0]
+            args = each_call[1] if len(each_call) > 1 else ()
+            kwargs = each_call[2] if len(each_call) > 2 else {}
+            if name.startswith('_') or name == 'batch' or not callable(getattr(self, name, None)):
+                results.append([f"Unknown method: {name}", None])
+                continue
+            try:
+                results.append([None, getattr(self, name)(*args, **kwargs)])
+            except Exception as err:
+                self.logger.exception(f"Batch call of {name}")
+                results.append([f"{type(err).__name__}: {err}", None])
+        return results
+
     def lcd_reset(self, lcd_id):
         """Resets an LCD."""
         return self.mycodo.lcd_reset(lcd_id)
@@ -1217,6 +1319,10 @@ class PyroServer(object):
         """Return all output states."""
         return self.mycodo.output_states_all()
 
+    def live_events(self, sequence=None, timeout=0):
+        """Return the measurement and output events after an event number, for the live dashboard stream."""
+        return self.mycodo.live_events(sequence, timeout)
+
     def output_on(self,
                   output_id,
                   output_type=None,
@@ -1295,6 +1401,24 @@ class PyroServer(object):
         """Return the amount of ram used by the daemon."""
         return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / float(1000)
 
+    @staticmethod
+    def query_stats():
+        """Return the SQL query counters of the daemon controller loops."""
+        return query_stats_summary()
+
+    @staticmethod
+    def proxy_pool_stats():
+        """Return the counters of the proxy pool used by the daemon controllers."""
+        return proxy_pool_stats()
+
+    @staticmethod
+    def record_measurement(unique_id, unit, value, measure=None, channel=None, timestamp=None):
+        """Add a measurement written by another process to the measurement caches of the daemon."""
+        record_value(
+            series_key(unique_id, unit, channel, measure),
+            time.time() if timestamp is None else float(timestamp),
+            value)
+
 
 class PyroDaemon(threading.Thread):
     """
@@ -1313,13 +1437,31 @@ class PyroDaemon(threading.Thread):
 
     def run(self):
         try:
-            self.logger.info("Starting Pyro5 daemon")
-            serve({
-                PyroServer(self.mycodo): 'mycodo.pyro_server',
-            }, host="0.0.0.0", port=9080, use_ns=False)
+            if PYRO_TRANSPORT == 'unix' and not DOCKER_CONTAINER:
+                self.logger.info(f"Starting Pyro5 daemon on {PYRO_UNIX_SOCKET}")
+                serve({
+                    PyroServer(self.mycodo): 'mycodo.pyro_server',
+                }, daemon=self.unix_socket_daemon(), use_ns=False)
+            else:
+                self.logger.info("Starting Pyro5 daemon")
+                serve({
+                    PyroServer(self.mycodo): 'mycodo.pyro_server',
+                }, host="0.0.0.0", port=9080, use_ns=False)
         except Exception:
             self.logger.exception("PyroDaemon")
 
+    def unix_socket_daemon(self):
+        """Return a Pyro5 daemon on the Unix domain socket, which the frontend (user mycodo) can use."""
+        if os.path.exists(PYRO_UNIX_SOCKET):
+            os.remove(PYRO_UNIX_SOCKET)  # Left by a daemon that did not shut down cleanly
+        daemon = Daemon(unixsocket=PYRO_UNIX_SOCKET)
+        os.chmod(PYRO_UNIX_SOCKET, 0o660)
+        try:
+            set_user_grp(PYRO_UNIX_SOCKET, 'mycodo', 'mycodo')
+        except Exception:
+            self.logger.exception(f"Could not set the owner of {PYRO_UNIX_SOCKET}")
+        return daemon
+
 
 class PyroMonitor(threading.Thread):
     """
@@ -1342,7 +1484,10 @@ class PyroMonitor(threading.Thread):
                     while now > log_timer:
                         log_timer += self.timer_sec
                     try:
-                        proxy = Proxy("PYRO:mycodo.pyro_server@127.0.0.1:9080")
+                        if PYRO_TRANSPORT == 'unix' and not DOCKER_CONTAINER:
+                            proxy = Proxy(PYRO_URI)
+                        else:
+                            proxy = Proxy("PYRO:mycodo.pyro_server@127.0.0.1:9080")
                         proxy.check_daemon()
                         self.logger.debug(f"Pyro5 daemon monitor: daemon_status() response: '{proxy.daemon_status()}'")
                     except Exception:
@@ -8,7 +8,7 @@ from flask_restx import Resource
 from flask_restx import abort
 from flask_restx import fields
 
-from mycodo.mycodo_client import DaemonControl
+from mycodo.mycodo_client import DaemonControl, batch_values
 from mycodo.mycodo_flask.api import api
 from mycodo.mycodo_flask.api import default_responses
 from mycodo.mycodo_flask.utils import utils_general
@@ -43,9 +43,8 @@ class DaemonStatus(Resource):
 
         try:
             control = DaemonControl()
-            status = control.daemon_status()
-            ram = control.ram_use()
-            virtualenv = control.is_in_virtualenv()
+            status, ram, virtualenv = batch_values(control.batch([
+                ('daemon_status',), ('ram_use',), ('is_in_virtualenv',)]))
             if status == 'alive':
                 return {
                    'is_running': True,
@@ -53,6 +52,7 @@ class DaemonStatus(Resource):
                    'python_virtual_env': virtualenv
                 }, 200
         except Exception:
+            logger.exception("Querying the daemon status")
             return {
                'is_running': False,
                'RAM': None,
@@ -1,6 +1,7 @@
 # coding=utf-8
 import datetime
 import logging
+import time
 import traceback
 
 import flask_login
@@ -8,10 +9,14 @@ from flask_accept import accept
 from flask_restx import Resource, abort, fields
 
 from mycodo.databases.models import Unit
+from mycodo.mycodo_client import DaemonControl
 from mycodo.mycodo_flask.api import api, default_responses
 from mycodo.mycodo_flask.utils import utils_general
-from mycodo.utils.influx import (read_influxdb_list, read_influxdb_single,
-                                 valid_date_str, write_influxdb_value)
+from mycodo.utils.influx import (read_influxdb_bulk, read_influxdb_list,
+                                 read_influxdb_single, valid_date_str,
+                                 write_influxdb_value)
+from mycodo.utils.measurement_cache import measurement_epoch
+from mycodo.utils.query_cache import query_cache
 from mycodo.utils.system_pi import add_custom_units
 
 logger = logging.getLogger(__name__)
@@ -41,6 +46,31 @@ measurement_function_fields = ns_measurement.model('Measurement Function Fields'
     'value': fields.Float,
 })
 
+measurement_series_fields = ns_measurement.model('Measurement Series Fields', {
+    'unique_id': fields.String(description='The unique ID of the device', required=True),
+    'unit': fields.String(description='The unit of the measurement', required=True),
+    'channel': fields.Integer(description='The channel of the measurement', required=False),
+    'measure': fields.String(description='The measurement', required=False)
+})
+
+measurement_bulk_query_fields = ns_measurement.model('Measurement Bulk Query Fields', {
+    'series': fields.List(fields.Nested(measurement_series_fields), required=True),
+    'past_seconds': fields.Integer(
+        description='How many seconds in the past to query (or use epoch_start and epoch_end)',
+        required=False),
+    'epoch_start': fields.Integer(description='The start time, as epoch', required=False),
+    'epoch_end': fields.Integer(description='The end time, as epoch', required=False),
+    'function': fields.String(
+        description='Aggregate to return for each series (LAST, FIRST, MIN, MAX, COUNT, SUM, MEAN)',
+        required=False),
+    'group_seconds': fields.Integer(
+        description='Average measurements in windows of this many seconds', required=False)
+})
+
+measurement_bulk_fields = ns_measurement.model('Measurement Bulk Fields', {
+    'series': fields.List(fields.Nested(measurement_list_fields)),
+})
+
 
 @ns_measurement.route('/create/<string:unique_id>/<string:unit>/<int:channel>/<value>')
 @ns_measurement.doc(
@@ -85,13 +115,21 @@ class MeasurementsCreate(Resource):
                     abort(422, custom='Invalid timestamp format. Must be formatted as %Y-%m-%dT%H:%M:%S.%fZ')
 
         try:
+            epoch = measurement_epoch({'timestamp_utc': timestamp}, False, time.time())
             return_ = write_influxdb_value(
-                unique_id, unit, value, channel=channel, timestamp=timestamp)
+                unique_id, unit, value, channel=channel, timestamp=timestamp, cache=False)
 
             if return_:
                 abort(500)
-            else:
-                return {'message': 'Success'}, 200
+
+            try:
+                # The measurement caches of the daemon are only updated by its own writes
+                control = DaemonControl()
+                control.record_measurement(
+                    unique_id, unit, value, channel=channel, timestamp=epoch)
+            except Exception:
+                logger.exception("Sending the measurement to the daemon")
+            return {'message': 'Success'}, 200
         except Exception:
             abort(500,
                   message='An exception occurred',
@@ -147,8 +185,11 @@ class MeasurementsHistorical(Resource):
             end_str = None
 
         try:
-            return_ = read_influxdb_list(
-                unique_id, unit, channel, start_str=start_str, end_str=end_str)
+            return_ = query_cache.get(
+                ('api_historical', unique_id, unit, channel, epoch_start, epoch_end),
+                lambda: read_influxdb_list(
+                    unique_id, unit, channel, start_str=start_str, end_str=end_str),
+                immutable=query_cache.is_immutable(epoch_end))
             if return_ and len(return_) > 0:
                 dict_return = {'measurements': []}
                 for each_set in return_:
@@ -195,8 +236,10 @@ class MeasurementsLast(Resource):
             abort(422, custom='past_seconds must be >= 1')
 
         try:
-            return_ = read_influxdb_single(
-                unique_id, unit, channel, duration_sec=past_seconds)
+            return_ = query_cache.get(
+                ('api_last', unique_id, unit, channel, past_seconds),
+                lambda: read_influxdb_single(
+                    unique_id, unit, channel, duration_sec=past_seconds))
             if return_ and len(return_) == 2:
                 return {'time': return_[0], 'value': return_[1]}, 200
             else:
@@ -239,8 +282,10 @@ class MeasurementsPast(Resource):
             abort(422, custom='past_seconds must be >= 1')
 
         try:
-            return_ = read_influxdb_list(
-                unique_id, unit, channel, duration_sec=past_seconds)
+            return_ = query_cache.get(
+                ('api_past', unique_id, unit, channel, past_seconds),
+                lambda: read_influxdb_list(
+                    unique_id, unit, channel, duration_sec=past_seconds))
             if return_ and len(return_) > 0:
                 dict_return = {'measurements': []}
                 for each_set in return_:
@@ -253,3 +298,78 @@ class MeasurementsPast(Resource):
             abort(500,
                   message='An exception occurred',
                   error=traceback.format_exc())
+
+
+@ns_measurement.route('/bulk')
+@ns_measurement.doc(
+    security='apikey',
+    responses=default_responses
+)
+class MeasurementsBulk(Resource):
+    """Interacts with Measurement settings in the SQL database."""
+
+    @accept('application/vnd.mycodo.v1+json')
+    @ns_measurement.expect(measurement_bulk_query_fields)
+    @ns_measurement.marshal_with(measurement_bulk_fields)
+    @flask_login.login_required
+    def post(self):
+        """
+        Return lists of measurements of several series with a single database query
+        """
+        if not utils_general.user_has_permission('view_settings'):
+            abort(403)
+
+        payload = ns_measurement.payload or {}
+        series = payload.get('series')
+        if not series:
+            abort(422, custom='series must contain at least one series')
+
+        units = add_custom_units(Unit.query.all())
+        for each_series in series:
+            if 'unique_id' not in each_series or 'unit' not in each_series:
+                abort(422, custom='Each series requires unique_id and unit')
+            if each_series['unit'] not in units:
+                abort(422, custom='Unit ID not found')
+            if each_series.get('channel') is not None and each_series['channel'] < 0:
+                abort(422, custom='channel must be >= 0')
+
+        function = payload.get('function')
+        if function and function not in ['LAST', 'FIRST', 'MIN', 'MAX', 'COUNT', 'SUM', 'MEAN']:
+            abort(422, custom='Invalid function')
+
+        past_seconds = payload.get('past_seconds')
+        epoch_start = payload.get('epoch_start')
+        epoch_end = payload.get('epoch_end')
+        if not past_seconds and not epoch_start and not epoch_end:
+            abort(422, custom='past_seconds or epoch_start/epoch_end must be set')
+        if past_seconds is not None and past_seconds < 1:
+            abort(422, custom='past_seconds must be >= 1')
+
+        start_str = None
+        end_str = None
+        if epoch_start:
+            start_str = datetime.datetime.utcfromtimestamp(
+                float(epoch_start)).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        if epoch_end:
+            end_str = datetime.datetime.utcfromtimestamp(
+                float(epoch_end)).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+        try:
+            return_ = read_influxdb_bulk(
+                series,
+                duration_sec=past_seconds,
+                start_str=start_str,
+                end_str=end_str,
+                value=function,
+                group_sec=payload.get('group_seconds'))
+            dict_return = {'series': []}
+            for each_list in return_:
+                dict_return['series'].append({
+                    'measurements': [
+                        {'time': each_set[0], 'value': each_set[1]} for each_set in each_list]
+                })
+            return dict_return, 200
+        except Exception:
+            abort(500,
+                  message='An exception occurred',
+                  error=traceback.format_exc())
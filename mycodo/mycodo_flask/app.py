@@ -7,17 +7,19 @@ import logging
 import os
 
 import flask_login
-from flask import Flask, flash, redirect, request, url_for
+from flask import Flask, flash, g, redirect, request, url_for
 from flask_babel import Babel, gettext
 from flask_compress import Compress
 from flask_limiter import Limiter
 from flask_login import current_user
 from flask_session import Session
 from flask_talisman import Talisman
+from sqlalchemy import event
 
-from mycodo.config import INSTALL_DIRECTORY, LANGUAGES, ProdConfig
+from mycodo.config import (INSTALL_DIRECTORY, LANGUAGES, QUERY_STATS_ENABLED,
+                           ProdConfig)
 from mycodo.databases.models import Misc, User, Widget, populate_db
-from mycodo.databases.utils import session_scope
+from mycodo.databases.utils import session_scope, set_sqlite_pragmas
 from mycodo.mycodo_flask import (routes_admin, routes_authentication,
                                  routes_dashboard, routes_function,
                                  routes_general, routes_input, routes_method,
@@ -27,6 +29,7 @@ from mycodo.mycodo_flask import (routes_admin, routes_authentication,
 from mycodo.mycodo_flask.api import api_blueprint, init_api
 from mycodo.mycodo_flask.extensions import db
 from mycodo.mycodo_flask.utils.utils_general import get_ip_address
+from mycodo.utils.query_stats import begin_scope, end_scope
 from mycodo.utils.widgets import parse_widget_information
 
 logger = logging.getLogger(__name__)
@@ -55,6 +58,9 @@ def register_extensions(app):
     app.jinja_env.add_extension('jinja2.ext.do')  # Global values in jinja
 
     db.init_app(app)  # Influx db time-series database
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, "connect", set_sqlite_pragmas)
 
     init_api(app)
 
@@ -63,6 +69,7 @@ def register_extensions(app):
     app = extension_limiter(app)  # Limit authentication blueprint requests to 200 per minute
     app = extension_login_manager(app)  # User login management
     app = extension_session(app)  # Server side session
+    app = extension_query_stats(app)  # Count the SQL queries of each request
 
     # Create and populate database if it doesn't exist
     with app.app_context():
@@ -264,3 +271,20 @@ def extension_session(app):
     Session(app)
 
     return app
+
+
+def extension_query_stats(app):
+    @app.before_request
+    def begin_request_queries():
+        if QUERY_STATS_ENABLED:
+            # Counted by URL rule, so unmatched URLs (e.g. scans) share one scope
+            rule = request.url_rule.rule if request.url_rule else '<unmatched>'
+            g.query_scope = begin_scope(f"{request.method} {rule}")
+
+    @app.teardown_request
+    def end_request_queries(exception=None):
+        scope = g.pop('query_scope', None)
+        if scope is not None:
+            end_scope(scope)
+
+    return app
@@ -9,6 +9,7 @@ from wtforms import FileField
 from wtforms import HiddenField
 from wtforms import IntegerField
 from wtforms import SelectField
+from wtforms import SelectMultipleField
 from wtforms import StringField
 from wtforms import SubmitField
 from wtforms import validators
@@ -59,6 +60,18 @@ class ExportMeasurements(FlaskForm):
     export_data_csv = SubmitField(lazy_gettext('Export Data as CSV'))
 
 
+class ExportMeasurementsMultiple(FlaskForm):
+    measurements = SelectMultipleField(
+        lazy_gettext('Measurements to Export'), choices=[], validate_choice=False)
+    date_range = StringField(lazy_gettext('Time Range MM/DD/YYYY HH:MM'))
+    align_sec = IntegerField(
+        lazy_gettext('Average Period (Seconds)'),
+        default=60,
+        validators=[validators.NumberRange(min=0)],
+        widget=NumberInput())
+    export_data_multiple = SubmitField(lazy_gettext('Start Export'))
+
+
 class ExportSettings(FlaskForm):
     export_settings_zip = SubmitField(lazy_gettext('Export Settings'))
 
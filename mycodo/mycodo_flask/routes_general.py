@@ -1,34 +1,42 @@
 # coding=utf-8
-import csv
 import datetime
 import json
 import logging
 import os
 import subprocess
+import time
 from importlib import import_module
-from io import StringIO
 
 import flask_login
-from flask import (Response, flash, jsonify, redirect, send_file,
+from flask import (Response, flash, jsonify, redirect, request, send_file,
                    send_from_directory, url_for)
 from flask.blueprints import Blueprint
 from flask_babel import gettext
 from flask_limiter import Limiter
 from sqlalchemy import and_
 
-from mycodo.config import (DOCKER_CONTAINER, INSTALL_DIRECTORY, LOG_PATH,
+from mycodo.config import (DOCKER_CONTAINER, GRAPH_ASYNC_MAX_POINTS,
+                           GRAPH_LTTB_OVERSAMPLE, INSTALL_DIRECTORY,
+                           LIVE_STREAM_ENABLED, LIVE_STREAM_KEEPALIVE_SEC,
+                           LIVE_STREAM_MAX_SEC, LIVE_STREAM_RETRY_SEC, LOG_PATH,
                            PATH_CAMERAS, PATH_NOTE_ATTACHMENTS)
 from mycodo.databases.models import (PID, Camera, Conversion, CustomController,
-                                     DeviceMeasurements, Input, Misc, Notes,
-                                     NoteTags, Output, OutputChannel)
+                                     DeviceMeasurements, Input, Notes, NoteTags,
+                                     Output, OutputChannel)
 from mycodo.mycodo_client import DaemonControl
 from mycodo.mycodo_flask.routes_authentication import clear_cookie_auth
 from mycodo.mycodo_flask.utils import utils_general
 from mycodo.mycodo_flask.utils.utils_general import get_ip_address
+from mycodo.mycodo_flask.utils.utils_live_stream import live_stream_relay
 from mycodo.mycodo_flask.utils.utils_output import get_all_output_states
 from mycodo.utils.database import db_retrieve_table
-from mycodo.utils.influx import (influx_to_list, influxdb_get_count_points,
-                                 influxdb_get_first_point, query_string)
+from mycodo.utils.downsample import downsample_lttb
+from mycodo.utils.influx import (influx_to_list, influxdb_get_first_point,
+                                 query_string, query_string_stream)
+from mycodo.utils.measurement_cache import series_key
+from mycodo.utils.measurement_export import measurement_exports
+from mycodo.utils.measurement_stream import csv_chunks, peek
+from mycodo.utils.query_cache import query_cache
 from mycodo.utils.system_pi import (assure_path_exists, is_int,
                                     return_measurement_info, str_is_float)
 
@@ -261,6 +269,56 @@ def gpio_state_unique_id(unique_id, channel_id):
     return jsonify(state)
 
 
+@blueprint.route('/live_stream')
+@flask_login.login_required
+def live_stream():
+    """
+    Stream updates of measurements and output states to a dashboard (server-sent events)
+
+    Widgets subscribe with the query parameters measurement=<device_id>,<measurement_id>
+    and output=<output_id>,<channel_id>, each of which may be repeated.
+    """
+    if not LIVE_STREAM_ENABLED:
+        return '', 204  # Closes the EventSource without reconnecting, so widgets poll
+
+    measurements = {}
+    for each_measurement in request.args.getlist('measurement'):
+        device_id, _, measurement_id = each_measurement.partition(',')
+        channel, unit, measurement = last_measurement_info(measurement_id)
+        if unit:
+            key = series_key(device_id, unit, channel, measurement)
+            measurements.setdefault(key, []).append(each_measurement)
+
+    outputs = {}
+    for each_output in request.args.getlist('output'):
+        output_id, _, channel_id = each_output.partition(',')
+        channel = OutputChannel.query.filter(OutputChannel.unique_id == channel_id).first()
+        if channel:
+            outputs.setdefault((output_id, channel.channel), []).append(each_output)
+
+    client = live_stream_relay.open(measurements, outputs)
+    if client is None:
+        return '', 503
+
+    def generate():
+        try:
+            yield f"retry: {LIVE_STREAM_RETRY_SEC * 1000}\n\n"
+            end = time.monotonic() + LIVE_STREAM_MAX_SEC
+            while time.monotonic() < end:
+                message = client.get(timeout=LIVE_STREAM_KEEPALIVE_SEC)
+                if message:
+                    yield f"event: {message[0]}\ndata: {json.dumps(message[1], default=str)}\n\n"
+                else:
+                    yield ": keepalive\n\n"
+        finally:
+            live_stream_relay.close(client)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Not buffered by nginx
+    })
+
+
 @blueprint.route('/widget_execute/<unique_id>')
 @flask_login.login_required
 def widget_execute(unique_id):
@@ -287,16 +345,8 @@ def download_file(dl_type, filename):
     return '', 204
 
 
-@blueprint.route('/last/<unique_id>/<measure_type>/<measurement_id>/<period>')
-@flask_login.login_required
-def last_data(unique_id, measure_type, measurement_id, period):
-    """Return the most recent time and value from influxdb."""
-    if not str_is_float(period):
-        return '', 204
-
-    if measure_type not in ['input', 'function', 'output', 'pid']:
-        return '', 204
-
+def last_measurement_info(measurement_id):
+    """Return the channel, unit, and measurement of the series a dashboard shows for a measurement."""
     measure = DeviceMeasurements.query.filter(
         DeviceMeasurements.unique_id == measurement_id).first()
 
@@ -320,7 +370,22 @@ def last_data(unique_id, measure_type, measurement_id, period):
                     Conversion.unique_id == setpoint_measurement.conversion_id).first()
                 _, unit, measurement = return_measurement_info(setpoint_measurement, conversion)
 
-    try:
+    return channel, unit, measurement
+
+
+@blueprint.route('/last/<unique_id>/<measure_type>/<measurement_id>/<period>')
+@flask_login.login_required
+def last_data(unique_id, measure_type, measurement_id, period):
+    """Return the most recent time and value from influxdb."""
+    if not str_is_float(period):
+        return '', 204
+
+    if measure_type not in ['input', 'function', 'output', 'pid']:
+        return '', 204
+
+    channel, unit, measurement = last_measurement_info(measurement_id)
+
+    def query_last():
         if period != '0':
             data = query_string(
                 unit, unique_id,
@@ -332,15 +397,21 @@ def last_data(unique_id, measure_type, measurement_id, period):
                 measure=measurement, channel=channel, value='LAST')
 
         if not data:
-            return '', 204
+            return
+
+        last = []
+        for table in data:
+            for row in table.records:
+                if '_value' in row.values and '_time' in row.values:
+                    last = f"[{row.values['_time'].timestamp()},{row.values['_value']}]"
+        return last
 
-        live_data = []
-        settings = Misc.query.first()
-        if settings.measurement_db_name == 'influxdb':
-            for table in data:
-                for row in table.records:
-                    if '_value' in row.values and '_time' in row.values:
-                        live_data = f"[{row.values['_time'].timestamp()},{row.values['_value']}]"
+    try:
+        live_data = query_cache.get(
+            ('last', unique_id, unit, channel, measurement, period), query_last)
+
+        if live_data is None:
+            return '', 204
 
         return Response(live_data, mimetype='text/json')
     except Exception as err:
@@ -355,7 +426,6 @@ def export_data(unique_id, measurement_id, start_seconds, end_seconds):
     Return data from start_seconds to end_seconds from influxdb.
     Used for exporting data.
     """
-    settings = Misc.query.first()
     output = Output.query.filter(Output.unique_id == unique_id).first()
     input_dev = Input.query.filter(Input.unique_id == unique_id).first()
 
@@ -384,12 +454,13 @@ def export_data(unique_id, measurement_id, start_seconds, end_seconds):
     end += utc_offset_timedelta
     end_str = end.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
 
-    data = query_string(
+    # Measurements are streamed from the measurement database into the response
+    points = peek(query_string_stream(
         unit, unique_id,
         measure=measurement, channel=channel,
-        start_str=start_str, end_str=end_str)
+        start_str=start_str, end_str=end_str))
 
-    if not data:
+    if not points:
         flash('No measurements to export in this time period', 'error')
         return redirect(url_for('routes_page.page_export'))
 
@@ -398,26 +469,36 @@ def export_data(unique_id, measurement_id, start_seconds, end_seconds):
     col_2 = f'{name} {measurement} ({unique_id})'
     csv_filename = f'{unique_id}_{name}_{measurement}.csv'
 
-    def iter_csv(_data):
-        """Stream CSV file to user for download."""
-        line = StringIO()
-        writer = csv.writer(line)
-        writer.writerow([col_1, col_2])
-
-        if settings.measurement_db_name == 'influxdb':
-            for table in _data:
-                for row in table.records:
-                    writer.writerow([row.values['_time'].timestamp(), row.values['_value']])
-                    line.seek(0)
-                    yield line.read()
-                    line.truncate(0)
-                    line.seek(0)
-
-    response = Response(iter_csv(data), mimetype='text/csv')
+    response = Response(csv_chunks(points, header=[col_1, col_2]), mimetype='text/csv')
     response.headers['Content-Disposition'] = f'attachment; filename="{csv_filename}"'
     return response
 
 
+@blueprint.route('/export_job/<job_id>')
+@flask_login.login_required
+def export_job_status(job_id):
+    """Return the status and progress of a measurement export job."""
+    job = measurement_exports.get(job_id)
+    if not job:
+        return jsonify({'status': 'not found'}), 404
+    return jsonify(job.get_status())
+
+
+@blueprint.route('/export_job/<job_id>/download')
+@flask_login.login_required
+def export_job_download(job_id):
+    """Return the file of a finished measurement export job."""
+    job = measurement_exports.get(job_id)
+    if not job or job.status != 'finished':
+        flash('The export was not found or has not finished', 'error')
+        return redirect(url_for('routes_page.page_export'))
+    return send_file(
+        job.path,
+        mimetype='application/gzip',
+        as_attachment=True,
+        download_name=job.filename)
+
+
 @blueprint.route('/async/<device_id>/<device_type>/<measurement_id>/<start_seconds>/<end_seconds>')
 @flask_login.login_required
 def async_data(device_id, device_type, measurement_id, start_seconds, end_seconds):
@@ -425,11 +506,6 @@ def async_data(device_id, device_type, measurement_id, start_seconds, end_second
     Return data from start_seconds to end_seconds from influxdb.
     Used for asynchronous graph display of many points (up to millions).
     """
-    count_points = None
-    first_point = None
-
-    settings = Misc.query.first()
-
     if device_type == 'tag':
         notes_list = []
         tag = NoteTags.query.filter(NoteTags.unique_id == device_id).first()
@@ -469,166 +545,9 @@ def async_data(device_id, device_type, measurement_id, start_seconds, end_second
     channel, unit, measurement = return_measurement_info(
         measure, conversion)
 
-    # Get all data if start/end not specified
-    if start_seconds == '0' and end_seconds == '0':
-        # Get how many points there are
-        data = query_string(
-            unit, device_id,
-            measure=measurement,
-            channel=channel,
-            value='COUNT')
-
-        if not data:
-            return '', 204
-
-        if settings.measurement_db_name == 'influxdb':
-            count_points = influxdb_get_count_points(data)
-
-        # Get the timestamp of the first point
-        data = query_string(
-            unit, device_id,
-            measure=measurement,
-            channel=channel,
-            limit=1)
-
-        if not data:
-            return '', 204
-
-        if settings.measurement_db_name == 'influxdb':
-            first_point = influxdb_get_first_point(data)
-
-        end = datetime.datetime.utcnow()
-        end_str = end.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-
-    # Set the time frame to the past start epoch to now
-    elif start_seconds != '0' and end_seconds == '0':
-        start = datetime.datetime.utcfromtimestamp(float(start_seconds))
-        start_str = start.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-        end = datetime.datetime.utcnow()
-        end_str = end.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-
-        data = query_string(
-            unit, device_id,
-            measure=measurement,
-            channel=channel,
-            start_str=start_str,
-            end_str=end_str,
-            value='COUNT')
-
-        if not data:
-            return '', 204
-
-        if settings.measurement_db_name == 'influxdb':
-            count_points = influxdb_get_count_points(data)
-
-        # Get the timestamp of the first point in the past year
-        data = query_string(
-            unit, device_id,
-            measure=measurement,
-            channel=channel,
-            start_str=start_str,
-            end_str=end_str,
-            limit=1)
-
-        if not data:
-            return '', 204
-
-        if settings.measurement_db_name == 'influxdb':
-            first_point = influxdb_get_first_point(data)
-    else:
-        start = datetime.datetime.utcfromtimestamp(float(start_seconds))
-        start_str = start.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-        end = datetime.datetime.utcfromtimestamp(float(end_seconds))
-        end_str = end.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-
-        data = query_string(
-            unit, device_id,
-            measure=measurement,
-            channel=channel,
-            start_str=start_str,
-            end_str=end_str,
-            value='COUNT')
-
-        if not data:
-            return '', 204
-
-        if settings.measurement_db_name == 'influxdb':
-            count_points = influxdb_get_count_points(data)
-
-        # Get the timestamp of the first point in the past year
-        data = query_string(
-            unit, device_id,
-            measure=measurement,
-            channel=channel,
-            start_str=start_str,
-            end_str=end_str,
-            limit=1)
-
-        if not data:
-            return '', 204
-
-        if settings.measurement_db_name == 'influxdb':
-            first_point = influxdb_get_first_point(data)
-
-    if not first_point:
-        logger.error("No first point")
-        return '', 204
-
-    start_str = first_point.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-
-    logger.debug(f'Count = {count_points}')
-    logger.debug(f'Start = {first_point}')
-    logger.debug(f'End   = {end}')
-
-    # How many seconds between the start and end period
-    time_difference_seconds = end.timestamp() - first_point.timestamp()
-    logger.debug(f'Difference seconds = {time_difference_seconds}')
-
-    # If there are more than 700 points in the time frame, we need to group
-    # data points into 700 groups with points averaged in each group.
-    if count_points > 700:
-        # Average period between input reads
-        seconds_per_point = time_difference_seconds / count_points
-        logger.debug(f'Seconds per point = {seconds_per_point}')
-
-        # How many seconds to group data points in
-        group_seconds = int(time_difference_seconds / 700)
-        logger.debug(f'Group seconds = {group_seconds}')
-
-        try:
-            data = query_string(
-                unit, device_id,
-                measure=measurement,
-                channel=channel,
-                start_str=start_str,
-                end_str=end_str,
-                group_sec=group_seconds)
-
-            if not data:
-                return '', 204
-
-            if settings.measurement_db_name == 'influxdb':
-                return jsonify(influx_to_list(data))
-        except Exception as err:
-            logger.error(f"URL for 'async_data' raised and error: {err}")
-            return '', 204
-    else:
-        try:
-            data = query_string(
-                unit, device_id,
-                measure=measurement,
-                channel=channel,
-                start_str=start_str,
-                end_str=end_str)
-
-            if not data:
-                return '', 204
-
-            if settings.measurement_db_name == 'influxdb':
-                return jsonify(influx_to_list(data))
-        except Exception as err:
-            logger.error(f"URL for 'async_data' raised and error: {err}")
-            return '', 204
+    return downsampled_data(
+        unit, device_id, start_seconds, end_seconds,
+        measure=measurement, channel=channel)
 
 
 @blueprint.route('/async_usage/<device_id>/<unit>/<channel>/<start_seconds>/<end_seconds>')
@@ -638,167 +557,103 @@ def async_usage_data(device_id, unit, channel, start_seconds, end_seconds):
     Return data from start_seconds to end_seconds from influxdb.
     Used for asynchronous energy usage display of many points (up to millions).
     """
-    settings = Misc.query.first()
-
-    first_point = None
-
-    # Set the time frame to the past year if start/end not specified
     if start_seconds == '0' and end_seconds == '0':
-        # Get how many points there are in the past year
-        end = datetime.datetime.utcnow()
-        end_str = end.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-        start = datetime.datetime.utcfromtimestamp(float(end.timestamp() - 60 * 60 * 24 * 365))
-        start_str = start.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        # Set the time frame to the past year if start/end not specified
+        start_seconds = str(datetime.datetime.utcnow().timestamp() - 60 * 60 * 24 * 365)
 
-        data = query_string(
-            unit, device_id,
-            channel=channel,
-            value='COUNT',
-            start_str=start_str,
-            end_str=end_str)
-
-        if not data:
-            return '', 204
-
-        if settings.measurement_db_name == 'influxdb':
-            count_points = influxdb_get_count_points(data)
+    return downsampled_data(
+        unit, device_id, start_seconds, end_seconds, channel=channel)
 
-        # Get the timestamp of the first point in the past year
-        data = query_string(
-            unit, device_id,
-            channel=channel,
-            limit=1)
-
-        if not data:
-            return '', 204
 
-        if settings.measurement_db_name == 'influxdb':
-            first_point = influxdb_get_first_point(data)
+def downsampled_data(unit, device_id, start_seconds, end_seconds, measure=None, channel=None):
+    """
+    Return data from start_seconds to end_seconds (0 for now), downsampled to a point budget
+
+    The data is averaged in windows sized so the period contains no more than
+    the point budget (request argument "points", default GRAPH_ASYNC_MAX_POINTS),
+    so the data is returned with a single query. Windows without
+    measurements are omitted, so sparse series are returned as they are.
+    With the request argument "method=lttb", the data is averaged in windows
+    GRAPH_LTTB_OVERSAMPLE times smaller and Largest-Triangle-Three-Buckets
+    selects the points to return, which preserves peaks.
+    If start_seconds is 0, the period begins at the first point of the series.
+    """
+    max_points = request.args.get('points', default=GRAPH_ASYNC_MAX_POINTS, type=int)
+    if max_points < 1:
+        max_points = GRAPH_ASYNC_MAX_POINTS
+    use_lttb = request.args.get('method') == 'lttb'
 
-    # Set the time frame to the past start epoch to now
-    elif start_seconds != '0' and end_seconds == '0':
-        start = datetime.datetime.utcfromtimestamp(float(start_seconds))
-        start_str = start.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    if end_seconds == '0':
         end = datetime.datetime.utcnow()
-        end_str = end.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    else:
+        end = datetime.datetime.utcfromtimestamp(float(end_seconds))
+    end_str = end.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
 
+    if start_seconds == '0':
+        # Get the timestamp of the first point
         data = query_string(
             unit, device_id,
+            measure=measure,
             channel=channel,
-            value='COUNT',
-            start_str=start_str,
-            end_str=end_str)
+            value='FIRST')
 
         if not data:
             return '', 204
 
-        if settings.measurement_db_name == 'influxdb':
-            count_points = influxdb_get_count_points(data)
-
-        # Get the timestamp of the first point in the past year
-        data = query_string(
-            unit, device_id,
-            channel=channel,
-            start_str=start_str,
-            end_str=end_str,
-            limit=1)
+        first_point = influxdb_get_first_point(data)
 
-        if not data:
+        if not first_point:
+            logger.error("No first point")
             return '', 204
 
-        if settings.measurement_db_name == 'influxdb':
-            first_point = influxdb_get_first_point(data)
+        start = first_point.replace(tzinfo=None)
     else:
         start = datetime.datetime.utcfromtimestamp(float(start_seconds))
-        start_str = start.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-        end = datetime.datetime.utcfromtimestamp(float(end_seconds))
-        end_str = end.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-
-        data = query_string(
-            unit, device_id,
-            channel=channel,
-            value='COUNT',
-            start_str=start_str,
-            end_str=end_str)
+    start_str = start.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
 
-        if not data:
-            return '', 204
+    # How many seconds between the start and end period
+    time_difference_seconds = (end - start).total_seconds()
 
-        if settings.measurement_db_name == 'influxdb':
-            count_points = influxdb_get_count_points(data)
+    # Average data points in windows so there are no more than max_points
+    if use_lttb:
+        group_seconds = int(time_difference_seconds / (max_points * GRAPH_LTTB_OVERSAMPLE))
+    else:
+        group_seconds = int(time_difference_seconds / max_points)
+    logger.debug(f'Start = {start}, End = {end}, Group seconds = {group_seconds}')
 
-        # Get the timestamp of the first point in the past year
+    def query_data():
         data = query_string(
             unit, device_id,
+            measure=measure,
             channel=channel,
             start_str=start_str,
             end_str=end_str,
-            limit=1)
+            group_sec=group_seconds if group_seconds > 1 else None,
+            create_empty=False)
 
         if not data:
-            return '', 204
-
-        if settings.measurement_db_name == 'influxdb':
-            first_point = influxdb_get_first_point(data)
+            return
 
-    if not first_point:
-        logger.error("No first point")
-        return '', 204
-
-    start_str = first_point.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-
-    logger.debug(f'Count = {count_points}')
-    logger.debug(f'Start = {start}')
-    logger.debug(f'End   = {end}')
-
-    # How many seconds between the start and end period
-    time_difference_seconds = (end - start).total_seconds()
-    logger.debug(f'Difference seconds = {time_difference_seconds}')
+        list_data = influx_to_list(data)
+        if use_lttb:
+            list_data = downsample_lttb(list_data, max_points)
+        return list_data
 
-    # If there are more than 700 points in the time frame, we need to group
-    # data points into 700 groups with points averaged in each group.
-    if count_points > 700:
-        # Average period between input reads
-        seconds_per_point = time_difference_seconds / count_points
-        logger.debug(f'Seconds per point = {seconds_per_point}')
-
-        # How many seconds to group data points in
-        group_seconds = int(time_difference_seconds / 700)
-        logger.debug(f'Group seconds = {group_seconds}')
+    try:
+        list_data = query_cache.get(
+            ('async', unit, device_id, measure, channel,
+             start_seconds, end_seconds, max_points, use_lttb),
+            query_data,
+            immutable=end_seconds != '0' and query_cache.is_immutable(float(end_seconds)))
 
-        try:
-            data = query_string(
-                unit, device_id,
-                channel=channel,
-                start_str=start_str,
-                end_str=end_str,
-                group_sec=group_seconds)
-
-            if not data:
-                return '', 204
-
-            if settings.measurement_db_name == 'influxdb':
-                return jsonify(influx_to_list(data))
-        except Exception as err:
-            logger.error(f"URL for 'async_data' raised and error: {err}")
-            return '', 204
-    else:
-        try:
-            data = query_string(
-                unit, device_id,
-                channel=channel,
-                start_str=start_str,
-                end_str=end_str)
-
-            if not data:
-                return '', 204
-
-            if settings.measurement_db_name == 'influxdb':
-                return jsonify(influx_to_list(data))
-        except Exception as err:
-            logger.error(f"URL for 'async_usage' raised and error: {err}")
+        if list_data is None:
             return '', 204
 
+        return jsonify(list_data)
+    except Exception as err:
+        logger.error(f"URL for 'async_data' raised and error: {err}")
+        return '', 204
+
 
 @blueprint.route('/daemonactive')
 @flask_login.login_required
@@ -34,7 +34,8 @@ from mycodo.databases.models import (PID, AlembicVersion, Camera, Conversion,
                                      Measurement, Misc, Notes, NoteTags,
                                      Output, OutputChannel, Unit, Widget)
 from mycodo.devices.camera import camera_record
-from mycodo.mycodo_client import DaemonControl, daemon_active
+from mycodo.mycodo_client import (DaemonControl, batch_values,
+                                  daemon_active, proxy_pool_stats)
 from mycodo.mycodo_flask.extensions import db
 from mycodo.mycodo_flask.forms import forms_camera, forms_misc, forms_notes
 from mycodo.mycodo_flask.routes_static import inject_variables
@@ -46,6 +47,7 @@ from mycodo.utils.functions import parse_function_information
 from mycodo.utils.inputs import (list_analog_to_digital_converters,
                                  parse_input_information)
 from mycodo.utils.outputs import output_types, parse_output_information
+from mycodo.utils.query_stats import query_stats_summary
 from mycodo.utils.system_pi import (
     add_custom_measurements, add_custom_units, csv_to_list_of_str,
     parse_custom_option_values,
@@ -424,6 +426,7 @@ def page_export():
     Export/Import measurement and settings data
     """
     form_export_measurements = forms_misc.ExportMeasurements()
+    form_export_measurements_multiple = forms_misc.ExportMeasurementsMultiple()
     form_export_settings = forms_misc.ExportSettings()
     form_import_settings = forms_misc.ImportSettings()
     form_export_influxdb = forms_misc.ExportInfluxdb()
@@ -453,6 +456,11 @@ def page_export():
             url = utils_export.export_measurements(form_export_measurements)
             if url:
                 return redirect(url)
+        elif form_export_measurements_multiple.export_data_multiple.data:
+            job_id = utils_export.export_measurements_multiple(
+                form_export_measurements_multiple)
+            if job_id:
+                return redirect(url_for('routes_page.page_export', export_job=job_id))
         elif form_export_settings.export_settings_zip.data:
             file_send = utils_export.export_settings()
             if file_send:
@@ -485,6 +493,8 @@ def page_export():
                            end_picker=end_picker,
                            form_export_influxdb=form_export_influxdb,
                            form_export_measurements=form_export_measurements,
+                           form_export_measurements_multiple=form_export_measurements_multiple,
+                           export_job=request.args.get('export_job'),
                            form_export_settings=form_export_settings,
                            form_import_settings=form_import_settings,
                            choices_function=choices_function,
@@ -605,6 +615,9 @@ def page_info():
 
     virtualenv_flask = False
     virtualenv_daemon = False
+    ram_use_daemon = 0
+    query_stats_daemon = None
+    proxy_pool_daemon = None
     daemon_pid = None
     pstree_daemon_output = None
     top_daemon_output = None
@@ -705,12 +718,16 @@ def page_info():
 
     if daemon_up is True:
         control = DaemonControl()
-        ram_use_daemon = control.ram_use()
-        virtualenv_daemon = control.is_in_virtualenv()
+        try:
+            (ram_use_daemon,
+             virtualenv_daemon,
+             query_stats_daemon,
+             proxy_pool_daemon) = batch_values(control.batch([
+                ('ram_use',), ('is_in_virtualenv',), ('query_stats',), ('proxy_pool_stats',)]))
+        except Exception:
+            logger.exception("Querying the daemon information")
 
         pstree_daemon_output, top_daemon_output = output_pstree_top(daemon_pid)
-    else:
-        ram_use_daemon = 0
 
     if os.path.exists(FRONTEND_PID_FILE):
         with open(FRONTEND_PID_FILE, 'r') as pid_file:
@@ -738,7 +755,11 @@ def page_info():
                            ifconfig=ifconfig_output,
                            pstree_daemon=pstree_daemon_output,
                            pstree_frontend=pstree_frontend_output,
+                           proxy_pool_daemon=proxy_pool_daemon,
+                           proxy_pool_flask=proxy_pool_stats(),
                            python_version=python_version,
+                           query_stats_daemon=query_stats_daemon,
+                           query_stats_flask=query_stats_summary(),
                            ram_use_daemon=ram_use_daemon,
                            ram_use_flask=ram_use_flask,
                            top_daemon=top_daemon_output,
@@ -21,11 +21,16 @@ from mycodo.config import (ALEMBIC_VERSION, DATABASE_NAME, DEPENDENCY_LOG_FILE,
                            PATH_USER_SCRIPTS, PATH_WIDGETS_CUSTOM,
                            SQL_DATABASE_MYCODO)
 from mycodo.config_translations import TRANSLATIONS
-from mycodo.databases.models import Misc
+from mycodo.databases.models import (PID, Conversion, CustomController,
+                                     DeviceMeasurements, Input, Misc, Output)
+from mycodo.databases.utils import checkpoint_sqlite, engines
+from mycodo.mycodo_flask.extensions import db
 from mycodo.mycodo_flask.utils.utils_general import (flash_form_errors,
                                                      flash_success_errors)
 from mycodo.scripts.measurement_db import get_influxdb_info
-from mycodo.utils.system_pi import assure_path_exists, cmd_output
+from mycodo.utils.measurement_export import measurement_exports
+from mycodo.utils.system_pi import (assure_path_exists, cmd_output,
+                                    return_measurement_info)
 from mycodo.utils.tools import (create_measurements_export,
                                 create_settings_export)
 from mycodo.utils.utils import append_to_log
@@ -74,6 +79,73 @@ def export_measurements(form):
     flash_success_errors(error, action, url_for('routes_page.page_export'))
 
 
+def export_measurements_multiple(form):
+    """
+    Take user input to start a background export of several measurements
+    into one compressed CSV file, and return the export job ID
+    """
+    action = '{action} {controller}'.format(
+        action=TRANSLATIONS['export']['title'],
+        controller=TRANSLATIONS['measurement']['title'])
+    error = []
+
+    if not form.validate():
+        flash_form_errors(form)
+        return
+
+    try:
+        start_time = form.date_range.data.split(' - ')[0]
+        start_seconds = int(time.mktime(
+            time.strptime(start_time, '%m/%d/%Y %H:%M')))
+        end_time = form.date_range.data.split(' - ')[1]
+        end_seconds = int(time.mktime(
+            time.strptime(end_time, '%m/%d/%Y %H:%M')))
+
+        if not form.measurements.data:
+            error.append("Select at least one measurement to export")
+        if end_seconds <= start_seconds:
+            error.append("The end of the time range must be after the start")
+
+        series = []
+        for each_measurement in form.measurements.data:
+            device_id, measurement_id = each_measurement.split(',')[:2]
+            device_measurement = DeviceMeasurements.query.filter(
+                DeviceMeasurements.unique_id == measurement_id).first()
+            if not device_measurement:
+                error.append(f"Measurement not found: {measurement_id}")
+                continue
+            conversion = Conversion.query.filter(
+                Conversion.unique_id == device_measurement.conversion_id).first()
+            channel, unit, measurement = return_measurement_info(
+                device_measurement, conversion)
+
+            device = None
+            for each_table in [Input, Output, CustomController, PID]:
+                device = each_table.query.filter(each_table.unique_id == device_id).first()
+                if device:
+                    break
+            name = device.name if device else device_id
+
+            series.append({
+                'unique_id': device_id,
+                'unit': unit,
+                'channel': channel,
+                'measure': measurement,
+                'name': f'{name} CH{channel} {measurement} ({unit}) ({device_id})'
+            })
+
+        if not error:
+            job = measurement_exports.start(
+                series, start_seconds, end_seconds, align_sec=form.align_sec.data)
+            if job:
+                return job.job_id
+            error.append("Too many exports are running. Wait for an export to finish and try again.")
+    except Exception as err:
+        error.append(f"Error: {err}")
+
+    flash_success_errors(error, action, url_for('routes_page.page_export'))
+
+
 def export_settings():
     """
     Save the Mycodo settings database (mycodo.db) to a zip file and serve it
@@ -294,7 +366,16 @@ def import_settings(form):
                 imported_database = os.path.join(tmp_folder, DATABASE_NAME)
                 backup_name = f"{SQL_DATABASE_MYCODO}.backup_{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
 
+                # Write the WAL file into the current database and close the
+                # connections of this process, so the WAL is not applied to the new database
+                checkpoint_sqlite(SQL_DATABASE_MYCODO)
+                db.engine.dispose()
+                engines.dispose_all()
+
                 os.rename(SQL_DATABASE_MYCODO, backup_name)  # rename current database to backup name
+                for suffix in ('-wal', '-shm'):
+                    if os.path.exists(f"{SQL_DATABASE_MYCODO}{suffix}"):
+                        os.remove(f"{SQL_DATABASE_MYCODO}{suffix}")
                 shutil.move(imported_database, SQL_DATABASE_MYCODO)  # move unzipped database to Mycodo
 
                 delete_directories = [
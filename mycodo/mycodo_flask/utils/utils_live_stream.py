@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""Relay of the measurement and output updates of the daemon to the live dashboard streams."""
+import logging
+import threading
+import time
+
+from mycodo.config import (LIVE_STREAM_MAX_CLIENTS, LIVE_STREAM_POLL_SEC,
+                           LIVE_STREAM_QUEUE_SIZE, LIVE_STREAM_RETRY_SEC)
+from mycodo.mycodo_client import DaemonControl
+from mycodo.utils.event_bus import Subscription
+
+logger = logging.getLogger(__name__)
+
+
+class LiveStreamClient(Subscription):
+    """
+    Queue of the updates of the measurements and outputs shown on one dashboard
+
+    Queued items are (event name, data) messages of the stream. When the
+    queue is full, the oldest updates are dropped.
+
+    :param measurements: dict of series key (device_id, unit, channel, measure)
+        to the list of "device_id,measurement_id" the widgets subscribed with
+    :param outputs: dict of (output_id, channel number) to the list of
+        "output_id,channel_id" the widgets subscribed with
+    """
+    def __init__(self, measurements, outputs, max_size=LIVE_STREAM_QUEUE_SIZE):
+        super().__init__((), max_size=max_size, name='live_stream')
+        self.keys = {
+            'measurement': measurements,
+            'output': outputs
+        }
+
+    def add_event(self, event):
+        """Queue an update for each widget subscription that matches a daemon event."""
+        for each_id in self.keys[event['type']].get(tuple(event['key']), ()):
+            self.put(('update', {
+                'type': event['type'],
+                'id': each_id,
+                'timestamp': event['timestamp'],
+                'value': event['value']
+            }))
+
+
+class LiveStreamRelay:
+    """
+    Relay the measurement and output updates of the daemon to the open streams
+
+    While at least one stream is open, a single thread long-polls the
+    daemon for the events after the last one received and queues them for
+    the streams subscribed to them, so the load on the daemon depends on
+    how often measurements and outputs change, not on the number of open
+    dashboards. If events were missed (the daemon restarted or could not
+    be reached), the streams are sent a "resync" message.
+
+    :param max_clients: streams that may be open at once
+    :param poll_sec: longest wait for new events in one call to the daemon
+    """
+    def __init__(self, max_clients=LIVE_STREAM_MAX_CLIENTS, poll_sec=LIVE_STREAM_POLL_SEC, control=None):
+        self.max_clients = max_clients
+        self.poll_sec = poll_sec
+        self.control = control
+        self.lock = threading.Lock()
+        self.clients = ()
+        self.thread = None
+        self.sequence = None
+        self.missed = False
+
+    def open(self, measurements, outputs):
+        """Return a new LiveStreamClient, or None if max_clients streams are open."""
+        with self.lock:
+            if len(self.clients) >= self.max_clients:
+                logger.debug(f"Live stream refused: {len(self.clients)} streams are open")
+                return None
+            client = LiveStreamClient(measurements, outputs)
+            # Replaced, not modified, so the relay thread can iterate without the lock
+            self.clients += (client,)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='live_stream_relay', daemon=True)
+                self.thread.start()
+        return client
+
+    def close(self, client):
+        with self.lock:
+            self.clients = tuple(each for each in self.clients if each is not client)
+        client.close()
+
+    def broadcast(self, message):
+        for each_client in self.clients:
+            each_client.put(message)
+
+    def poll(self, control):
+        """Get the new events from the daemon and queue them for the streams."""
+        try:
+            result = control.live_events(self.sequence, self.poll_sec)
+        except Exception as err:
+            logger.debug(f"Could not get live events from the daemon: {err}")
+            self.sequence = None
+            self.missed = True
+            time.sleep(LIVE_STREAM_RETRY_SEC)
+            return
+
+        if self.missed or not result['complete']:
+            self.broadcast(('resync', {}))
+            self.missed = False
+        self.sequence = result['sequence']
+        for each_event in result['events']:
+            for each_client in self.clients:
+                each_client.add_event(each_event)
+
+    def run(self):
+        control = self.control or DaemonControl()
+        while True:
+            with self.lock:
+                if not self.clients:
+                    # Start from the current event when the next stream opens
+                    self.thread = None
+                    self.sequence = None
+                    self.missed = False
+                    return
+            self.poll(control)
+
+
+live_stream_relay = LiveStreamRelay()
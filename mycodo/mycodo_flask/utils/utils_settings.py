@@ -62,8 +62,9 @@ from mycodo.mycodo_flask.utils.utils_general import delete_entry_with_id
 from mycodo.mycodo_flask.utils.utils_general import flash_form_errors
 from mycodo.mycodo_flask.utils.utils_general import flash_success_errors
 from mycodo.utils.actions import parse_action_information
-from mycodo.utils.database import db_retrieve_table
+from mycodo.utils.database import db_retrieve_table, misc_settings
 from mycodo.utils.functions import parse_function_information
+from mycodo.utils.influx import influxdb_clients
 from mycodo.utils.inputs import parse_input_information
 from mycodo.utils.modules import load_module_from_file
 from mycodo.utils.outputs import parse_output_information
@@ -406,6 +407,9 @@ def settings_general_mod(form):
                 elif form.use_database.data == "influxdb_2":
                     mod_misc.measurement_db_name = "influxdb"
                     mod_misc.measurement_db_version = "2"
+                elif form.use_database.data == "sqlite":
+                    mod_misc.measurement_db_name = "sqlite"
+                    mod_misc.measurement_db_version = ""
 
                 mod_misc.measurement_db_retention_policy = form.measurement_db_retention_policy.data
                 mod_misc.measurement_db_host = form.measurement_db_host.data
@@ -439,6 +443,8 @@ def settings_general_mod(form):
                 mod_user.language = form.language.data
 
                 db.session.commit()
+                misc_settings.invalidate()
+                influxdb_clients.prune(mod_misc)
                 control = DaemonControl()
                 control.refresh_daemon_misc_settings()
                 messages["success"].append('{action} {controller}'.format(
@@ -23,6 +23,7 @@ from mycodo.databases.models import OutputChannel
 from mycodo.databases.models import Trigger
 from mycodo.mycodo_client import DaemonControl
 from mycodo.utils.database import db_retrieve_table_daemon
+from mycodo.utils.event_bus import event_bus
 from mycodo.utils.influx import write_influxdb_value
 from mycodo.utils.outputs import output_types
 
@@ -445,6 +446,18 @@ class AbstractOutput(AbstractBaseController):
 
             self.output_off_triggered[output_channel] = False
 
+        if event_bus.has_subscribers('output_state_changed'):
+            try:
+                event_bus.publish(
+                    'output_state_changed',
+                    output_id=self.unique_id,
+                    channel=output_channel,
+                    state=self.output_state(output_channel),
+                    output_type=output_type,
+                    amount=amount)
+            except Exception:
+                self.logger.exception("Publishing output state")
+
         if trigger_conditionals:
             try:
                 self.check_triggers(self.unique_id, amount=amount, output_channel=output_channel)
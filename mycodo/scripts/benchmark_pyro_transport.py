@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+#
+# Benchmark the latency of daemon calls for each Pyro5 transport and serializer
+# (see PYRO_TRANSPORT and PYRO_FAST_SERIALIZER in config.py)
+#
+# Usage: python benchmark_pyro_transport.py [--calls 2000]
+#
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(__file__, "../../..")))
+
+from Pyro5.api import Daemon, Proxy, expose
+from Pyro5.errors import SerializeError
+
+from mycodo.mycodo_client import ProxyPool
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+@expose
+class BenchmarkServer:
+    """Methods returning values like those of the hot daemon methods."""
+    @staticmethod
+    def output_state(output_id, output_channel):
+        return 'on'
+
+    @staticmethod
+    def pid_get(pid_id, setting):
+        return 21.5
+
+    @staticmethod
+    def output_states_all():
+        return {f'output_{i}': {channel: 'off' for channel in range(4)} for i in range(20)}
+
+
+def run_server(unix_socket, ready):
+    if unix_socket:
+        daemon = Daemon(unixsocket=unix_socket)
+    else:
+        daemon = Daemon(host='127.0.0.1', port=0)
+    ready.put(str(daemon.register(BenchmarkServer(), 'benchmark')))
+    daemon.requestLoop()
+
+
+def time_calls(uri, serializer, method, args, calls, pooled=True):
+    """Return the mean time of a call, in milliseconds (None if the serializer can't be used)."""
+    pool = ProxyPool(uri)
+    try:
+        pool.call(method, 10, args, {}, serializer=serializer)  # Connect
+    except (ValueError, TypeError, SerializeError):
+        return None  # e.g. msgpack does not allow the integer channel keys of output_states_all
+    timer = time.perf_counter()
+    for _ in range(calls):
+        if pooled:
+            pool.call(method, 10, args, {}, serializer=serializer)
+        else:
+            with Proxy(uri) as proxy:
+                proxy._pyroSerializer = serializer
+                getattr(proxy, method)(*args)
+    return (time.perf_counter() - timer) / calls * 1000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark daemon call latency for each Pyro5 transport and serializer")
+    parser.add_argument('--calls', type=int, default=2000, help="Calls of each method")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    serializers = ['serpent', 'marshal'] + (['msgpack'] if msgpack else [])
+    methods = [
+        ('output_state', ('output_1', 0)),
+        ('pid_get', ('pid_1', 'setpoint')),
+        ('output_states_all', ())
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        servers = {}
+        for transport, unix_socket in [('tcp', None), ('unix', os.path.join(tmp_dir, 'pyro.sock'))]:
+            ready = multiprocessing.Queue()
+            process = multiprocessing.Process(target=run_server, args=(unix_socket, ready), daemon=True)
+            process.start()
+            servers[transport] = (ready.get(timeout=30), process)
+
+        results = []
+        tcp_uri = servers['tcp'][0]
+        for method, method_args in methods:
+            results.append(('tcp, serpent, new proxy per call', method,
+                            time_calls(tcp_uri, 'serpent', method, method_args, max(args.calls // 10, 1), pooled=False)))
+        for transport, (uri, _) in servers.items():
+            for serializer in serializers:
+                for method, method_args in methods:
+                    results.append((f'{transport}, {serializer}', method,
+                                    time_calls(uri, serializer, method, method_args, args.calls)))
+
+        for _, process in servers.values():
+            process.terminate()
+
+    baseline = {method: mean_ms for name, method, mean_ms in results if name == 'tcp, serpent'}
+    print(f"Mean of {args.calls} calls (TCP and serpent are the defaults)\n")
+    print(f"{'Configuration':<36}{'Method':<20}{'Latency (ms)':>14}{'vs tcp, serpent':>18}")
+    for name, method, mean_ms in results:
+        if mean_ms is None:
+            print(f"{name:<36}{method:<20}{'unsupported':>14}")
+        else:
+            print(f"{name:<36}{method:<20}{mean_ms:>14.3f}{baseline[method] / mean_ms:>17.2f}x")
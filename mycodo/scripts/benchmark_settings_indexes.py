@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+#
+# Benchmark the lookups of the daemon on the settings database, without and
+# with the indexes added by alembic revision a3d1c7e92b5f
+#
+# Usage: python benchmark_settings_indexes.py [--rows 5000] [--repeat 200]
+#
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(__file__, "../../..")))
+
+from sqlalchemy import and_, create_engine, select
+
+from mycodo.databases.models import (Actions, ConditionalConditions,
+                                     DeviceMeasurements, Notes, OutputChannel,
+                                     Trigger)
+
+MODELS = [DeviceMeasurements, Actions, Trigger, ConditionalConditions, OutputChannel, Notes]
+
+
+def populate(connection, rows):
+    """Add rows to each table, for rows / 10 devices with 10 entries each."""
+    now = datetime.datetime.utcnow()
+    connection.execute(DeviceMeasurements.__table__.insert(), [
+        {'unique_id': f'meas_{i}', 'device_id': f'device_{i // 10}', 'channel': i % 10}
+        for i in range(rows)])
+    connection.execute(Actions.__table__.insert(), [
+        {'unique_id': f'action_{i}', 'function_id': f'function_{i // 10}'}
+        for i in range(rows)])
+    connection.execute(Trigger.__table__.insert(), [
+        {'unique_id': f'trigger_{i}', 'trigger_type': ('trigger_output', 'trigger_edge')[i % 2],
+         'unique_id_1': f'output_{i // 10}', 'unique_id_2': f'channel_{i % 10}'}
+        for i in range(rows)])
+    connection.execute(ConditionalConditions.__table__.insert(), [
+        {'unique_id': f'condition_{i}', 'conditional_id': f'conditional_{i // 10}'}
+        for i in range(rows)])
+    connection.execute(OutputChannel.__table__.insert(), [
+        {'unique_id': f'channel_{i}', 'output_id': f'output_{i // 10}', 'channel': i % 10}
+        for i in range(rows)])
+    connection.execute(Notes.__table__.insert(), [
+        {'unique_id': f'note_{i}', 'date_time': now - datetime.timedelta(minutes=i)}
+        for i in range(rows)])
+
+
+def lookups(rows):
+    """Return the queries of the daemon hot paths, for a device in the middle of the tables."""
+    device = rows // 20
+    now = datetime.datetime.utcnow()
+    return [
+        ('device measurement by device and channel', select(DeviceMeasurements).where(and_(
+            DeviceMeasurements.device_id == f'device_{device}',
+            DeviceMeasurements.channel == 3))),
+        ('actions by function', select(Actions).where(
+            Actions.function_id == f'function_{device}')),
+        ('output trigger by output and channel', select(Trigger).where(and_(
+            Trigger.trigger_type == 'trigger_output',
+            Trigger.unique_id_1 == f'output_{device}',
+            Trigger.unique_id_2 == 'channel_4'))),
+        ('conditions by conditional', select(ConditionalConditions).where(
+            ConditionalConditions.conditional_id == f'conditional_{device}')),
+        ('output channel by output and channel', select(OutputChannel).where(and_(
+            OutputChannel.output_id == f'output_{device}',
+            OutputChannel.channel == 3))),
+        ('notes of the past hour', select(Notes).where(
+            Notes.date_time > now - datetime.timedelta(hours=1))),
+    ]
+
+
+def time_lookups(connection, queries, repeat):
+    """Return the mean time of each query, in milliseconds."""
+    times = []
+    for _, query in queries:
+        timer = time.perf_counter()
+        for _ in range(repeat):
+            connection.execute(query).fetchall()
+        times.append((time.perf_counter() - timer) / repeat * 1000)
+    return times
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark settings database lookups without and with indexes")
+    parser.add_argument('--rows', type=int, default=5000, help="Rows in each table")
+    parser.add_argument('--repeat', type=int, default=200, help="Times each query is run")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'benchmark.db')}")
+        indexes = [index for model in MODELS for index in model.__table__.indexes]
+
+        with engine.begin() as connection:
+            for model in MODELS:
+                model.__table__.create(connection)
+            for index in indexes:
+                index.drop(connection)
+            populate(connection, args.rows)
+
+        queries = lookups(args.rows)
+        with engine.connect() as connection:
+            before = time_lookups(connection, queries, args.repeat)
+
+        with engine.begin() as connection:
+            for index in indexes:
+                index.create(connection)
+            connection.exec_driver_sql("ANALYZE")
+
+        with engine.connect() as connection:
+            after = time_lookups(connection, queries, args.repeat)
+
+        engine.dispose()
+
+    print(f"{args.rows} rows per table, mean of {args.repeat} queries\n")
+    print(f"{'Lookup':<45}{'Before (ms)':>12}{'After (ms)':>12}{'Speedup':>10}")
+    for (name, _), time_before, time_after in zip(queries, before, after):
+        print(f"{name:<45}{time_before:>12.3f}{time_after:>12.3f}{time_before / time_after:>9.1f}x")
@@ -0,0 +1,65 @@
+# coding=utf-8
+"""Tests for the measurement rollup tiers."""
+from mycodo.utils.influx_rollup import (RollupState, merge_rollup_windows,
+                                        rollup_segments)
+
+TIERS = [('1m', 60), ('1h', 3600), ('1d', 86400)]
+DAY = 86400
+
+
+def test_rollup_segments():
+    """Verify a period is split between the coarsest tiers that cover it."""
+    print("\nTest: test_rollup_segments")
+    state = {
+        'since': 0,
+        'tiers': {'1m': 10 * DAY + 7260, '1h': 10 * DAY + 7200, '1d': 10 * DAY}
+    }
+
+    assert rollup_segments(DAY - 3630, 10 * DAY + 7300, state, TIERS) == [
+        (None, DAY - 3630, DAY - 3600),
+        ('1h', DAY - 3600, DAY),
+        ('1d', DAY, 10 * DAY),
+        ('1h', 10 * DAY, 10 * DAY + 7200),
+        ('1m', 10 * DAY + 7200, 10 * DAY + 7260),
+        (None, 10 * DAY + 7260, 10 * DAY + 7300)
+    ]
+
+    # Periods before the rollups begin are read from the raw measurements
+    state['since'] = 5 * DAY
+    assert rollup_segments(DAY, 6 * DAY, state, TIERS) == [
+        (None, DAY, 5 * DAY), ('1d', 5 * DAY, 6 * DAY)]
+
+    # Periods shorter than a window of the finest tier are not covered
+    assert rollup_segments(6 * DAY + 10, 6 * DAY + 50, state, TIERS) == [
+        (None, 6 * DAY + 10, 6 * DAY + 50)]
+
+
+def test_rollup_state_rewind(tmp_path):
+    """Verify rewinding moves every tier back to the window of the timestamp."""
+    print("\nTest: test_rollup_state_rewind")
+    state = RollupState(path=str(tmp_path / 'rollups.json'), tiers=TIERS)
+
+    def set_state(new_state):
+        new_state['since'] = 0
+        new_state['tiers'] = {'1m': 3 * DAY, '1h': 3 * DAY, '1d': 2 * DAY}
+    state.update(set_state)
+
+    state.rewind(2 * DAY + 3700)
+    assert state.read()['tiers'] == {'1m': 2 * DAY + 3660, '1h': 2 * DAY + 3600, '1d': 2 * DAY}
+
+
+def test_merge_rollup_windows():
+    """Verify windows are weighted by their number of measurements and split windows are merged."""
+    print("\nTest: test_merge_rollup_windows")
+    # (epoch, sum, count) of a raw segment ending at 3600 and of a tier segment from 3600
+    parts = [(3000, 20.0, 10), (3600, 60.0, 2), (4100, 5.0, 1)]
+
+    # The window of 3000 to 4000 straddles the segments, and is returned once
+    assert merge_rollup_windows(parts, 1000, 3000, 4500, create_empty=False) == [
+        (4000, 80.0 / 12), (4500, 5.0)]
+
+    # A sparse series has windows without measurements
+    assert merge_rollup_windows([(3000, 20.0, 10)], 1000, 2500, 4500) == [
+        (3000, None), (4000, 2.0), (4500, None)]
+    assert merge_rollup_windows([(3000, 20.0, 10)], 1000, 2500, 4500, create_empty=False) == [
+        (4000, 2.0)]
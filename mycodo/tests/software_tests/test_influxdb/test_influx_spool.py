@@ -0,0 +1,70 @@
+# coding=utf-8
+"""Tests for the measurement spool."""
+import os
+
+from mycodo.utils.influx_spool import MeasurementSpool
+
+
+def test_spool_replay_in_order(tmp_path):
+    """Verify spooled lines are replayed in order and the spool is compacted."""
+    print("\nTest: test_spool_replay_in_order")
+    spool = MeasurementSpool(path=str(tmp_path / 'spool.lp'))
+    spool.append(['line_1', 'line_2', 'line_3'])
+    spool.append(['line_4', 'line_5'])
+
+    assert spool.has_pending()
+
+    batches = []
+    replayed = spool.replay(lambda batch: batches.append(batch) or True, 2)
+
+    assert replayed == 5
+    assert batches == [['line_1', 'line_2'], ['line_3', 'line_4'], ['line_5']]
+    assert not spool.has_pending()
+    assert os.path.getsize(str(tmp_path / 'spool.lp')) == 0
+
+
+def test_spool_replay_stops_on_failure(tmp_path):
+    """Verify a failed batch stays in the spool for the next replay."""
+    print("\nTest: test_spool_replay_stops_on_failure")
+    spool = MeasurementSpool(path=str(tmp_path / 'spool.lp'))
+    spool.append(['line_1', 'line_2', 'line_3'])
+
+    assert spool.replay(lambda batch: False, 2) == 0
+    assert spool.has_pending()
+
+    batches = []
+    assert spool.replay(lambda batch: batches.append(batch) or True, 10) == 3
+    assert batches == [['line_1', 'line_2', 'line_3']]
+
+
+def test_spool_size_cap(tmp_path):
+    """Verify the oldest lines are discarded when the spool is full."""
+    print("\nTest: test_spool_size_cap")
+    spool = MeasurementSpool(path=str(tmp_path / 'spool.lp'), max_bytes=19)
+    spool.append(['aaa', 'bbb', 'ccc'])
+    spool.append(['ddd', 'eee'])
+
+    batches = []
+    spool.replay(lambda batch: batches.append(batch) or True, 10)
+
+    assert batches == [['bbb', 'ccc', 'ddd', 'eee']]
+    assert spool.get_stats()['dropped'] == 1
+
+
+def test_spool_append_during_replay(tmp_path):
+    """Verify lines can be spooled while a replayed batch is being written."""
+    print("\nTest: test_spool_append_during_replay")
+    spool = MeasurementSpool(path=str(tmp_path / 'spool.lp'))
+    spool.append(['line_1', 'line_2'])
+
+    batches = []
+
+    def write(batch):
+        if not batches:
+            assert spool.append(['line_3'])
+        batches.append(batch)
+        return True
+
+    assert spool.replay(write, 2) == 3
+    assert batches == [['line_1', 'line_2'], ['line_3']]
+    assert not spool.has_pending()
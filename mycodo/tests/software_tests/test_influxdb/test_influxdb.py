@@ -1,6 +1,11 @@
 # coding=utf-8
 """Tests for influxdb."""
-from mycodo.utils.influx import add_measurements_influxdb, read_influxdb_single
+import time
+
+from mycodo.utils.influx import (add_measurements_influxdb, flux_aggregate,
+                                 measurement_rollups, read_influxdb_single,
+                                 rewind_late_rollups)
+from mycodo.utils.influx_rollup import RollupState
 
 
 def test_influxdb():
@@ -37,3 +42,31 @@ def test_influxdb():
     returned_measurement = last_measurement[1]
 
     assert returned_measurement == written_measurement
+
+
+def test_flux_aggregate_sparse_series():
+    """Verify windows without measurements can be omitted, so sparse series are graphed without gaps."""
+    print("\nTest: test_flux_aggregate_sparse_series")
+    for db_version in ('1', '2'):
+        assert 'createEmpty: false' in flux_aggregate(db_version, group_sec=864, create_empty=False)
+        assert 'createEmpty' not in flux_aggregate(db_version, group_sec=864)
+    assert flux_aggregate('2', create_empty=False) == ''
+
+
+def test_rewind_late_rollups(tmp_path, monkeypatch):
+    """Verify only measurements older than the recomputed windows rewind the rollups."""
+    print("\nTest: test_rewind_late_rollups")
+    state = RollupState(path=str(tmp_path / 'rollups.json'), tiers=[('1m', 60)])
+    monkeypatch.setattr(measurement_rollups, 'state', state)
+    now = time.time()
+
+    def set_state(new_state):
+        new_state['since'] = 0
+        new_state['tiers'] = {'1m': now // 60 * 60}
+    state.update(set_state)
+
+    rewind_late_rollups([now - 10, None])
+    assert state.read()['tiers'] == {'1m': now // 60 * 60}
+
+    rewind_late_rollups([now - 10, now - 7200])
+    assert state.read()['tiers'] == {'1m': (now - 7200) // 60 * 60}
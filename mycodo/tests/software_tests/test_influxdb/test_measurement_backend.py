@@ -0,0 +1,47 @@
+# coding=utf-8
+"""Tests for the embedded SQLite measurement database."""
+from mycodo.utils.measurement_backend import SQLiteMeasurementBackend
+
+WEEK = 7 * 86400
+
+
+def values(tables):
+    return [(row.values['_time'].timestamp(), row.values['_value'])
+            for table in tables for row in table.records]
+
+
+def test_sqlite_backend_query(tmp_path):
+    """Verify measurements spanning partitions are listed, aggregated, and averaged in windows."""
+    print("\nTest: test_sqlite_backend_query")
+    backend = SQLiteMeasurementBackend(path=str(tmp_path / 'measurements.db'), partition_sec=WEEK)
+
+    # Points on both sides of a partition boundary, and another series
+    backend.write([(WEEK - 20 + i * 10, 'C', 'device_1', 0, 'temperature', float(i)) for i in range(4)])
+    backend.write([(WEEK, 'C', 'device_1', 1, 'temperature', 100.0)])
+    assert len(backend.partitions(backend.connection())) == 2
+
+    assert values(backend.query('C', 'device_1', channel=0)) == [
+        (WEEK - 20, 0.0), (WEEK - 10, 1.0), (WEEK, 2.0), (WEEK + 10, 3.0)]
+    assert values(backend.query('C', 'device_1', channel=0, start=WEEK - 10, end=WEEK + 10)) == [
+        (WEEK - 10, 1.0), (WEEK, 2.0)]
+    assert list(backend.stream('C', 'device_1', channel=0, start=WEEK - 10)) == [
+        (WEEK - 10, 1.0), (WEEK, 2.0), (WEEK + 10, 3.0)]
+
+    assert values(backend.query('C', 'device_1', channel=0, value='LAST')) == [(WEEK + 10, 3.0)]
+    assert values(backend.query('C', 'device_1', channel=0, value='FIRST')) == [(WEEK - 20, 0.0)]
+    assert values(backend.query('C', 'device_1', channel=0, value='MAX')) == [(WEEK + 10, 3.0)]
+    assert values(backend.query('C', 'device_1', channel=0, value='MIN')) == [(WEEK - 20, 0.0)]
+    assert values(backend.query('C', 'device_1', channel=0, value='SUM', end=WEEK + 60)) == [(WEEK + 60, 6.0)]
+    assert values(backend.query('C', 'device_1', channel=0, value='MEAN', end=WEEK + 60)) == [(WEEK + 60, 1.5)]
+    assert values(backend.query('C', 'device_1', value='COUNT', end=WEEK + 60)) == [(WEEK + 60, 5)]
+
+    # Windows are stamped with their end
+    assert values(backend.query('C', 'device_1', channel=0, group_sec=30)) == [
+        (WEEK, 0.5), (WEEK + 30, 2.5)]
+
+    # A window spanning partitions averages the points of both
+    backend.write([(WEEK - 1, 'C', 'device_1', 2, None, 1.0), (WEEK + 1, 'C', 'device_1', 2, None, 3.0)])
+    assert values(backend.query('C', 'device_1', channel=2, group_sec=13)) == [(WEEK + 12, 2.0)]
+
+    assert backend.query('C', 'device_2') == []
+    assert backend.query('C', 'device_1', start=2 * WEEK) == []
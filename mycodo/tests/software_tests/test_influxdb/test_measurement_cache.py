@@ -0,0 +1,67 @@
+# coding=utf-8
+"""Tests for the measurement caches."""
+import time
+
+from mycodo.utils.measurement_cache import (LastValueCache,
+                                            MeasurementRingBuffer,
+                                            WINDOW_STATISTICS,
+                                            window_statistics)
+
+
+def test_last_value_cache():
+    """Verify the last value is returned only when newer than max_age."""
+    print("\nTest: test_last_value_cache")
+    cache = LastValueCache()
+    now = time.time()
+    measurements = {
+        0: {
+            'measurement': 'temperature',
+            'unit': 'C',
+            'value': 21.5
+        }
+    }
+    cache.update_measurements('ID_ASDF', measurements, now=now - 30)
+
+    key = ('ID_ASDF', 'C', '0', 'temperature')
+    assert cache.get(key, 60) == [now - 30, 21.5]
+    assert cache.get(key, 10) is None
+    assert cache.get(key, None) is None
+
+    # An older value does not replace the last value
+    cache.set(key, now - 40, 10.0)
+    assert cache.get(key, 60)[1] == 21.5
+
+
+def test_ring_buffer_window():
+    """Verify windows are returned in order after the buffer wraps."""
+    print("\nTest: test_ring_buffer_window")
+    buffer = MeasurementRingBuffer(40, created=0)
+    for i in range(100):
+        buffer.append(float(i), i * 2)
+
+    times, values = buffer.window(70, 75)
+    assert list(times) == [70.0, 71.0, 72.0, 73.0, 74.0, 75.0]
+    assert list(values) == [140.0, 142.0, 144.0, 146.0, 148.0, 150.0]
+
+    # Points up to 59 have been overwritten
+    assert buffer.window(59) is None
+    assert len(buffer.window(59.5)[0]) == 40
+
+
+def test_window_statistics():
+    """Verify window statistics."""
+    print("\nTest: test_window_statistics")
+    stats = window_statistics([1.0, 2.0, 3.0, 6.0])
+    assert stats['count'] == 4
+    assert stats['sum'] == 12.0
+    assert stats['mean'] == 3.0
+    assert stats['median'] == 2.5
+    assert stats['min'] == 1.0
+    assert stats['max'] == 6.0
+    assert round(stats['stdev'], 6) == 2.160247
+    assert round(stats['stdev_mean_upper'], 6) == 5.160247
+    assert round(stats['stdev_mean_lower'], 6) == 0.839753
+    assert set(WINDOW_STATISTICS) <= set(stats)
+
+    stats = window_statistics([4.0])
+    assert stats['stdev'] is None and stats['stdev_mean_upper'] is None
@@ -0,0 +1,53 @@
+# coding=utf-8
+"""Tests for the device configuration cache of the daemon."""
+import time
+from types import SimpleNamespace
+
+from mycodo.utils.config_cache import DeviceConfig, DeviceConfigCache
+
+
+def test_device_config():
+    """Verify measurements, conversions and output channels are indexed."""
+    print("\nTest: test_device_config")
+    measurements = [
+        SimpleNamespace(unique_id='meas_1', device_id='input_1', channel=0, conversion_id='conv_1'),
+        SimpleNamespace(unique_id='meas_2', device_id='input_1', channel=1, conversion_id=''),
+        SimpleNamespace(unique_id='meas_3', device_id='pid_1', channel=0, conversion_id='')
+    ]
+    conversions = [SimpleNamespace(unique_id='conv_1', equation='x*2')]
+    output_channels = [SimpleNamespace(unique_id='chan_1', output_id='output_1', channel=0)]
+    config = DeviceConfig(measurements, conversions, output_channels)
+
+    assert config.channel_measurements[('input_1', 1)].unique_id == 'meas_2'
+    assert [each.unique_id for each in config.device_measurements['input_1']] == ['meas_1', 'meas_2']
+    assert config.output_channels['chan_1'].channel == 0
+    assert config.channels_output[('output_1', 0)].unique_id == 'chan_1'
+
+    device_measurement, conversion = config.measurement_conversion('meas_1')
+    assert device_measurement.unique_id == 'meas_1' and conversion.equation == 'x*2'
+    assert config.measurement_conversion('meas_2')[1] is None
+    assert config.measurement_conversion('missing') == (None, None)
+
+
+def test_device_config_cache(monkeypatch):
+    """Verify the configuration is only built when enabled, and again after invalidation."""
+    print("\nTest: test_device_config_cache")
+    cache = DeviceConfigCache(max_age=3600)
+    builds = []
+
+    def rebuild():
+        builds.append(1)
+        cache.config = DeviceConfig([], [], [])
+        cache.timestamp = time.monotonic()
+
+    monkeypatch.setattr(cache, 'rebuild', rebuild)
+
+    assert cache.get() is None
+    cache.enable()
+    config = cache.get()
+    assert cache.get() is config
+    assert len(builds) == 1
+
+    cache.invalidate()
+    assert cache.get() is not config
+    assert len(builds) == 2
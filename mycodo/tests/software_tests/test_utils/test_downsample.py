@@ -0,0 +1,31 @@
+# coding=utf-8
+"""Tests for graph data downsampling."""
+import math
+
+from mycodo.utils.downsample import downsample_lttb
+
+
+def test_downsample_lttb_keeps_peaks():
+    """Verify the first, last, and extreme points are kept."""
+    print("\nTest: test_downsample_lttb_keeps_peaks")
+    data = [(float(i), math.sin(i / 100)) for i in range(5000)]
+    data[1234] = (1234.0, 50.0)
+    data[4321] = (4321.0, -50.0)
+
+    downsampled = downsample_lttb(data, 200)
+
+    assert len(downsampled) == 200
+    assert downsampled[0] == data[0]
+    assert downsampled[-1] == data[-1]
+    assert (1234.0, 50.0) in downsampled
+    assert (4321.0, -50.0) in downsampled
+    assert [each[0] for each in downsampled] == sorted(each[0] for each in downsampled)
+
+
+def test_downsample_lttb_small_series():
+    """Verify series within the point budget are returned unchanged."""
+    print("\nTest: test_downsample_lttb_small_series")
+    data = [(1.0, 2.0), (2.0, None), (3.0, 4.0)]
+    assert downsample_lttb(data, 10) == data
+    assert downsample_lttb(data, 2) == [(1.0, 2.0), (3.0, 4.0)]
+    assert downsample_lttb([], 10) == []
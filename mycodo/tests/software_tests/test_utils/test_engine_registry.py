@@ -0,0 +1,55 @@
+# coding=utf-8
+"""Tests for the database engine registry."""
+from sqlalchemy import Column, Integer, text
+from sqlalchemy.orm import declarative_base
+
+from mycodo.databases.utils import EngineRegistry
+
+Base = declarative_base()
+
+
+class Setting(Base):
+    __tablename__ = 'setting'
+    id = Column(Integer, primary_key=True)
+    value = Column(Integer)
+
+
+def test_engine_registry(tmp_path):
+    """Verify one reader and one writer engine are created per database and reused."""
+    print("\nTest: test_engine_registry")
+    registry = EngineRegistry()
+    db_uri = f"sqlite:///{tmp_path / 'settings.db'}"
+
+    session_maker = registry.get_sessionmaker(db_uri)
+    assert registry.get_sessionmaker(db_uri) is session_maker
+    Base.metadata.create_all(registry.get_engine(db_uri, 'writer'))
+
+    for _ in range(5):
+        session = session_maker()
+        assert session.execute(text("SELECT 1")).scalar() == 1
+        assert session.execute(text("PRAGMA journal_mode")).scalar() == 'wal'
+        session.close()
+
+    stats = registry.get_stats()[db_uri]
+    assert stats['reader']['connects'] == 1
+    assert stats['reader']['checkouts'] == 5
+    assert stats['reader']['checkins'] == 5
+    assert stats['reader']['checked_out'] == 0
+
+    # Writes (and reads after them, in the same transaction) use the writer
+    session = session_maker()
+    session.add(Setting(id=1, value=10))
+    session.flush()
+    assert session.query(Setting).filter(Setting.id == 1).one().value == 10
+    assert registry.get_stats()[db_uri]['writer']['checked_out'] == 1
+    session.commit()
+    assert registry.get_stats()[db_uri]['writer']['checked_out'] == 0
+
+    # The next transaction reads with a reader
+    writer_checkouts = registry.get_stats()[db_uri]['writer']['checkouts']
+    assert session.query(Setting).one().value == 10
+    session.close()
+    assert registry.get_stats()[db_uri]['writer']['checkouts'] == writer_checkouts
+
+    registry.dispose_all()
+    assert registry.get_stats() == {}
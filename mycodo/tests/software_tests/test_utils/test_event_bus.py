@@ -0,0 +1,81 @@
+# coding=utf-8
+"""Tests for the event bus of the daemon."""
+import pytest
+
+from mycodo.utils.event_bus import EventBus, EventLog, event_bus
+from mycodo.utils.measurement_cache import record_measurements, record_value, series_key
+
+
+def test_event_bus():
+    """Verify events are delivered by type, and queues drop the oldest events when full."""
+    print("\nTest: test_event_bus")
+    bus = EventBus()
+    outputs = bus.subscribe(['output_state_changed'], max_size=2)
+    everything = bus.subscribe(['output_state_changed', 'pid_setpoint_changed'])
+
+    with pytest.raises(ValueError):
+        bus.subscribe(['not_an_event'])
+
+    for state in ('on', 'off', 'on'):
+        bus.publish('output_state_changed', output_id='output_1', channel=0, state=state)
+    bus.publish('pid_setpoint_changed', pid_id='pid_1', setpoint=20.0)
+    bus.publish('controller_activated', controller_id='input_1', controller_type='Input')
+
+    assert [each.data['state'] for each in outputs.get_all()] == ['off', 'on']
+    assert outputs.dropped == 1
+    assert [each.type for each in everything.get_all()] == ['output_state_changed'] * 3 + ['pid_setpoint_changed']
+    assert everything.get(timeout=0.01) is None
+
+    bus.unsubscribe(outputs)
+    bus.publish('output_state_changed', output_id='output_1', channel=0, state='off')
+    assert outputs.get_all() == []
+    assert len(everything.get_all()) == 1
+
+    stats = bus.get_stats()
+    assert stats['published']['output_state_changed'] == 4
+    assert len(stats['subscriptions']) == 1
+
+
+def test_event_log():
+    """Verify an event log returns the events after a number, and reports missed events."""
+    print("\nTest: test_event_log")
+    bus = EventBus()
+    log = bus.add(EventLog(['output_state_changed'], max_size=3))
+
+    assert log.since() == (0, [], True)
+    assert log.since(0, timeout=0.01) == (0, [], True)
+
+    for state in ('on', 'off', 'on', 'off'):
+        bus.publish('output_state_changed', output_id='output_1', channel=0, state=state)
+
+    sequence, events, complete = log.since(2)
+    assert sequence == 4
+    assert [each.data['state'] for each in events] == ['on', 'off']
+    assert complete
+
+    # Event 1 was dropped from the log
+    sequence, events, complete = log.since(0)
+    assert len(events) == 3
+    assert not complete
+
+    # From a log of a previous daemon process
+    assert log.since(10) == (4, [], False)
+
+
+def test_measurement_written():
+    """Verify written measurements are published."""
+    print("\nTest: test_measurement_written")
+    subscription = event_bus.subscribe(['measurement_written'])
+    try:
+        record_measurements('input_1', {
+            0: {'unit': 'C', 'measurement': 'temperature', 'value': 21.5, 'timestamp_utc': None},
+            1: {'unit': 'percent', 'measurement': 'humidity', 'value': None}
+        })
+        record_value(series_key('output_1', 's', 0, 'duration_time'), 1000.0, 5.0)
+
+        events = subscription.get_all()
+        assert [(each.data['device_id'], each.data['channel'], each.data['value']) for each in events] == [
+            ('input_1', '0', 21.5), ('output_1', '0', 5.0)]
+        assert events[1].data['timestamp'] == 1000.0
+    finally:
+        event_bus.unsubscribe(subscription)
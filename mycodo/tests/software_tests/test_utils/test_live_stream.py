@@ -0,0 +1,55 @@
+# coding=utf-8
+"""Tests for the relay of daemon events to the live dashboard streams."""
+import time
+
+from mycodo.mycodo_flask.utils.utils_live_stream import LiveStreamRelay
+from mycodo.utils.event_bus import EventBus, EventLog
+from mycodo.utils.measurement_cache import series_key
+
+
+class EventLogControl:
+    """Return the events of an event log, like DaemonControl.live_events()."""
+    def __init__(self, log):
+        self.log = log
+
+    def live_events(self, sequence, timeout):
+        sequence, events, complete = self.log.since(sequence, timeout)
+        return {
+            'sequence': sequence,
+            'events': [{
+                'type': 'output',
+                'key': [each.data['output_id'], each.data['channel']],
+                'timestamp': each.timestamp,
+                'value': each.data['state']
+            } for each in events],
+            'complete': complete
+        }
+
+
+def test_live_stream_relay():
+    """Verify updates reach the streams subscribed to them, and the number of streams is limited."""
+    print("\nTest: test_live_stream_relay")
+    bus = EventBus()
+    log = bus.add(EventLog(['output_state_changed']))
+    relay = LiveStreamRelay(max_clients=2, poll_sec=0.05, control=EventLogControl(log))
+
+    output_1 = relay.open({}, {('output_1', 0): ['output_1,channel_1']})
+    output_2 = relay.open({series_key('input_1', 'C', 0, 'temperature'): ['input_1,measurement_1']},
+                          {('output_2', 0): ['output_2,channel_1']})
+    assert relay.open({}, {}) is None
+
+    while relay.sequence is None:  # Wait for the relay to get the current event number
+        time.sleep(0.01)
+    bus.publish('output_state_changed', output_id='output_1', channel=0, state='on')
+
+    event, data = output_1.get(timeout=5)
+    assert event == 'update'
+    assert (data['type'], data['id'], data['value']) == ('output', 'output_1,channel_1', 'on')
+    assert output_2.get(timeout=0.2) is None
+
+    thread = relay.thread
+    relay.close(output_1)
+    relay.close(output_2)
+    thread.join(timeout=5)  # Stops when no stream is open
+    assert relay.thread is None
+    assert relay.sequence is None
@@ -0,0 +1,33 @@
+# coding=utf-8
+"""Tests for exporting several measurements into one file."""
+from mycodo.utils.measurement_export import align_rows, export_periods
+
+DAY = 86400
+
+
+def test_export_periods():
+    """Verify the export period is split at multiples of the chunk and averaging period."""
+    print("\nTest: test_export_periods")
+    assert export_periods(DAY - 100, 3 * DAY + 50, chunk_sec=DAY) == [
+        (DAY - 100, DAY), (DAY, 2 * DAY), (2 * DAY, 3 * DAY), (3 * DAY, 3 * DAY + 50)]
+
+    # The chunk is rounded down to a multiple of the averaging period
+    assert export_periods(0, 1000, chunk_sec=500, align_sec=300) == [
+        (0, 300), (300, 600), (600, 900), (900, 1000)]
+    assert export_periods(10, 10, chunk_sec=DAY) == []
+
+
+def test_align_rows():
+    """Verify measurements are joined into rows by time."""
+    print("\nTest: test_align_rows")
+    series_points = [
+        [(60, 1.0), (120, 2.0), (180, None)],
+        [(120, 20.0), (180, 30.0)],
+        []
+    ]
+    assert list(align_rows(series_points)) == [
+        [60, 1.0, '', ''],
+        [120, 2.0, 20.0, ''],
+        [180, '', 30.0, '']
+    ]
+    assert list(align_rows([[], []])) == []
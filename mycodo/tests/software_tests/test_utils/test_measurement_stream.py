@@ -0,0 +1,36 @@
+# coding=utf-8
+"""Tests for streaming measurements into response chunks."""
+import json
+
+from mycodo.utils.influx import flux_csv_epoch, flux_csv_value
+from mycodo.utils.measurement_stream import csv_chunks, json_chunks, peek
+
+
+def test_measurement_chunks():
+    """Verify chunked CSV and JSON are the same as encoding all measurements at once."""
+    print("\nTest: test_measurement_chunks")
+    points = [(1692612000.0 + i, i * 0.5) for i in range(7)]
+
+    chunks = list(json_chunks(iter(points), chunk_rows=3))
+    assert len(chunks) == 5  # '[', three chunks, ']'
+    assert json.loads(''.join(chunks)) == [list(each) for each in points]
+    assert ''.join(json_chunks(iter([]))) == '[]'
+
+    chunks = list(csv_chunks(iter(points), header=['timestamp (UTC)', 'value'], chunk_rows=3))
+    assert len(chunks) == 3
+    lines = ''.join(chunks).splitlines()
+    assert lines[0] == 'timestamp (UTC),value'
+    assert lines[1:] == [f'{t},{v}' for t, v in points]
+
+    assert peek(iter([])) is None
+    assert list(peek(iter(points))) == points
+
+
+def test_flux_csv_parsing():
+    """Verify times and values of a Flux CSV response are parsed."""
+    print("\nTest: test_flux_csv_parsing")
+    assert flux_csv_epoch('2023-08-21T10:00:00Z') == 1692612000.0
+    assert flux_csv_epoch('2023-08-21T10:00:00.25Z') == 1692612000.25
+    assert abs(flux_csv_epoch('2023-08-21T10:00:00.123456789Z') - 1692612000.123456789) < 1e-6
+    assert flux_csv_value('21.5') == 21.5
+    assert flux_csv_value('') is None
@@ -0,0 +1,91 @@
+# coding=utf-8
+"""Tests for the Pyro5 proxy pool of DaemonControl."""
+import socket
+import threading
+import time
+
+import Pyro5.errors
+import pytest
+from Pyro5.api import Daemon, expose
+
+from mycodo.mycodo_client import (DaemonControl, PooledProxy, ProxyPool,
+                                  batch_values)
+
+
+@expose
+class Server:
+    @staticmethod
+    def echo(value):
+        return value
+
+    @staticmethod
+    def fail():
+        raise ValueError("fail")
+
+    @staticmethod
+    def sleep(seconds):
+        time.sleep(seconds)
+
+
+def test_proxy_pool():
+    """Verify proxies are reused, kept after remote exceptions, and replaced when closed or timed out."""
+    print("\nTest: test_proxy_pool")
+    daemon = Daemon(host='127.0.0.1', port=0)
+    uri = daemon.register(Server(), 'test.server')
+    thread = threading.Thread(target=daemon.requestLoop, daemon=True)
+    thread.start()
+
+    control = DaemonControl(pyro_uri=uri, pyro_timeout=5)
+    control.pool = pool = ProxyPool(str(uri), max_size=2)
+    try:
+        for i in range(5):
+            assert control.proxy().echo(i) == i
+        stats = pool.get_stats()
+        assert stats['created'] == 1 and stats['reused'] == 4
+        assert stats['idle'] == 1 and stats['in_use'] == 0
+
+        with pytest.raises(ValueError):
+            control.proxy().fail()
+        assert pool.get_stats()['errors'] == 0 and pool.get_stats()['idle'] == 1
+
+        fast_proxy = PooledProxy(pool, 5, fast_serializer='marshal', fast_methods=('echo',))
+        assert fast_proxy.echo([1, 'a']) == [1, 'a']
+        assert pool.idle[-1][1]._pyroSerializer == 'marshal'
+        assert control.proxy().echo(1) == 1
+        assert pool.idle[-1][1]._pyroSerializer is None
+
+        threads = [threading.Thread(target=control.proxy().echo, args=(i,)) for i in range(6)]
+        for each_thread in threads:
+            each_thread.start()
+        for each_thread in threads:
+            each_thread.join()
+        stats = pool.get_stats()
+        assert stats['calls'] == 14 and stats['in_use'] == 0 and stats['idle'] <= 2
+
+        # An idle connection closed by the daemon is not reused
+        created, closed = stats['created'], stats['idle']
+        for _, proxy in pool.idle:
+            proxy._pyroConnection.sock.shutdown(socket.SHUT_RD)
+        assert control.proxy().echo(1) == 1
+        stats = pool.get_stats()
+        assert stats['stale'] == closed
+        assert stats['created'] == created + 1
+
+        # A call that times out closes its proxy
+        idle = pool.get_stats()['idle']
+        with pytest.raises(Pyro5.errors.TimeoutError):
+            control.proxy(timeout=0.1).sleep(0.5)
+        stats = pool.get_stats()
+        assert stats['errors'] == 1 and stats['idle'] == idle - 1
+    finally:
+        daemon.shutdown()
+        thread.join(5)
+        daemon.close()
+
+
+def test_batch_values():
+    """Verify the values of batched calls are returned and the first error is raised."""
+    print("\nTest: test_batch_values")
+    assert batch_values([(None, 'on'), (None, 0)]) == ['on', 0]
+    with pytest.raises(Exception, match="Unknown method: missing"):
+        batch_values([(None, 'on'), ("Unknown method: missing", None)])
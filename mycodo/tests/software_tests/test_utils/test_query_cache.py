@@ -0,0 +1,47 @@
+# coding=utf-8
+"""Tests for the query result cache."""
+import time
+
+from mycodo.utils.query_cache import QueryResultCache
+
+
+def test_query_cache_reuses_results():
+    """Verify identical queries in the same time bucket run once."""
+    print("\nTest: test_query_cache_reuses_results")
+    cache = QueryResultCache(ttl_sec=60)
+    calls = []
+
+    def query():
+        calls.append(1)
+        return [(1.0, 2.0)]
+
+    assert cache.get(('past', 'ID_ASDF', 'C', 0), query) == [(1.0, 2.0)]
+    assert cache.get(('past', 'ID_ASDF', 'C', 0), query) == [(1.0, 2.0)]
+    assert cache.get(('past', 'ID_ASDF', 'C', 1), query) == [(1.0, 2.0)]
+    assert len(calls) == 2
+    assert cache.get_stats()['hits'] == 1
+
+    # Results of immutable periods are stored separately and do not expire
+    cache.get(('historical', 'ID_ASDF', 'C', 0, 100, 200), query, immutable=True)
+    cache.ttl_sec = 0.01
+    time.sleep(0.02)
+    cache.get(('historical', 'ID_ASDF', 'C', 0, 100, 200), query, immutable=True)
+    assert len(calls) == 3
+
+
+def test_query_cache_eviction():
+    """Verify the least recently used results are evicted above the limits."""
+    print("\nTest: test_query_cache_eviction")
+    cache = QueryResultCache(ttl_sec=60, max_entries=2)
+    cache.get(('a',), lambda: 'a')
+    cache.get(('b',), lambda: 'b')
+    cache.get(('a',), lambda: 'a')
+    cache.get(('c',), lambda: 'c')
+
+    assert cache.get_stats()['entries'] == 2
+    assert cache.get_stats()['evictions'] == 1
+    assert cache.get(('b',), lambda: 'new') == 'new'
+
+    cache = QueryResultCache(ttl_sec=60, max_bytes=1000)
+    cache.get(('large',), lambda: 'x' * 2000)
+    assert cache.get_stats()['entries'] == 0
@@ -0,0 +1,38 @@
+# coding=utf-8
+"""Tests for counting the SQL queries of requests and loops."""
+from sqlalchemy import create_engine, text
+
+from mycodo.utils.query_stats import query_scope, query_stats
+
+
+def test_query_scope():
+    """Verify the queries of a scope are counted, and nested scopes are counted separately."""
+    print("\nTest: test_query_scope")
+    query_stats.reset()
+    engine = create_engine("sqlite://")
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))  # Not in a scope
+
+        with query_scope("GET /test") as scope:
+            for _ in range(3):
+                conn.execute(text("SELECT 1"))
+            with query_scope("inner") as inner:
+                conn.execute(text("SELECT 2"))
+            assert inner.queries == 1
+        assert scope.queries == 3
+        assert [statement for _, statement in scope.slowest] == ["SELECT 1"] * 3
+
+        with query_scope("GET /test"):
+            conn.execute(text("SELECT 1"))
+
+    stats = query_stats.get_stats()
+    scopes = {each['name']: each for each in stats['scopes']}
+    assert scopes['GET /test']['calls'] == 2
+    assert scopes['GET /test']['queries'] == 4
+    assert scopes['GET /test']['max_queries'] == 3
+    assert scopes['GET /test']['mean_queries'] == 2
+    assert scopes['inner']['queries'] == 1
+    assert stats['scopes'][0]['name'] == 'GET /test'
+    assert {each['statement'] for each in stats['slowest']} == {"SELECT 1", "SELECT 2"}
+    query_stats.reset()
@@ -0,0 +1,32 @@
+# coding=utf-8
+"""Tests for the cached settings snapshot."""
+from types import SimpleNamespace
+
+from mycodo.utils import database
+from mycodo.utils.database import SettingsSnapshot
+
+
+def test_settings_snapshot(monkeypatch):
+    """Verify settings are read once, and again after invalidation or max_age."""
+    print("\nTest: test_settings_snapshot")
+    reads = []
+
+    def retrieve(table, entry=None):
+        reads.append(table)
+        return SimpleNamespace(sample_rate_controller_input=len(reads))
+
+    monkeypatch.setattr(database, 'db_retrieve_table_daemon', retrieve)
+
+    snapshot = SettingsSnapshot('Misc', max_age=3600)
+    assert snapshot.get().sample_rate_controller_input == 1
+    assert snapshot.get().sample_rate_controller_input == 1
+    assert snapshot.version == 1
+    assert reads == ['Misc']
+
+    snapshot.invalidate()
+    assert snapshot.get().sample_rate_controller_input == 2
+    assert snapshot.version == 2
+
+    snapshot.max_age = 0
+    assert snapshot.get().sample_rate_controller_input == 3
+    assert snapshot.version == 3
@@ -23,6 +23,7 @@ from mycodo.databases.models import Trigger
 from mycodo.databases.utils import session_scope
 from mycodo.devices.camera import camera_record
 from mycodo.mycodo_client import DaemonControl
+from mycodo.utils.config_cache import get_measurement_conversion
 from mycodo.utils.database import db_retrieve_table_daemon
 from mycodo.utils.influx import get_last_measurement
 from mycodo.utils.influx import get_past_measurements
@@ -149,13 +150,7 @@ def get_condition_value(condition_id):
         device_id = sql_condition.measurement.split(',')[0]
         measurement_id = sql_condition.measurement.split(',')[1]
 
-        device_measurement = db_retrieve_table_daemon(
-            DeviceMeasurements, unique_id=measurement_id)
-        if device_measurement:
-            conversion = db_retrieve_table_daemon(
-                Conversion, unique_id=device_measurement.conversion_id)
-        else:
-            conversion = None
+        device_measurement, conversion = get_measurement_conversion(measurement_id)
         channel, unit, measurement = return_measurement_info(
             device_measurement, conversion)
 
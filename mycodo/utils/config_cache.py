@@ -0,0 +1,127 @@
+# coding=utf-8
+"""In-memory copy of the device measurement, conversion and output channel settings."""
+import logging
+import threading
+import time
+
+from mycodo.config import DEVICE_CONFIG_MAX_AGE, MYCODO_DB_PATH
+from mycodo.databases.models import Conversion, DeviceMeasurements, OutputChannel
+from mycodo.databases.utils import session_scope
+from mycodo.utils.database import db_retrieve_table_daemon
+
+logger = logging.getLogger("mycodo.config_cache")
+
+
+class DeviceConfig:
+    """
+    Device measurements, conversions and output channels, indexed for lookups
+
+    A DeviceConfig is not changed after it is built. Its entries are
+    detached from their session and shared, so they must not be modified.
+    """
+    def __init__(self, device_measurements, conversions, output_channels):
+        self.measurements = {}
+        self.channel_measurements = {}
+        self.device_measurements = {}
+        for each_meas in device_measurements:
+            self.measurements[each_meas.unique_id] = each_meas
+            self.channel_measurements.setdefault(
+                (each_meas.device_id, each_meas.channel), each_meas)
+            self.device_measurements.setdefault(each_meas.device_id, []).append(each_meas)
+
+        self.conversions = {each_conv.unique_id: each_conv for each_conv in conversions}
+
+        self.output_channels = {}
+        self.channels_output = {}
+        for each_channel in output_channels:
+            self.output_channels[each_channel.unique_id] = each_channel
+            self.channels_output.setdefault(
+                (each_channel.output_id, each_channel.channel), each_channel)
+
+    def measurement_conversion(self, measurement_id):
+        """Return the device measurement and its conversion (or None for each if not found)."""
+        device_measurement = self.measurements.get(measurement_id)
+        if device_measurement is None:
+            return None, None
+        return device_measurement, self.conversions.get(device_measurement.conversion_id)
+
+
+class DeviceConfigCache:
+    """
+    DeviceConfig of the daemon
+
+    The cache is only used by processes that enable it (the daemon), since
+    they are told when the settings change. A new DeviceConfig is built,
+    then replaces the current one, when a controller is activated, an
+    output is set up, or settings are refreshed, and at least every
+    max_age seconds.
+    """
+    def __init__(self, max_age=DEVICE_CONFIG_MAX_AGE):
+        self.max_age = max_age
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.config = None
+        self.timestamp = 0
+        self.invalidated = 0
+        self.version = 0
+
+    def enable(self):
+        self.enabled = True
+
+    def is_current(self):
+        return (self.config is not None and
+                self.timestamp > self.invalidated and
+                time.monotonic() - self.timestamp < self.max_age)
+
+    def get(self):
+        """Return the current DeviceConfig, or None if the cache is not enabled."""
+        if not self.enabled:
+            return None
+        if self.is_current():
+            return self.config
+        with self.lock:
+            if not self.is_current():
+                try:
+                    self.rebuild()
+                except Exception:
+                    if self.config is None:
+                        raise
+                    logger.exception("Could not rebuild the device configuration. Using the previous one.")
+            return self.config
+
+    def rebuild(self):
+        """Read the settings in one transaction and replace the DeviceConfig."""
+        started = time.monotonic()
+        with session_scope(MYCODO_DB_PATH) as new_session:
+            config = DeviceConfig(
+                new_session.query(DeviceMeasurements).order_by(DeviceMeasurements.id).all(),
+                new_session.query(Conversion).all(),
+                new_session.query(OutputChannel).order_by(OutputChannel.id).all())
+            new_session.expunge_all()
+        self.config = config
+        self.timestamp = started
+        self.version += 1
+        logger.debug(f"Device configuration version {self.version} built")
+
+    def invalidate(self):
+        """Build a new DeviceConfig the next time it is used (even if one is being built now)."""
+        self.invalidated = time.monotonic()
+
+
+device_config = DeviceConfigCache()
+
+
+def get_measurement_conversion(measurement_id):
+    """Return a device measurement and its conversion, from the cache if it is enabled."""
+    config = device_config.get()
+    if config is not None:
+        return config.measurement_conversion(measurement_id)
+
+    device_measurement = db_retrieve_table_daemon(
+        DeviceMeasurements, unique_id=measurement_id)
+    if device_measurement:
+        conversion = db_retrieve_table_daemon(
+            Conversion, unique_id=device_measurement.conversion_id)
+    else:
+        conversion = None
+    return device_measurement, conversion
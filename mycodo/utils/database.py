@@ -1,11 +1,13 @@
 # coding=utf-8
 import logging
+import threading
 import time
 from sqlite3 import OperationalError
 
 import sqlalchemy
 
-from mycodo.config import MYCODO_DB_PATH
+from mycodo.config import MISC_SETTINGS_MAX_AGE, MYCODO_DB_PATH
+from mycodo.databases.models import Misc
 from mycodo.databases.utils import session_scope
 
 logger = logging.getLogger("mycodo.database")
@@ -91,3 +93,50 @@ def db_retrieve_table_daemon(
 
         time.sleep(1)
         tries -= 1
+
+
+class SettingsSnapshot:
+    """
+    Cached copy of the first entry of a settings table
+
+    The entry is read from the database when first used, after invalidate()
+    is called (when the settings are saved), and at least every max_age
+    seconds (for changes made by another process). The version is
+    incremented each time the entry is read, so users can tell when the
+    settings may have changed. The entry is detached from its session and
+    is shared, so it must not be modified.
+    """
+    def __init__(self, table, max_age=MISC_SETTINGS_MAX_AGE):
+        self.table = table
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.settings = None
+        self.timestamp = 0
+        self.version = 0
+
+    def is_current(self):
+        return (self.settings is not None and
+                time.monotonic() - self.timestamp < self.max_age)
+
+    def get(self):
+        """Return the settings entry, reading it from the database if the snapshot is not current."""
+        if self.is_current():
+            return self.settings
+
+        with self.lock:
+            if not self.is_current():
+                settings = db_retrieve_table_daemon(self.table, entry='first')
+                if settings is None:
+                    return None
+                self.settings = settings
+                self.timestamp = time.monotonic()
+                self.version += 1
+            return self.settings
+
+    def invalidate(self):
+        """Read the settings from the database the next time they are used."""
+        with self.lock:
+            self.settings = None
+
+
+misc_settings = SettingsSnapshot(Misc)
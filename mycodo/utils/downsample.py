@@ -0,0 +1,97 @@
+# coding=utf-8
+"""Reduce the number of points of a series for display."""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def lttb_indexes(times, values, threshold):
+    """
+    Return the indexes of the points selected by Largest-Triangle-Three-Buckets
+
+    The first and last points are always kept. The points between them are
+    split into threshold - 2 buckets, and from each bucket the point forming
+    the largest triangle with the previously selected point and the average
+    of the next bucket is kept, so peaks and troughs survive downsampling.
+    times must be in ascending order.
+    """
+    length = len(times)
+    if threshold >= length or threshold < 3:
+        return list(range(length))
+
+    buckets = threshold - 2
+
+    if np is not None:
+        x = np.asarray(times, dtype=np.float64)
+        y = np.asarray(values, dtype=np.float64)
+
+        # Bucket i holds the points edges[i] to edges[i + 1] - 1
+        edges = np.linspace(1, length - 1, buckets + 1).astype(np.int64)
+        counts = np.diff(edges)
+
+        # The average point of each bucket, and the last point after the final bucket
+        avg_x = np.append(np.add.reduceat(x[:length - 1], edges[:-1]) / counts, x[-1])
+        avg_y = np.append(np.add.reduceat(y[:length - 1], edges[:-1]) / counts, y[-1])
+
+        indexes = np.empty(threshold, dtype=np.int64)
+        indexes[0] = 0
+        indexes[-1] = length - 1
+        a = 0
+        for i in range(buckets):
+            start, end = edges[i], edges[i + 1]
+            # Twice the area of the triangles (a, each point of the bucket, average of next bucket)
+            area = np.abs(
+                (x[a] - avg_x[i + 1]) * (y[start:end] - y[a]) -
+                (x[a] - x[start:end]) * (avg_y[i + 1] - y[a]))
+            a = start + int(area.argmax())
+            indexes[i + 1] = a
+        return indexes.tolist()
+
+    step = (length - 2) / buckets
+    edges = [int(1 + step * i) for i in range(buckets)] + [length - 1]
+
+    indexes = [0]
+    a = 0
+    for i in range(buckets):
+        start, end = edges[i], edges[i + 1]
+        if i + 1 < buckets:
+            next_start, next_end = edges[i + 1], edges[i + 2]
+            count = next_end - next_start
+            avg_x = sum(times[next_start:next_end]) / count
+            avg_y = sum(values[next_start:next_end]) / count
+        else:
+            avg_x, avg_y = times[-1], values[-1]
+
+        max_area = -1
+        selected = start
+        for j in range(start, end):
+            area = abs(
+                (times[a] - avg_x) * (values[j] - values[a]) -
+                (times[a] - times[j]) * (avg_y - values[a]))
+            if area > max_area:
+                max_area = area
+                selected = j
+        a = selected
+        indexes.append(a)
+    indexes.append(length - 1)
+    return indexes
+
+
+def downsample_lttb(data, max_points):
+    """
+    Downsample a list of (time, value) points to no more than max_points
+
+    Points without a value are removed. Returns data unchanged if it already
+    has no more than max_points points.
+    """
+    if not data or not max_points or len(data) <= max_points:
+        return data
+
+    data = [each for each in data if each[1] is not None]
+    if len(data) <= max_points:
+        return data
+
+    times = [float(each[0]) for each in data]
+    values = [float(each[1]) for each in data]
+    return [data[i] for i in lttb_indexes(times, values, max_points)]
@@ -0,0 +1,206 @@
+# coding=utf-8
+"""Publish/subscribe of measurement and state change events within a process."""
+import collections
+import threading
+import time
+
+from mycodo.config import EVENT_QUEUE_SIZE, LIVE_STREAM_LOG_SIZE
+
+# Event types and the data they carry
+EVENT_TYPES = {
+    # A measurement value was written (device_id, unit, channel, measure, value, timestamp)
+    'measurement_written',
+    # An output channel was switched (output_id, channel, state, output_type, amount)
+    'output_state_changed',
+    # A controller was activated or deactivated (controller_id, controller_type)
+    'controller_activated',
+    'controller_deactivated',
+    # The setpoint of a PID changed (pid_id, setpoint)
+    'pid_setpoint_changed'
+}
+
+
+class Event:
+    """An event with its type, the time it was published (epoch), and its data."""
+    __slots__ = ('type', 'timestamp', 'data')
+
+    def __init__(self, event_type, data, timestamp=None):
+        self.type = event_type
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.data = data
+
+    def __repr__(self):
+        return f"Event({self.type!r}, {self.data!r})"
+
+
+class Subscription:
+    """
+    Bounded queue of the events of the subscribed types
+
+    When the queue is full, the oldest event is dropped, so a slow
+    subscriber never blocks publishers. The number of dropped events is
+    counted.
+    """
+    def __init__(self, event_types, max_size=EVENT_QUEUE_SIZE, name=None):
+        self.event_types = frozenset(event_types)
+        self.name = name
+        self.condition = threading.Condition()
+        self.queue = collections.deque(maxlen=max_size)
+        self.received = 0
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, event):
+        with self.condition:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(event)
+            self.received += 1
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """Return the next event, waiting up to timeout seconds (None if no event arrived)."""
+        with self.condition:
+            if not self.queue and not self.closed:
+                self.condition.wait(timeout)
+            if self.queue:
+                return self.queue.popleft()
+            return None
+
+    def get_all(self):
+        """Return the queued events, without waiting."""
+        with self.condition:
+            events = list(self.queue)
+            self.queue.clear()
+        return events
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class EventLog:
+    """
+    The most recent events of the subscribed types, numbered in order
+
+    Unlike a Subscription, reading does not remove events, so any number
+    of readers can each ask for the events after the last one they saw.
+    """
+    def __init__(self, event_types, max_size=LIVE_STREAM_LOG_SIZE, name=None):
+        self.event_types = frozenset(event_types)
+        self.name = name
+        self.condition = threading.Condition()
+        self.queue = collections.deque(maxlen=max_size)
+        self.sequence = 0
+        self.received = 0
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, event):
+        with self.condition:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.sequence += 1
+            self.queue.append((self.sequence, event))
+            self.received += 1
+            self.condition.notify_all()
+
+    def since(self, sequence=None, timeout=None):
+        """
+        Return the events after an event number
+
+        Waits up to timeout seconds if there are no newer events. Without
+        a sequence number, returns no events, only the current number.
+
+        :return: (number of the last event, events after sequence, complete),
+            where complete is False if some of the events after sequence are
+            no longer in the log (or sequence is from another log)
+        """
+        with self.condition:
+            if sequence is None:
+                return self.sequence, [], True
+            if sequence > self.sequence:
+                return self.sequence, [], False
+            if sequence == self.sequence and not self.closed:
+                self.condition.wait(timeout)
+            events = [event for number, event in self.queue if number > sequence]
+            complete = not self.queue or self.queue[0][0] <= sequence + 1
+            return self.sequence, events, complete
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class EventBus:
+    """Deliver published events to the subscriptions of their type."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = {each_type: () for each_type in EVENT_TYPES}
+        self.published = collections.Counter()
+
+    def subscribe(self, event_types, max_size=EVENT_QUEUE_SIZE, name=None):
+        """Return a new Subscription to the events of the given types."""
+        return self.add(Subscription(event_types, max_size=max_size, name=name))
+
+    def add(self, subscription):
+        """Deliver events to a Subscription, EventLog, or other object with event_types and put(event)."""
+        unknown = set(subscription.event_types) - EVENT_TYPES
+        if unknown:
+            raise ValueError(f"Unknown event types: {', '.join(sorted(unknown))}")
+        with self.lock:
+            for each_type in subscription.event_types:
+                # Replaced, not modified, so publish() can iterate without the lock
+                self.subscriptions[each_type] += (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for each_type in subscription.event_types:
+                self.subscriptions[each_type] = tuple(
+                    each for each in self.subscriptions[each_type] if each is not subscription)
+        subscription.close()
+
+    def has_subscribers(self, event_type):
+        return bool(self.subscriptions[event_type])
+
+    def publish(self, event_type, **data):
+        """Add an event to the queue of each subscription of its type."""
+        subscriptions = self.subscriptions[event_type]
+        with self.lock:
+            self.published[event_type] += 1
+        if not subscriptions:
+            return
+        event = Event(event_type, data)
+        for each_subscription in subscriptions:
+            each_subscription.put(event)
+
+    def get_stats(self):
+        with self.lock:
+            subscriptions = {each for each_type in self.subscriptions.values() for each in each_type}
+            published = dict(self.published)
+        return {
+            'published': published,
+            'subscriptions': [{
+                'name': each.name,
+                'event_types': sorted(each.event_types),
+                'queued': len(each.queue),
+                'received': each.received,
+                'dropped': each.dropped
+            } for each in subscriptions]
+        }
+
+
+event_bus = EventBus()
+
+
+def publish(event_type, **data):
+    """Publish an event on the event bus of this process."""
+    event_bus.publish(event_type, **data)
+
+
+def event_bus_stats():
+    """Return the published event counts and the subscriptions of this process."""
+    return event_bus.get_stats()
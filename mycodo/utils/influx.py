@@ -1,31 +1,721 @@
 # coding=utf-8
+import collections
 import datetime
+import json
 import logging
 import threading
 import time
 
 import requests
 
-from mycodo.databases.models import (Conversion, DeviceMeasurements, Misc,
-                                     Output)
-from mycodo.mycodo_client import DaemonControl
-from mycodo.utils.database import db_retrieve_table_daemon
+from mycodo.config import (MEASUREMENT_ROLLUP_ENABLE,
+                           MEASUREMENT_ROLLUP_LATENESS_SEC,
+                           MEASUREMENT_ROLLUP_MAX_WINDOWS,
+                           MEASUREMENT_ROLLUP_PERIOD_SEC,
+                           MEASUREMENT_ROLLUP_TIERS,
+                           MEASUREMENT_SPOOL_RETRY_SEC,
+                           MEASUREMENT_WRITE_BATCH_SIZE,
+                           MEASUREMENT_WRITE_BLOCK_SEC,
+                           MEASUREMENT_WRITE_DROP_POLICY,
+                           MEASUREMENT_WRITE_FLUSH_SEC,
+                           MEASUREMENT_WRITE_QUEUE_SIZE)
+from mycodo.databases.models import Output
+from mycodo.mycodo_client import DaemonControl, batch_values
+from mycodo.utils.config_cache import get_measurement_conversion
+from mycodo.utils.database import db_retrieve_table_daemon, misc_settings
+from mycodo.utils.influx_rollup import (RollupState, floor_period,
+                                        merge_rollup_windows,
+                                        rollup_measurement, rollup_segments)
+from mycodo.utils.influx_spool import MeasurementSpool
+from mycodo.utils.measurement_backend import get_measurement_backend
+from mycodo.utils.measurement_cache import (add_stdev_bounds,
+                                            last_value_cache,
+                                            measurement_epoch,
+                                            record_measurements, record_value,
+                                            ring_buffers, series_key,
+                                            window_statistics)
 from mycodo.utils.system_pi import return_measurement_info
 
 logger = logging.getLogger("mycodo.influx")
 
 
+#
+# Influxdb client registry
+#
+
+class InfluxConnection:
+    """A connected InfluxDBClient with its write and query APIs."""
+    def __init__(self, client, bucket, version):
+        from influxdb_client.client.write_api import SYNCHRONOUS
+
+        self.client = client
+        self.bucket = bucket
+        self.version = version
+        self.write_api = client.write_api(write_options=SYNCHRONOUS)
+        self.query_api = client.query_api()
+        self.created = time.time()
+        self.uses = 0
+
+    def close(self):
+        try:
+            self.write_api.close()
+        except Exception:
+            pass
+        try:
+            self.client.close()
+        except Exception:
+            pass
+
+
+class InfluxClientRegistry:
+    """
+    Process-wide registry of InfluxDB clients
+
+    One client (and its HTTP connection pool) is kept for each connection
+    configuration and reused by every write and query in the process.
+    A new client is only created when the measurement database settings
+    change, after which stale clients are closed with prune().
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = {}
+        self.stats = {
+            'created': 0,
+            'reused': 0,
+            'closed': 0
+        }
+
+    @staticmethod
+    def connection_key(settings, timeout):
+        return (settings.measurement_db_version,
+                settings.measurement_db_host,
+                settings.measurement_db_port,
+                settings.measurement_db_user,
+                settings.measurement_db_password,
+                settings.measurement_db_dbname,
+                settings.measurement_db_retention_policy,
+                timeout)
+
+    @staticmethod
+    def create_connection(settings, timeout):
+        from influxdb_client import InfluxDBClient
+
+        influxdb_url = f'http://{settings.measurement_db_host}:{settings.measurement_db_port}'
+
+        if settings.measurement_db_version == '1':
+            client = InfluxDBClient(
+                url=influxdb_url,
+                token=f'{settings.measurement_db_user}:{settings.measurement_db_password}',
+                org='mycodo',
+                timeout=timeout)
+            bucket = f'{settings.measurement_db_dbname}/{settings.measurement_db_retention_policy}'
+        elif settings.measurement_db_version == '2':
+            client = InfluxDBClient(
+                url=influxdb_url,
+                username=settings.measurement_db_user,
+                password=settings.measurement_db_password,
+                org='mycodo',
+                timeout=timeout)
+            bucket = settings.measurement_db_dbname
+        else:
+            logger.error(f"Unknown Influxdb version: {settings.measurement_db_version}")
+            return
+
+        return InfluxConnection(client, bucket, settings.measurement_db_version)
+
+    def get_connection(self, settings=None, timeout=5000):
+        """Return the shared connection for the current settings, creating it if needed."""
+        if settings is None:
+            settings = misc_settings.get()
+
+        key = self.connection_key(settings, timeout)
+        with self.lock:
+            connection = self.connections.get(key)
+            if connection:
+                self.stats['reused'] += 1
+            else:
+                connection = self.create_connection(settings, timeout)
+                if not connection:
+                    return
+                self.connections[key] = connection
+                self.stats['created'] += 1
+            connection.uses += 1
+            return connection
+
+    def prune(self, settings=None):
+        """Close clients that no longer match the measurement database settings."""
+        if settings is None:
+            settings = misc_settings.get()
+
+        current = self.connection_key(settings, None)[:-1]
+        with self.lock:
+            for key in list(self.connections):
+                if key[:-1] != current:
+                    self.connections.pop(key).close()
+                    self.stats['closed'] += 1
+
+    def close_all(self):
+        with self.lock:
+            for key in list(self.connections):
+                self.connections.pop(key).close()
+                self.stats['closed'] += 1
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['open'] = len(self.connections)
+            stats['uses'] = sum(each.uses for each in self.connections.values())
+            return stats
+
+
+influxdb_clients = InfluxClientRegistry()
+
+
+def influxdb_client_stats():
+    """Return the connection reuse counters of the InfluxDB client registry."""
+    return influxdb_clients.get_stats()
+
+
+#
+# Batched measurement writer
+#
+
+class InfluxBatchWriter:
+    """
+    Single background writer for measurements from every controller
+
+    Line protocol strings are added to a bounded queue and a single thread
+    writes them to influxdb in batches, flushing when batch_size lines are
+    waiting or the oldest waiting line is older than flush_sec.
+    When the queue is full, drop_policy determines what happens:
+    'oldest' discards the oldest queued line, 'newest' discards the new
+    lines, and 'block' waits up to block_sec for space before discarding
+    the new lines.
+
+    Batches that fail to be written are appended to the on-disk spool.
+    While the spool holds measurements, new batches are also spooled so
+    measurements are stored in order, and the spool is replayed every
+    spool_retry_sec until influxdb accepts the writes again.
+    """
+    def __init__(self,
+                 queue_size=MEASUREMENT_WRITE_QUEUE_SIZE,
+                 batch_size=MEASUREMENT_WRITE_BATCH_SIZE,
+                 flush_sec=MEASUREMENT_WRITE_FLUSH_SEC,
+                 drop_policy=MEASUREMENT_WRITE_DROP_POLICY,
+                 block_sec=MEASUREMENT_WRITE_BLOCK_SEC,
+                 spool_retry_sec=MEASUREMENT_SPOOL_RETRY_SEC):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_sec = flush_sec
+        self.drop_policy = drop_policy
+        self.block_sec = block_sec
+        self.spool_retry_sec = spool_retry_sec
+
+        self.spool = MeasurementSpool()
+        self.spool_pending = None
+        self.timer_replay = 0
+
+        self.queue = collections.deque()
+        self.oldest_queued = None
+        self.condition = threading.Condition()
+        self.thread = None
+        self.running = False
+
+        self.stats = {
+            'queued': 0,
+            'written': 0,
+            'failed': 0,
+            'spooled': 0,
+            'dropped': 0,
+            'batches': 0,
+            'last_flush_sec': 0.0,
+            'max_flush_sec': 0.0,
+            'total_flush_sec': 0.0
+        }
+
+    def start(self):
+        with self.condition:
+            if self.thread and self.thread.is_alive():
+                return
+            if self.spool_pending is None:
+                self.spool_pending = self.spool.has_pending()
+            self.running = True
+            self.thread = threading.Thread(
+                target=self.run, name='influxdb_writer', daemon=True)
+            self.thread.start()
+
+    def put(self, lines):
+        """Queue line protocol strings to be written."""
+        if not self.running:
+            self.start()
+
+        with self.condition:
+            if len(self.queue) + len(lines) > self.queue_size:
+                if self.drop_policy == 'block':
+                    self.condition.wait_for(
+                        lambda: len(self.queue) + len(lines) <= self.queue_size,
+                        timeout=self.block_sec)
+                    if len(self.queue) + len(lines) > self.queue_size:
+                        self.stats['dropped'] += len(lines)
+                        logger.debug(f"Measurement queue full, dropped {len(lines)} new points")
+                        return False
+                elif self.drop_policy == 'newest':
+                    self.stats['dropped'] += len(lines)
+                    logger.debug(f"Measurement queue full, dropped {len(lines)} new points")
+                    return False
+                else:
+                    drop = min(len(self.queue), len(self.queue) + len(lines) - self.queue_size)
+                    for _ in range(drop):
+                        self.queue.popleft()
+                    self.stats['dropped'] += drop
+                    logger.debug(f"Measurement queue full, dropped {drop} oldest points")
+
+            if not self.queue:
+                self.oldest_queued = time.monotonic()
+            self.queue.extend(lines)
+            self.stats['queued'] += len(lines)
+            if len(self.queue) >= self.batch_size:
+                self.condition.notify_all()
+        return True
+
+    def take_batch(self):
+        """Wait until a batch is ready and remove it from the queue."""
+        with self.condition:
+            while self.running:
+                if self.queue:
+                    age = time.monotonic() - self.oldest_queued
+                    if len(self.queue) >= self.batch_size or age >= self.flush_sec:
+                        break
+                    self.condition.wait(self.flush_sec - age)
+                elif self.spool_pending:
+                    # Wake up to retry replaying the spool
+                    self.condition.wait(self.spool_retry_sec)
+                    if not self.queue:
+                        break
+                else:
+                    self.condition.wait()
+
+            count = min(len(self.queue), self.batch_size)
+            batch = [self.queue.popleft() for _ in range(count)]
+            self.oldest_queued = time.monotonic() if self.queue else None
+            self.condition.notify_all()
+            return batch
+
+    def write_batch(self, batch):
+        timer = time.monotonic()
+        try:
+            connection = influxdb_clients.get_connection()
+            if not connection:
+                raise Exception("Could not connect to influxdb")
+            connection.write_api.write(bucket=connection.bucket, record=batch)
+            self.stats['written'] += len(batch)
+            write_success(None, batch)
+            return True
+        except Exception as err:
+            self.stats['failed'] += len(batch)
+            write_fail(None, batch, err)
+            return False
+        finally:
+            flush_sec = time.monotonic() - timer
+            self.stats['batches'] += 1
+            self.stats['last_flush_sec'] = flush_sec
+            self.stats['total_flush_sec'] += flush_sec
+            self.stats['max_flush_sec'] = max(self.stats['max_flush_sec'], flush_sec)
+
+    def spool_lines(self, lines):
+        """Store lines in the on-disk spool to be written when influxdb is available."""
+        if not self.spool.append(lines):
+            self.stats['dropped'] += len(lines)
+            return False
+        self.stats['spooled'] += len(lines)
+        if not self.spool_pending:
+            self.spool_pending = True
+            self.timer_replay = time.monotonic() + self.spool_retry_sec
+        if not self.running:
+            self.start()
+        return True
+
+    def replay_spool(self):
+        if not self.spool_pending or time.monotonic() < self.timer_replay:
+            return
+        self.timer_replay = time.monotonic() + self.spool_retry_sec
+
+        oldest = []
+
+        def write_replayed(batch):
+            if not self.write_batch(batch):
+                return False
+            timestamps = [each for each in map(line_protocol_epoch, batch) if each is not None]
+            if timestamps:
+                oldest.append(min(timestamps))
+            return True
+
+        try:
+            self.spool.replay(write_replayed, self.batch_size)
+        except Exception:
+            logger.exception("Replaying measurement spool")
+        self.spool_pending = self.spool.has_pending()
+
+        # Recompute the rollups that are missing the replayed measurements
+        rewind_late_rollups(oldest)
+
+    def process_batch(self, batch):
+        if self.spool_pending:
+            self.replay_spool()
+        if not batch:
+            return
+        if self.spool_pending:
+            # influxdb is still unavailable, keep spooled measurements in order
+            self.spool_lines(batch)
+        elif self.write_batch(batch):
+            rewind_late_rollups(map(line_protocol_epoch, batch))
+        else:
+            self.spool_lines(batch)
+
+    def run(self):
+        while True:
+            batch = self.take_batch()
+            self.process_batch(batch)
+            if not batch and not self.running:
+                break
+
+    def flush(self, timeout=30):
+        """Write (or spool) everything that is queued, then stop the writer thread."""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join(timeout)
+        while self.queue:
+            self.process_batch(self.take_batch())
+
+    def get_stats(self):
+        with self.condition:
+            stats = dict(self.stats)
+            stats['queue_depth'] = len(self.queue)
+            stats['queue_size'] = self.queue_size
+        stats['spool'] = self.spool.get_stats()
+        if stats['batches']:
+            stats['mean_flush_sec'] = stats['total_flush_sec'] / stats['batches']
+        else:
+            stats['mean_flush_sec'] = 0.0
+        return stats
+
+
+influxdb_writer = InfluxBatchWriter()
+
+
+def influxdb_writer_stats():
+    """Return the queue depth, flush latency and spool size of the batched measurement writer."""
+    return influxdb_writer.get_stats()
+
+
+#
+# Measurement rollups
+#
+
+def flux_time(timestamp):
+    """Return an epoch timestamp as a Flux time."""
+    return datetime.datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def line_protocol_epoch(line):
+    """Return the timestamp (epoch seconds) of a line protocol string, or None if it has none."""
+    try:
+        return int(line.rsplit(' ', 1)[1]) / 1e9
+    except (IndexError, ValueError):
+        return
+
+
+class InfluxRollupUpdater:
+    """
+    Background updater of the measurement rollup tiers
+
+    For every measurement series, each tier stores the min, max, mean, sum,
+    and count of the points in each window as a point of the measurement
+    rollup_<tier>, with the unit as a tag. Every period_sec, the windows
+    completed since the last update are computed for each tier: the finest
+    tier from the raw measurements, and each coarser tier from the tier
+    below it, so each update only reads a small amount of data. Windows
+    within lateness_sec of the last update are recomputed to include points
+    that arrived late, and writes of older measurements (e.g. replayed from
+    the spool or backfilled) rewind the tiers. On the first update, every
+    tier is computed from the first measurement onward, max_windows windows
+    per update.
+    """
+    def __init__(self,
+                 tiers=MEASUREMENT_ROLLUP_TIERS,
+                 period_sec=MEASUREMENT_ROLLUP_PERIOD_SEC,
+                 lateness_sec=MEASUREMENT_ROLLUP_LATENESS_SEC,
+                 max_windows=MEASUREMENT_ROLLUP_MAX_WINDOWS):
+        self.tiers = tiers
+        self.period_sec = period_sec
+        self.lateness_sec = lateness_sec
+        self.max_windows = max_windows
+
+        self.state = RollupState(tiers=tiers)
+        self.event_stop = threading.Event()
+        self.thread = None
+
+        self.stats = {
+            'updates': 0,
+            'failed': 0,
+            'windows': 0,
+            'points_written': 0,
+            'last_update_sec': 0.0
+        }
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.event_stop.clear()
+        self.thread = threading.Thread(
+            target=self.run, name='influxdb_rollups', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=30):
+        self.event_stop.set()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def run(self):
+        while not self.event_stop.is_set():
+            try:
+                self.update()
+            except Exception:
+                self.stats['failed'] += 1
+                logger.exception("Updating measurement rollups")
+            self.event_stop.wait(self.period_sec)
+
+    def rewind(self, timestamp):
+        """Recompute the windows from timestamp onward on the next update."""
+        self.state.rewind(timestamp)
+
+    def first_point_time(self, connection):
+        """Return the time of the first raw measurement, or None if there are none."""
+        query = f'from(bucket: "{connection.bucket}")'
+        query += ' |> range(start: 0)'
+        query += ' |> filter(fn: (r) => r["_field"] == "value" and r["_measurement"] !~ /^rollup_/)'
+        query += ' |> first()'
+        first = None
+        for record in connection.query_api.query_stream(query):
+            timestamp = record.values['_time'].timestamp()
+            if first is None or timestamp < first:
+                first = timestamp
+        return first
+
+    def update(self, now=None):
+        """Compute the completed windows of every tier."""
+        if not MEASUREMENT_ROLLUP_ENABLE:
+            return
+        settings = misc_settings.get()
+        if settings.measurement_db_name != 'influxdb':
+            return
+        connection = influxdb_clients.get_connection(settings=settings, timeout=60000)
+        if not connection:
+            return
+
+        timer = time.monotonic()
+        if now is None:
+            now = time.time()
+
+        state = self.state.read()
+        if state['since'] is None:
+            first = self.first_point_time(connection)
+            since = floor_period(first if first is not None else now, self.tiers[-1][1])
+
+            def set_since(new_state):
+                if new_state['since'] is None:
+                    new_state['since'] = since
+            state = self.state.update(set_since)
+
+        # The finest tier is computed from raw measurements until now, and
+        # each coarser tier from the tier below it until where it is complete
+        source_end = now
+        for index, (name, period) in enumerate(self.tiers):
+            done = state['tiers'].get(name, state['since'])
+            end_limit = floor_period(source_end, period)
+            if end_limit > done:
+                start = max(state['since'], floor_period(done - self.lateness_sec, period))
+                end = min(end_limit, start + period * self.max_windows)
+                self.update_tier(connection, settings.measurement_db_version, index, start, end)
+
+                def set_done(new_state, tier=name, start_tier=start, end_tier=end):
+                    # Don't advance past a rewind that occurred during the update
+                    if new_state['tiers'].get(tier, new_state['since']) >= start_tier:
+                        new_state['tiers'][tier] = end_tier
+                state = self.state.update(set_done)
+            source_end = state['tiers'].get(name, state['since'])
+
+        self.stats['updates'] += 1
+        self.stats['last_update_sec'] = time.monotonic() - timer
+
+    def update_tier(self, connection, db_version, index, start, end):
+        """Compute and write the windows of a tier from start to end."""
+        from influxdb_client import Point
+
+        name, period = self.tiers[index]
+        query = f'from(bucket: "{connection.bucket}")'
+        query += f' |> range(start: {flux_time(start)}, stop: {flux_time(end)})'
+        if index == 0:
+            query += ' |> filter(fn: (r) => r["_field"] == "value" and r["_measurement"] !~ /^rollup_/)'
+            sources = (('min', 'value', 'min'), ('max', 'value', 'max'),
+                       ('sum', 'value', 'sum'), ('count', 'value', 'count'))
+        else:
+            source_measurement = rollup_measurement(self.tiers[index - 1][0])
+            query += f' |> filter(fn: (r) => r["_measurement"] == "{source_measurement}")'
+            sources = (('min', 'min', 'min'), ('max', 'max', 'max'),
+                       ('sum', 'sum', 'sum'), ('count', 'count', 'sum'))
+
+        if db_version == '2':
+            # Aggregate each window in influxdb
+            query = f'data = {query}\n'
+            for stat, field, function in sources:
+                query += (f'data |> filter(fn: (r) => r["_field"] == "{field}")'
+                          f' |> aggregateWindow(every: {period}s, fn: {function},'
+                          f' createEmpty: false, timeSrc: "_start")'
+                          f' |> yield(name: "{stat}")\n')
+        # With influxdb 1.8, sum() and mean() can cause errors, so the
+        # points are aggregated here instead
+
+        windows = {}
+        for record in connection.query_api.query_stream(query):
+            values = record.values
+            if index == 0:
+                unit = values.get('_measurement')
+            else:
+                unit = values.get('unit')
+            key = (unit, values.get('device_id'), values.get('channel'), values.get('measure'))
+
+            if db_version == '2':
+                window_start = values['_time'].timestamp()
+                contributions = ((values['result'], values['_value']),)
+            else:
+                window_start = floor_period(values['_time'].timestamp(), period)
+                if index == 0:
+                    contributions = (('min', values['_value']), ('max', values['_value']),
+                                     ('sum', values['_value']), ('count', 1))
+                elif values.get('_field') in ('min', 'max', 'sum', 'count'):
+                    contributions = ((values['_field'], values['_value']),)
+                else:
+                    continue
+
+            window = windows.setdefault((key, window_start), {})
+            for stat, value in contributions:
+                if value is None:
+                    continue
+                if stat not in window:
+                    window[stat] = value
+                elif stat == 'min':
+                    window[stat] = min(window[stat], value)
+                elif stat == 'max':
+                    window[stat] = max(window[stat], value)
+                else:
+                    window[stat] += value
+
+        points = []
+        for ((unit, device_id, channel, measure), window_start), window in windows.items():
+            if not window.get('count') or unit is None or device_id is None:
+                continue
+            point = Point(rollup_measurement(name)).tag("unit", unit).tag("device_id", device_id)
+            if channel is not None:
+                point = point.tag("channel", channel)
+            if measure is not None:
+                point = point.tag("measure", measure)
+            for stat in ('min', 'max', 'sum', 'count'):
+                if stat in window:
+                    point = point.field(stat, float(window[stat]))
+            if 'sum' in window:
+                point = point.field("mean", float(window['sum']) / window['count'])
+            point = point.time(datetime.datetime.fromtimestamp(window_start, tz=datetime.timezone.utc))
+            points.append(point)
+
+        for i in range(0, len(points), MEASUREMENT_WRITE_BATCH_SIZE):
+            connection.write_api.write(
+                bucket=connection.bucket, record=points[i:i + MEASUREMENT_WRITE_BATCH_SIZE])
+
+        self.stats['windows'] += len(windows)
+        self.stats['points_written'] += len(points)
+        logger.debug(
+            f"Rollup tier {name}: {len(points)} windows from "
+            f"{flux_time(start)} to {flux_time(end)}")
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['state'] = self.state.read()
+        return stats
+
+
+measurement_rollups = InfluxRollupUpdater()
+
+
+def rewind_late_rollups(timestamps):
+    """
+    Rewind the rollups to the oldest of the timestamps (epoch seconds) of
+    written measurements, if it is older than the windows the rollup
+    updater recomputes (e.g. backfilled or replayed measurements)
+
+    The rollup state is stored in a file, so any process may rewind it.
+    """
+    if not MEASUREMENT_ROLLUP_ENABLE:
+        return
+    timestamps = [each for each in timestamps if each is not None]
+    if not timestamps or min(timestamps) >= time.time() - MEASUREMENT_ROLLUP_LATENESS_SEC:
+        return
+    try:
+        measurement_rollups.rewind(min(timestamps))
+    except Exception:
+        logger.exception("Rewinding measurement rollups")
+
+
+def measurement_rollup_stats():
+    """Return the update counters and covered periods of the measurement rollups."""
+    return measurement_rollups.get_stats()
+
+
+#
+# Measurement database selection
+#
+
+def measurement_backend(settings=None):
+    """Return the backend of the selected measurement database, or None for influxdb."""
+    if settings is None:
+        settings = misc_settings.get()
+    return get_measurement_backend(settings.measurement_db_name)
+
+
+def measurements_to_rows(unique_id, measurements, use_same_timestamp=True):
+    """Convert a dict of measurements into a list of rows for a measurement backend."""
+    now = time.time()
+    rows = []
+    for each_channel, each_measurement in measurements.items():
+        if 'value' not in each_measurement or each_measurement['value'] is None:
+            continue
+        rows.append((
+            measurement_epoch(each_measurement, use_same_timestamp, now),
+            each_measurement['unit'],
+            unique_id,
+            each_channel,
+            each_measurement['measurement'],
+            each_measurement['value']))
+    return rows
+
+
 #
 # Influxdb using Flux (influxdb versions 1.8+ and 2.x)
 #
 
-def write_influxdb_value(unique_id, unit, value, measure=None, channel=None, timestamp=None):
+def write_influxdb_value(unique_id, unit, value, measure=None, channel=None, timestamp=None,
+                         cache=True):
     """
     Write a value into an Influxdb database (flux edition, using influxdb_client)
 
     example:
         write_influxdb_value('00000001', 'C', 37.5)
 
+    If influxdb cannot be reached, the value is stored in the measurement
+    spool and written once influxdb is available again.
+
     :return: success (0) or failure (1)
     :rtype: bool
 
@@ -42,56 +732,105 @@ def write_influxdb_value(unique_id, unit, value, measure=None, channel=None, tim
     :type channel:
     :param timestamp: If supplied, this timestamp will be used in the influxdb
     :type timestamp: datetime object
+    :param cache: Add the value to the measurement caches of this process.
+        Processes other than the daemon pass False and send the value to the
+        daemon with DaemonControl.record_measurement() instead, since the
+        caches of other processes never see the measurements of the daemon.
+    :type cache: bool
     """
-    from influxdb_client import InfluxDBClient, Point
-
-    settings = db_retrieve_table_daemon(Misc, entry='first')
-    influxdb_url = f'http://{settings.measurement_db_host}:{settings.measurement_db_port}'
-
-    if settings.measurement_db_version == '1':
-        client = InfluxDBClient(
-            url=influxdb_url,
-            token=f'{settings.measurement_db_user}:{settings.measurement_db_password}',
-            org='mycodo',
-            timeout=5000)
-        bucket = f'{settings.measurement_db_dbname}/{settings.measurement_db_retention_policy}'
-    elif settings.measurement_db_version == '2':
-        client = InfluxDBClient(
-            url=influxdb_url,
-            username=settings.measurement_db_user,
-            password=settings.measurement_db_password,
-            org='mycodo',
-            timeout=5000)
-        bucket = settings.measurement_db_dbname
-    else:
-        logger.error(f"Unknown Influxdb version: {settings.measurement_db_version}")
-        return
+    backend = measurement_backend()
+    if backend:
+        epoch = measurement_epoch({'timestamp_utc': timestamp}, False, time.time())
+        if cache:
+            record_value(series_key(unique_id, unit, channel, measure), epoch, value)
+        try:
+            backend.write([(epoch, unit, unique_id, channel, measure, value)])
+            return 0
+        except Exception as err:
+            logger.error(f"Failed to write measurement to the {backend.name} database "
+                         f"(Device ID: {unique_id}): {err}")
+            return 1
+
+    from influxdb_client import Point
+
+    connection = influxdb_clients.get_connection()
+    if not connection:
+        return 1
+
+    point = Point(unit).tag("device_id", unique_id)
 
-    with client.write_api(success_callback=write_success, error_callback=write_fail) as write_api:
-        point = Point(unit).tag("device_id", unique_id)
+    if measure:
+        point = point.tag("measure", measure)
+    if channel is not None:
+        point = point.tag("channel", channel)
+    if timestamp:
+        point = point.time(timestamp)
+
+    point = point.field("value", value)
 
-        if measure:
-            point = point.tag("measure", measure)
-        if channel is not None:
-            point = point.tag("channel", channel)
+    if cache:
+        record_value(
+            series_key(unique_id, unit, channel, measure),
+            measurement_epoch({'timestamp_utc': timestamp}, False, time.time()),
+            value)
+
+    try:
+        connection.write_api.write(bucket=connection.bucket, record=point)
+        write_success(None, point)
+        if timestamp:
+            rewind_late_rollups([measurement_epoch({'timestamp_utc': timestamp}, False, 0)])
+        return 0
+    except Exception as err:
+        write_fail(None, point, err)
+        logger.debug(
+            f"Failed to write measurement to influxdb (Device ID: {unique_id}): {err}. "
+            f"Spooling measurement to be written when influxdb is available.")
+        if not timestamp:
+            point = point.time(datetime.datetime.utcnow())
+        if influxdb_writer.spool_lines([point.to_line_protocol()]):
+            return 0
+        return 1
+
+
+def measurements_to_points(unique_id, measurements, use_same_timestamp=True, timestamp_now=False):
+    """
+    Convert a dict of measurements into a list of influxdb Points
+    :param unique_id: Unique ID of device
+    :param measurements: dict of measurements
+    :param use_same_timestamp: Allow influxdb to create the timestamp upon storage
+    :param timestamp_now: Stamp points without a timestamp with the current time
+        (used when points are queued before being stored)
+    :return: list of Points
+    """
+    from influxdb_client import Point
+
+    now = datetime.datetime.utcnow() if timestamp_now else None
+
+    points = []
+    for each_channel, each_measurement in measurements.items():
+        if 'value' not in each_measurement or each_measurement['value'] is None:
+            continue  # skip to next measurement to add
+
+        if use_same_timestamp:
+            # influxdb will create the timestamp when the data is stored
+            timestamp = now
+        else:
+            # Use timestamp stored with each measurement
+            timestamp = each_measurement['timestamp_utc']
+
+        point = Point(each_measurement['unit']).tag("device_id", unique_id)
+
+        if each_measurement['measurement']:
+            point = point.tag("measure", each_measurement['measurement'])
+        if each_channel is not None:
+            point = point.tag("channel", each_channel)
         if timestamp:
             point = point.time(timestamp)
 
-        point = point.field("value", value)
+        point = point.field("value", each_measurement['value'])
+        points.append(point)
 
-        try:
-            write_api.write(bucket=bucket, record=point)
-            return 0
-        except Exception as except_msg:
-            logger.debug(f"Failed to write measurements to influxdb with ID {unique_id}. Retrying in 5 seconds.")
-            time.sleep(5)
-            try:
-                write_api.write(bucket=bucket, record=point)
-                return 0
-            except:
-                logger.debug(
-                    f"Failed to write measurement to influxdb (Device ID: {unique_id}): {except_msg}.")
-                return 1
+    return points
 
 
 def add_measurements_influxdb_flux(unique_id, measurements, use_same_timestamp=True, block=False):
@@ -102,53 +841,26 @@ def add_measurements_influxdb_flux(unique_id, measurements, use_same_timestamp=T
     :param use_same_timestamp: Allow influxdb to create the timestamp upon storage
     :return:
     """
-    from influxdb_client import InfluxDBClient, Point
-
-    settings = db_retrieve_table_daemon(Misc, entry='first')
-    influxdb_url = f'http://{settings.measurement_db_host}:{settings.measurement_db_port}'
-
-    if settings.measurement_db_version == '1':
-        client = InfluxDBClient(
-            url=influxdb_url,
-            token=f'{settings.measurement_db_user}:{settings.measurement_db_password}',
-            org='mycodo',
-            timeout=5000)
-        bucket = f'{settings.measurement_db_dbname}/{settings.measurement_db_retention_policy}'
-    elif settings.measurement_db_version == '2':
-        client = InfluxDBClient(
-            url=influxdb_url,
-            username=settings.measurement_db_user,
-            password=settings.measurement_db_password,
-            org='mycodo',
-            timeout=5000)
-        bucket = settings.measurement_db_dbname
-    else:
-        logger.error(f"Unknown Influxdb version: {settings.measurement_db_version}")
+    connection = influxdb_clients.get_connection()
+    if not connection:
         return
 
-    with client.write_api(success_callback=write_success, error_callback=write_fail) as write_api:
-        for each_channel, each_measurement in measurements.items():
-            if 'value' not in each_measurement or each_measurement['value'] is None:
-                continue  # skip to next measurement to add
-
-            if use_same_timestamp:
-                # influxdb will create the timestamp when the data is stored
-                timestamp = None
-            else:
-                # Use timestamp stored with each measurement
-                timestamp = each_measurement['timestamp_utc']
-
-            point = Point(each_measurement['unit']).tag("device_id", unique_id)
-
-            if each_measurement['measurement']:
-                point = point.tag("measure", each_measurement['measurement'])
-            if each_channel is not None:
-                point = point.tag("channel", each_channel)
-            if timestamp:
-                point = point.time(timestamp)
+    points = measurements_to_points(unique_id, measurements, use_same_timestamp)
+    if not points:
+        return
 
-            point = point.field("value", each_measurement['value'])
-            write_api.write(bucket=bucket, record=point)
+    try:
+        connection.write_api.write(bucket=connection.bucket, record=points)
+        write_success(None, points)
+        if not use_same_timestamp:
+            rewind_late_rollups(
+                measurement_epoch(each, False, 0) for each in measurements.values()
+                if each.get('timestamp_utc'))
+    except Exception as err:
+        write_fail(None, points, err)
+        points = measurements_to_points(
+            unique_id, measurements, use_same_timestamp, timestamp_now=True)
+        influxdb_writer.spool_lines([each.to_line_protocol() for each in points])
 
 
 def write_fail(point_data, written_data, err):
@@ -161,89 +873,67 @@ def write_success(point_data, written_data):
 
 def add_measurements_influxdb(unique_id, measurements, use_same_timestamp=True, block=False):
     """
-    Parse measurement data into list to be input into influxdb (threaded so returns fast)
+    Parse measurement data into list to be input into influxdb (queued so returns fast)
     :param unique_id: Unique ID of device
     :param measurements: dict of measurements
     :param use_same_timestamp: Allow influxdb to create the timestamp upon storage
     :param block: wait until measurements are added before returning
     :return:
     """
-    if block:
-        add_measurements_influxdb_flux(unique_id, measurements, use_same_timestamp)
-    else:
-        write_db = threading.Thread(
-            target=add_measurements_influxdb_flux,
-            args=(unique_id, measurements, use_same_timestamp,))
-        write_db.start()
+    record_measurements(unique_id, measurements, use_same_timestamp)
 
+    backend = measurement_backend()
+    if backend:
+        try:
+            backend.write(measurements_to_rows(unique_id, measurements, use_same_timestamp))
+        except Exception as err:
+            logger.error(f"Failed to write measurements to the {backend.name} database "
+                         f"(Device ID: {unique_id}): {err}")
+        return
 
-def query_flux(unit, unique_id,
-               value=None, measure=None, channel=None, ts_str=None,
-               start_str=None, end_str=None, min_value=None, max_value=None, past_sec=None, group_sec=None,
-               limit=None):
-    """Generate influxdb query string (flux edition, using influxdb_client)."""
-    from influxdb_client import InfluxDBClient
-
-    settings = db_retrieve_table_daemon(Misc, entry='first')
-    influxdb_url = f'http://{settings.measurement_db_host}:{settings.measurement_db_port}'
-
-    if settings.measurement_db_version == '1':
-        client = InfluxDBClient(
-            url=influxdb_url,
-            token=f'{settings.measurement_db_user}:{settings.measurement_db_password}',
-            org='mycodo',
-            timeout=60000)
-        bucket = f'{settings.measurement_db_dbname}/{settings.measurement_db_retention_policy}'
-    elif settings.measurement_db_version == '2':
-        client = InfluxDBClient(
-            url=influxdb_url,
-            username=settings.measurement_db_user,
-            password=settings.measurement_db_password,
-            org='mycodo',
-            timeout=60000)
-        bucket = settings.measurement_db_dbname
+    if block:
+        add_measurements_influxdb_flux(unique_id, measurements, use_same_timestamp)
     else:
-        logger.error(f"Unknown Influxdb version: {settings.measurement_db_version}")
-        return
+        points = measurements_to_points(
+            unique_id, measurements, use_same_timestamp, timestamp_now=True)
+        if points:
+            influxdb_writer.put([each.to_line_protocol() for each in points])
 
-    query = f'from(bucket: "{bucket}")'
 
+def flux_range(past_sec=None, start_str=None, end_str=None):
+    """Return the range() part of a Flux query."""
     if past_sec:
-        query += f' |> range(start: -{int(past_sec)}s)'
+        return f' |> range(start: -{int(past_sec)}s)'
     elif start_str and end_str:
-        query += f' |> range(start: {start_str}, stop: {end_str})'
+        return f' |> range(start: {start_str}, stop: {end_str})'
     elif start_str:
-        query += f' |> range(start: {start_str})'
+        return f' |> range(start: {start_str})'
     elif end_str:
-        query += f' |> range(stop: {end_str})'
+        return f' |> range(stop: {end_str})'
     else:
-        query += f' |> range(start: -99999d)'
+        return f' |> range(start: -99999d)'
 
-    if min_value:
-        query += f' |> filter(fn: (r) => r._value > {min_value})'
-    if max_value:
-        query += f' |> filter(fn: (r) => r._value < {max_value})'
 
-    query += f' |> filter(fn: (r) => r["_measurement"] == "{unit}")'
-    query += f' |> filter(fn: (r) => r["device_id"] == "{unique_id}")'
+def flux_aggregate(db_version, group_sec=None, limit=None, value=None, create_empty=True):
+    """
+    Return the windowing, limit, and aggregate parts of a Flux query.
 
-    if channel is not None:
-        query += f' |> filter(fn: (r) => r["channel"] == "{channel}")'
-    if measure:
-        query += f' |> filter(fn: (r) => r["measure"] == "{measure}")'
-    if ts_str:
-        query += " AND time = '{ts}'".format(ts=ts_str)
+    Without create_empty, windows without measurements are omitted instead
+    of returned with a value of None.
+    """
+    query = ''
 
     if group_sec:
-        if settings.measurement_db_version == '1':
+        options = '' if create_empty else ', createEmpty: false'
+        if db_version == '1':
             # TODO: Change median to mean when issue is fixed
             # Bug in influxdb/Flux v1.8.10 due to mean
             # Error: panic: runtime error: invalid memory address or nil pointer dereference
             # https://github.com/influxdata/influxdb/issues/21649
             # https://github.com/influxdata/influxdb/pull/23520
-            query += f' |> aggregateWindow(every: {group_sec}s, fn: median)'
-        elif settings.measurement_db_version == '2':
-            query += f' |> aggregateWindow(every: {group_sec}s, fn: mean)'
+            query += f' |> aggregateWindow(every: {group_sec}s, fn: median{options})'
+        elif db_version == '2':
+            query += f' |> aggregateWindow(every: {group_sec}s, fn: mean{options})'
 
     if limit:
         query += f' |> limit(n:{limit})'
@@ -260,7 +950,7 @@ def query_flux(unit, unique_id,
         elif value == "COUNT":
             query += ' |> count()'
         elif value == "SUM":
-            if settings.measurement_db_version == '1':
+            if db_version == '1':
                 # TODO: Change when issue is fixed
                 # Bug in influxdb/Flux v1.8.10 due to mean
                 # Error: panic: runtime error: invalid memory address or nil pointer dereference
@@ -268,54 +958,465 @@ def query_flux(unit, unique_id,
                 # https://github.com/influxdata/influxdb/pull/23520
                 logger.error("SUM cannot be used with influxdb 1.8.10 without causing an error. "
                              "Returning all measurements for period to manually sum.")
-            elif settings.measurement_db_version == '2':
+            elif db_version == '2':
                 query += ' |> sum(column: "_value")'
         elif value == "MEAN":
-            if settings.measurement_db_version == '1':
+            if db_version == '1':
                 # TODO: Change median to mean when issue is fixed
                 # Bug in influxdb/Flux v1.8.10 due to mean
                 # Error: panic: runtime error: invalid memory address or nil pointer dereference
                 # https://github.com/influxdata/influxdb/issues/21649
                 # https://github.com/influxdata/influxdb/pull/23520
                 query += ' |> median()'
-            elif settings.measurement_db_version == '2':
+            elif db_version == '2':
                 query += ' |> mean()'
 
+    return query
+
+
+def query_flux(unit, unique_id,
+               value=None, measure=None, channel=None, ts_str=None,
+               start_str=None, end_str=None, min_value=None, max_value=None, past_sec=None, group_sec=None,
+               limit=None, create_empty=True):
+    """Generate influxdb query string (flux edition, using influxdb_client)."""
+    settings = misc_settings.get()
+    connection = influxdb_clients.get_connection(settings=settings, timeout=60000)
+    if not connection:
+        return
+
+    query = f'from(bucket: "{connection.bucket}")'
+    query += flux_range(past_sec=past_sec, start_str=start_str, end_str=end_str)
+
+    if min_value:
+        query += f' |> filter(fn: (r) => r._value > {min_value})'
+    if max_value:
+        query += f' |> filter(fn: (r) => r._value < {max_value})'
+
+    query += f' |> filter(fn: (r) => r["_measurement"] == "{unit}")'
+    query += f' |> filter(fn: (r) => r["device_id"] == "{unique_id}")'
+
+    if channel is not None:
+        query += f' |> filter(fn: (r) => r["channel"] == "{channel}")'
+    if measure:
+        query += f' |> filter(fn: (r) => r["measure"] == "{measure}")'
+    if ts_str:
+        query += " AND time = '{ts}'".format(ts=ts_str)
+
+    query += flux_aggregate(
+        settings.measurement_db_version, group_sec=group_sec, limit=limit, value=value,
+        create_empty=create_empty)
+
     logger.debug(f"query_flux() query: '{query}'")
 
-    tables = client.query_api().query(query)
-    client.close()
+    tables = connection.query_api.query(query)
 
     return tables
 
 
+def query_flux_bulk(series,
+                    value=None, start_str=None, end_str=None, past_sec=None, group_sec=None, limit=None):
+    """
+    Query several measurement series with a single Flux query
+
+    Each series selector is a dict with the keys 'unique_id' and 'unit', and
+    optionally 'channel' and 'measure' (matching any channel/measure if
+    omitted or None). The time range and aggregation apply to every series.
+
+    example:
+        query_flux_bulk([
+            {'unique_id': '00000001', 'unit': 'C', 'channel': 0, 'measure': 'temperature'},
+            {'unique_id': '00000002', 'unit': 'percent', 'channel': 1}
+        ], value='LAST', past_sec=600)
+
+    :return: generator of (index of series selector, time, value), streamed
+        from the query response as records arrive
+    """
+    settings = misc_settings.get()
+    connection = influxdb_clients.get_connection(settings=settings, timeout=60000)
+    if not connection or not series:
+        return
+
+    # Route records to series selectors by device ID and unit
+    selectors = {}
+    for index, each_series in enumerate(series):
+        channel = each_series.get('channel')
+        selectors.setdefault((each_series['unique_id'], each_series['unit']), []).append(
+            (index,
+             None if channel is None else str(channel),
+             each_series.get('measure') or None))
+
+    device_ids = sorted({each['unique_id'] for each in series})
+    units = sorted({each['unit'] for each in series})
+
+    query = f'from(bucket: "{connection.bucket}")'
+    query += flux_range(past_sec=past_sec, start_str=start_str, end_str=end_str)
+    query += f' |> filter(fn: (r) => contains(value: r["_measurement"], set: {json.dumps(units)}))'
+    query += f' |> filter(fn: (r) => contains(value: r["device_id"], set: {json.dumps(device_ids)}))'
+    if all(each.get('channel') is not None for each in series):
+        channels = sorted({str(each['channel']) for each in series})
+        query += f' |> filter(fn: (r) => contains(value: r["channel"], set: {json.dumps(channels)}))'
+    query += flux_aggregate(
+        settings.measurement_db_version, group_sec=group_sec, limit=limit, value=value)
+
+    logger.debug(f"query_flux_bulk() query: '{query}'")
+
+    for record in connection.query_api.query_stream(query):
+        candidates = selectors.get((record.values.get('device_id'), record.values.get('_measurement')))
+        if not candidates:
+            continue
+        for index, channel, measure in candidates:
+            if channel is not None and record.values.get('channel') != channel:
+                continue
+            if measure is not None and record.values.get('measure') != measure:
+                continue
+            yield index, record.values['_time'], record.values['_value']
+
+
+def parse_flux_time(time_str):
+    """Return the epoch timestamp of a time in influxdb format, or None if it cannot be parsed."""
+    for time_format in ('%Y-%m-%dT%H:%M:%S.%fZ', '%Y-%m-%dT%H:%M:%SZ'):
+        try:
+            return datetime.datetime.strptime(time_str, time_format).replace(
+                tzinfo=datetime.timezone.utc).timestamp()
+        except (TypeError, ValueError):
+            pass
+
+
+def flux_series_filter(unit, unique_id, channel=None, measure=None, tier=None):
+    """Return the filter() parts of a Flux query selecting a raw or rollup series."""
+    if tier:
+        query = f' |> filter(fn: (r) => r["_measurement"] == "{rollup_measurement(tier)}")'
+        query += f' |> filter(fn: (r) => r["unit"] == "{unit}")'
+    else:
+        query = f' |> filter(fn: (r) => r["_measurement"] == "{unit}")'
+    query += f' |> filter(fn: (r) => r["device_id"] == "{unique_id}")'
+    if channel is not None:
+        query += f' |> filter(fn: (r) => r["channel"] == "{channel}")'
+    if measure:
+        query += f' |> filter(fn: (r) => r["measure"] == "{measure}")'
+    return query
+
+
+def query_flux_rollup(unit, unique_id,
+                      value=None, measure=None, channel=None,
+                      start_str=None, end_str=None, past_sec=None, group_sec=None, create_empty=True):
+    """
+    Answer a query from the measurement rollups
+
+    The period is split with rollup_segments(), so the parts covered by a
+    rollup tier are read from the coarsest tier available and only the
+    edges are read from finer tiers or the raw measurements.
+    SUM, COUNT, and MEAN return a single record, like the same query on the
+    raw measurements. MIN and MAX are not answered, since the time of their
+    record is the time of the extreme measurement, which the tiers do not
+    store. Without a value, the mean of each window
+    of group_sec is returned, from the sum and count of the tiers with
+    windows no longer than group_sec (see merge_rollup_windows()).
+
+    :return: list of tables, or None if the rollups cannot answer the query
+    """
+    if not MEASUREMENT_ROLLUP_ENABLE:
+        return
+    if value:
+        if value not in ('SUM', 'COUNT', 'MEAN') or group_sec:
+            return
+        tiers = MEASUREMENT_ROLLUP_TIERS
+    elif group_sec:
+        tiers = [each for each in MEASUREMENT_ROLLUP_TIERS if each[1] <= int(group_sec)]
+    else:
+        return
+
+    now = time.time()
+    if past_sec:
+        start = now - float(past_sec)
+        end = now
+    elif start_str:
+        start = parse_flux_time(start_str)
+        end = parse_flux_time(end_str) if end_str else now
+    else:
+        return
+    if start is None or end is None:
+        return
+
+    segments = rollup_segments(start, end, measurement_rollups.state.read(), tiers)
+    if not any(tier for tier, _, _ in segments):
+        return
+
+    settings = misc_settings.get()
+    connection = influxdb_clients.get_connection(settings=settings, timeout=60000)
+    if not connection:
+        return
+
+    if not value:
+        # The sum and count of each window of each segment, merged into windows of group_sec
+        group_sec = int(group_sec)
+        query = ''
+        for index, (tier, segment_start, segment_end) in enumerate(segments):
+            query += f'data_{index} = from(bucket: "{connection.bucket}")'
+            query += f' |> range(start: {flux_time(segment_start)}, stop: {flux_time(segment_end)})'
+            query += flux_series_filter(unit, unique_id, channel=channel, measure=measure, tier=tier)
+            query += '\n'
+            if settings.measurement_db_version == '1':
+                # With influxdb 1.8, mean() and sum() can cause errors (see flux_aggregate()),
+                # so the points are summed here instead. Raw segments are only the short
+                # edges the finest tier does not cover, so they have few points.
+                if tier:
+                    query += (f'data_{index} |> filter(fn: (r) => r["_field"] == "sum" or r["_field"] == "count")'
+                              f' |> yield(name: "tier_{index}")\n')
+                else:
+                    query += (f'data_{index} |> filter(fn: (r) => r["_field"] == "value")'
+                              f' |> yield(name: "raw_{index}")\n')
+                continue
+            if tier:
+                sources = (('sum', 'sum', 'sum'), ('count', 'count', 'sum'))
+            else:
+                sources = (('sum', 'value', 'sum'), ('count', 'value', 'count'))
+            for stat, field, function in sources:
+                query += (f'data_{index} |> filter(fn: (r) => r["_field"] == "{field}")'
+                          f' |> aggregateWindow(every: {group_sec}s, fn: {function},'
+                          f' createEmpty: false, timeSrc: "_start")'
+                          f' |> yield(name: "{stat}_{index}")\n')
+
+        logger.debug(f"query_flux_rollup() query: '{query}'")
+
+        parts = {}
+        for record in connection.query_api.query_stream(query):
+            stat, index = record.values['result'].rsplit('_', 1)
+            if stat == 'tier':
+                stat = record.values.get('_field')
+            if record.values['_value'] is None:
+                continue
+            window = floor_period(record.values['_time'].timestamp(), group_sec)
+            part = parts.setdefault((index, window), {'sum': 0, 'count': 0})
+            if stat == 'raw':
+                part['sum'] += record.values['_value']
+                part['count'] += 1
+            else:
+                part[stat] += record.values['_value']
+
+        if not parts:
+            return []
+
+        def window_parts():
+            for (_, window), part in parts.items():
+                yield window, part['sum'], part['count']
+
+        from influxdb_client.client.flux_table import FluxRecord, FluxTable
+
+        table = FluxTable()
+        for window_time, window_mean in merge_rollup_windows(
+                window_parts(), group_sec, start, end, create_empty=create_empty):
+            table.records.append(FluxRecord(0, values={
+                'result': '_result',
+                '_time': datetime.datetime.fromtimestamp(window_time, tz=datetime.timezone.utc),
+                '_value': window_mean,
+                '_measurement': unit,
+                'device_id': unique_id
+            }))
+        return [table]
+
+    if value == 'MEAN':
+        stats = ('sum', 'count')
+    else:
+        stats = (value.lower(),)
+
+    # One result for each statistic of each segment. With influxdb 1.8,
+    # sum() can cause errors, so those points are summed here instead.
+    query = ''
+    for index, (tier, segment_start, segment_end) in enumerate(segments):
+        for stat in stats:
+            query += f'from(bucket: "{connection.bucket}")'
+            query += f' |> range(start: {flux_time(segment_start)}, stop: {flux_time(segment_end)})'
+            query += flux_series_filter(unit, unique_id, channel=channel, measure=measure, tier=tier)
+            if tier:
+                query += f' |> filter(fn: (r) => r["_field"] == "{stat}")'
+            if stat == 'count' and not tier:
+                query += ' |> count()'
+            elif settings.measurement_db_version == '2':
+                query += ' |> sum()'
+            query += f' |> yield(name: "{stat}_{index}")\n'
+
+    logger.debug(f"query_flux_rollup() query: '{query}'")
+
+    results = {}
+    for record in connection.query_api.query_stream(query):
+        stat = record.values['result'].rsplit('_', 1)[0]
+        stat_value = record.values['_value']
+        if stat_value is None:
+            continue
+        results[stat] = results.get(stat, 0) + stat_value
+
+    if value == 'MEAN':
+        result = results['sum'] / results['count'] if results.get('count') else None
+    else:
+        result = results.get(value.lower())
+    if result is None:
+        return []
+
+    from influxdb_client.client.flux_table import FluxRecord, FluxTable
+
+    table = FluxTable()
+    table.records.append(FluxRecord(0, values={
+        'result': '_result',
+        '_start': datetime.datetime.fromtimestamp(start, tz=datetime.timezone.utc),
+        '_stop': datetime.datetime.fromtimestamp(end, tz=datetime.timezone.utc),
+        '_time': datetime.datetime.fromtimestamp(end, tz=datetime.timezone.utc),
+        '_value': result,
+        '_measurement': unit,
+        'device_id': unique_id
+    }))
+    return [table]
+
+
+def backend_period(start_str=None, end_str=None, past_sec=None):
+    """Return the start and end epochs of a period for a measurement backend query."""
+    if past_sec:
+        return time.time() - float(past_sec), None
+    return (parse_flux_time(start_str) if start_str else None,
+            parse_flux_time(end_str) if end_str else None)
+
+
 def query_string(unit, unique_id,
                  value=None, measure=None, channel=None, ts_str=None,
                  start_str=None, end_str=None, min_value=None, max_value=None,
-                 past_sec=None, group_sec=None, limit=None):
-    """Generate influxdb query string."""
+                 past_sec=None, group_sec=None, limit=None, create_empty=True):
+    """
+    Generate influxdb query string.
+
+    Aggregates and windowed data over periods covered by the measurement
+    rollups are answered from the rollups (see query_flux_rollup()).
+    If another measurement database is selected, the query is answered by
+    its backend (see mycodo.utils.measurement_backend), with results in the
+    same format. Without create_empty, windows (group_sec) without
+    measurements are omitted; backends never return empty windows.
+    """
     ret_value = None
-    settings = db_retrieve_table_daemon(Misc, entry='first')
+    settings = misc_settings.get()
+
+    backend = measurement_backend(settings)
+    if backend:
+        if ts_str:
+            start = parse_flux_time(ts_str)
+            end = start + 0.001 if start is not None else None
+        else:
+            start, end = backend_period(start_str=start_str, end_str=end_str, past_sec=past_sec)
+        return backend.query(
+            unit, unique_id,
+            value=value, measure=measure, channel=channel,
+            start=start, end=end, min_value=min_value, max_value=max_value,
+            group_sec=int(group_sec) if group_sec else None, limit=limit)
 
     if settings.measurement_db_name == "influxdb":
+        if not (ts_str or min_value or max_value or limit):
+            try:
+                ret_value = query_flux_rollup(
+                    unit, unique_id,
+                    value=value, measure=measure, channel=channel,
+                    start_str=start_str, end_str=end_str, past_sec=past_sec, group_sec=group_sec,
+                    create_empty=create_empty)
+            except Exception:
+                logger.exception("Querying measurement rollups")
+        if ret_value is not None:
+            return ret_value
+
         ret_value = query_flux(
             unit, unique_id,
             value=value, measure=measure, channel=channel, ts_str=ts_str,
             start_str=start_str, end_str=end_str, min_value=min_value, max_value=max_value,
-            past_sec=past_sec, group_sec=group_sec, limit=limit)
+            past_sec=past_sec, group_sec=group_sec, limit=limit, create_empty=create_empty)
 
     return ret_value
 
 
+def flux_csv_epoch(time_str):
+    """Return the epoch timestamp of an RFC3339 time of a Flux CSV response (e.g. '2023-08-21T10:00:00.123456789Z')."""
+    base, _, fraction = time_str.rstrip('Z').partition('.')
+    epoch = datetime.datetime.fromisoformat(base).replace(tzinfo=datetime.timezone.utc).timestamp()
+    if fraction:
+        epoch += float(f'0.{fraction}')
+    return epoch
+
+
+def flux_csv_value(value_str):
+    """Return the value of a Flux CSV response field (None if empty)."""
+    if value_str == '':
+        return None
+    try:
+        return float(value_str)
+    except ValueError:
+        return value_str
+
+
+def query_flux_stream(unit, unique_id,
+                      measure=None, channel=None, start_str=None, end_str=None, past_sec=None, limit=None):
+    """
+    Query the raw measurements of a series, parsed from the CSV response as it is received
+
+    Unlike query_flux(), the response is not loaded into tables of records,
+    so memory use does not grow with the number of measurements.
+
+    :return: generator of (epoch, value)
+    """
+    from influxdb_client import Dialect
+
+    settings = misc_settings.get()
+    connection = influxdb_clients.get_connection(settings=settings, timeout=60000)
+    if not connection:
+        return
+
+    query = f'from(bucket: "{connection.bucket}")'
+    query += flux_range(past_sec=past_sec, start_str=start_str, end_str=end_str)
+    query += flux_series_filter(unit, unique_id, channel=channel, measure=measure)
+    if limit:
+        query += f' |> limit(n:{limit})'
+    query += ' |> keep(columns: ["_time", "_value"])'
+
+    logger.debug(f"query_flux_stream() query: '{query}'")
+
+    time_index = value_index = None
+    for row in connection.query_api.query_csv(query, dialect=Dialect(header=True, annotations=[])):
+        if '_time' in row and '_value' in row:
+            # Header of each table
+            time_index = row.index('_time')
+            value_index = row.index('_value')
+        elif time_index is not None:
+            yield flux_csv_epoch(row[time_index]), flux_csv_value(row[value_index])
+
+
+def query_string_stream(unit, unique_id,
+                        measure=None, channel=None, start_str=None, end_str=None, past_sec=None, group_sec=None):
+    """
+    Query the measurements of a series as a generator of (epoch, value)
+
+    Raw measurements are streamed from the measurement database as they are
+    read, for exports and graphs of any number of measurements. Windowed
+    data (group_sec) is no larger than the number of windows, and is
+    queried with query_string() so the measurement rollups can answer it.
+    """
+    settings = misc_settings.get()
+
+    backend = measurement_backend(settings)
+    if backend:
+        start, end = backend_period(start_str=start_str, end_str=end_str, past_sec=past_sec)
+        yield from backend.stream(
+            unit, unique_id, measure=measure, channel=channel,
+            start=start, end=end, group_sec=int(group_sec) if group_sec else None)
+    elif settings.measurement_db_name == 'influxdb':
+        if group_sec:
+            data = query_string(
+                unit, unique_id, measure=measure, channel=channel,
+                start_str=start_str, end_str=end_str, past_sec=past_sec, group_sec=group_sec)
+            for table in data or []:
+                for row in table.records:
+                    yield row.values['_time'].timestamp(), row.values['_value']
+        else:
+            yield from query_flux_stream(
+                unit, unique_id, measure=measure, channel=channel,
+                start_str=start_str, end_str=end_str, past_sec=past_sec)
+
+
 def get_last_measurement(device_id, measurement_id, max_age=None):
-    device_measurement = db_retrieve_table_daemon(
-        DeviceMeasurements).filter(
-        DeviceMeasurements.unique_id == measurement_id).first()
-    if device_measurement:
-        conversion = db_retrieve_table_daemon(
-            Conversion, unique_id=device_measurement.conversion_id)
-    else:
-        conversion = None
+    device_measurement, conversion = get_measurement_conversion(measurement_id)
     channel, unit, measurement = return_measurement_info(
         device_measurement, conversion)
 
@@ -367,7 +1468,22 @@ def read_influxdb_single(unique_id, unit, channel,
     :type value: str
     :param datetime_obj: return a datetime object as a time
     :type datetime_obj: bool
+
+    The last value of a measurement written by this process is returned from
+    the last value cache if it is newer than duration_sec, without querying
+    the measurement database. Measurements written by other processes (e.g.
+    created with the API) are added to the cache of the daemon with
+    DaemonControl.record_measurement().
     """
+    if value == 'LAST' and duration_sec and not start_str and not end_str:
+        last_measurement = last_value_cache.get(
+            series_key(unique_id, unit, channel, measure), duration_sec)
+        if last_measurement:
+            if datetime_obj:
+                last_measurement[0] = datetime.datetime.fromtimestamp(
+                    last_measurement[0], tz=datetime.timezone.utc)
+            return last_measurement
+
     try:
         data = query_string(
             unit,
@@ -381,15 +1497,13 @@ def read_influxdb_single(unique_id, unit, channel,
 
         if data:
             try:
-                settings = db_retrieve_table_daemon(Misc, entry='first')
-                if settings.measurement_db_name == 'influxdb':
-                    for table in data:
-                        for row in table.records:
-                            if datetime_obj:
-                                last_time = row.values['_time']
-                            else:
-                                last_time = row.values['_time'].timestamp()
-                            return [last_time, row.values['_value']]
+                for table in data:
+                    for row in table.records:
+                        if datetime_obj:
+                            last_time = row.values['_time']
+                        else:
+                            last_time = row.values['_time'].timestamp()
+                        return [last_time, row.values['_value']]
             except Exception:
                 logger.exception("Error parsing the last influx measurement")
     except requests.exceptions.ConnectionError:
@@ -397,14 +1511,7 @@ def read_influxdb_single(unique_id, unit, channel,
 
 
 def get_past_measurements(device_id, measurement_id, max_age=None):
-    device_measurement = db_retrieve_table_daemon(
-        DeviceMeasurements).filter(
-        DeviceMeasurements.unique_id == measurement_id).first()
-    if device_measurement:
-        conversion = db_retrieve_table_daemon(
-            Conversion, unique_id=device_measurement.conversion_id)
-    else:
-        conversion = None
+    device_measurement, conversion = get_measurement_conversion(measurement_id)
     channel, unit, measurement = return_measurement_info(
         device_measurement, conversion)
 
@@ -418,6 +1525,16 @@ def get_past_measurements(device_id, measurement_id, max_age=None):
     return past_measurements
 
 
+def get_past_statistics(device_id, measurement_id, max_age):
+    """Return the statistics of a device measurement for the past max_age seconds."""
+    device_measurement, conversion = get_measurement_conversion(measurement_id)
+    channel, unit, measurement = return_measurement_info(
+        device_measurement, conversion)
+
+    return statistics_past_seconds(
+        device_id, unit, channel, max_age, measure=measurement)
+
+
 def read_influxdb_list(unique_id, unit, channel,
                        measure=None,
                        duration_sec=None,
@@ -452,7 +1569,22 @@ def read_influxdb_list(unique_id, unit, channel,
     :type end_str: str
     :param datetime_obj: return a datetime object as a time
     :type datetime_obj: bool
+
+    Measurements of the past duration_sec written by this process are
+    returned from the ring buffers, without querying the measurement database.
+    Measurements written by other processes (e.g. created with the API) are
+    added to the ring buffers of the daemon with DaemonControl.record_measurement().
     """
+    if duration_sec and not start_str and not end_str:
+        window = ring_buffers.window(
+            series_key(unique_id, unit, channel, measure), duration_sec)
+        if window is not None:
+            times, values = (each.tolist() for each in window)
+            if datetime_obj:
+                times = [datetime.datetime.fromtimestamp(each, tz=datetime.timezone.utc)
+                         for each in times]
+            return list(zip(times, values))
+
     try:
         data = query_string(
             unit, unique_id,
@@ -462,21 +1594,84 @@ def read_influxdb_list(unique_id, unit, channel,
             end_str=end_str,
             past_sec=duration_sec)
 
-        settings = db_retrieve_table_daemon(Misc, entry='first')
-        if settings.measurement_db_name == 'influxdb':
-            list_data = []
-            for table in data:
-                for row in table.records:
-                    if datetime_obj:
-                        time = row.values['_time']
-                    else:
-                        time = row.values['_time'].timestamp()
-                    list_data.append((time, row.values['_value']))
-            return list_data
+        list_data = []
+        for table in data:
+            for row in table.records:
+                if datetime_obj:
+                    time = row.values['_time']
+                else:
+                    time = row.values['_time'].timestamp()
+                list_data.append((time, row.values['_value']))
+        return list_data
     except:
         logger.debug("Could not read form influxdb.")
 
 
+def read_influxdb_bulk(series,
+                       duration_sec=None,
+                       start_str=None,
+                       end_str=None,
+                       value=None,
+                       group_sec=None,
+                       datetime_obj=False):
+    """
+    Query Influxdb for several measurement series in one round-trip
+
+    example:
+        read_influxdb_bulk([{'unique_id': '00000001', 'unit': 'C', 'channel': 0}], duration_sec=600)
+
+    :return: list of lists of (time, value), one list for each series selector
+    :rtype: list
+
+    :param series: series selectors, see query_flux_bulk()
+    :type series: list of dict
+    :param duration_sec: How many seconds to look for past measurements
+    :type duration_sec: int or None
+    :param start_str: Start time, in influxdb format
+    :type start_str: str
+    :param end_str: End time, in influxdb format
+    :type end_str: str
+    :param value: What kind of measurement to return (e.g. LAST, SUM, MIN, MAX, etc.)
+    :type value: str or None
+    :param group_sec: Average measurements in windows of this many seconds
+    :type group_sec: int or None
+    :param datetime_obj: return a datetime object as a time
+    :type datetime_obj: bool
+    """
+    list_data = [[] for _ in series]
+    settings = misc_settings.get()
+
+    if measurement_backend(settings):
+        # Measurement backends are local, so each series is queried separately
+        for index, each_series in enumerate(series):
+            data = query_string(
+                each_series['unit'], each_series['unique_id'],
+                value=value, measure=each_series.get('measure'), channel=each_series.get('channel'),
+                start_str=start_str, end_str=end_str, past_sec=duration_sec, group_sec=group_sec)
+            for table in data:
+                for row in table.records:
+                    time_ = row.values['_time']
+                    list_data[index].append(
+                        (time_ if datetime_obj else time_.timestamp(), row.values['_value']))
+        return list_data
+
+    if settings.measurement_db_name != 'influxdb':
+        return list_data
+
+    try:
+        for index, time_, value_ in query_flux_bulk(
+                series, value=value, start_str=start_str, end_str=end_str,
+                past_sec=duration_sec, group_sec=group_sec):
+            if value_ is None:
+                continue
+            list_data[index].append((time_ if datetime_obj else time_.timestamp(), value_))
+    except requests.exceptions.ConnectionError:
+        logger.debug("Failed to establish a new influxdb connection. Ensure influxdb is running.")
+    except Exception:
+        logger.exception("Could not read from influxdb.")
+    return list_data
+
+
 def output_sec_on(output_id, past_seconds, output_channel=0):
     """Return the number of seconds a output has been ON in the past number of seconds."""
     # Get the number of seconds ON stored in the database
@@ -489,9 +1684,11 @@ def output_sec_on(output_id, past_seconds, output_channel=0):
     output_time_on = 0
     try:
         control = DaemonControl()
-        if control.output_state(output_id, output_channel=output_channel) == 'on':
-            output_time_on = control.output_sec_currently_on(
-                output_id, output_channel=output_channel)
+        state, sec_currently_on = batch_values(control.batch([
+            ('output_state', (output_id, output_channel)),
+            ('output_sec_currently_on', (output_id,), {'output_channel': output_channel})]))
+        if state == 'on' and sec_currently_on:
+            output_time_on = sec_currently_on
     except Exception:
         logger.exception("output_sec_on()")
 
@@ -504,17 +1701,17 @@ def output_sec_on(output_id, past_seconds, output_channel=0):
 
     sec_recorded_on = 0
     if data:
-        settings = db_retrieve_table_daemon(Misc, entry='first')
-        if settings.measurement_db_name == 'influxdb':
-            if settings.measurement_db_version == '1':
-                # TODO: remove when influxdb 1.8.10 issue is fixed
-                for table in data:
-                    for row in table.records:
-                        sec_recorded_on += row.values['_value']
-            elif settings.measurement_db_version == '2':
-                for table in data:
-                    for row in table.records:
-                        sec_recorded_on = row.values['_value']
+        settings = misc_settings.get()
+        if settings.measurement_db_name == 'influxdb' and settings.measurement_db_version == '2':
+            for table in data:
+                for row in table.records:
+                    sec_recorded_on = row.values['_value']
+        else:
+            # Influxdb 1.x returns every measurement to be summed
+            # TODO: remove when influxdb 1.8.10 issue is fixed
+            for table in data:
+                for row in table.records:
+                    sec_recorded_on += row.values['_value']
 
     sec_currently_on = 0
     if output_time_on:
@@ -525,6 +1722,11 @@ def output_sec_on(output_id, past_seconds, output_channel=0):
 
 def average_past_seconds(unique_id, unit, channel, past_seconds, measure=None):
     """Return measurement average for the past x seconds."""
+    stats = ring_buffers.statistics(
+        series_key(unique_id, unit, channel, measure), past_seconds)
+    if stats is not None:
+        return stats.get('mean')
+
     data = query_string(
         unit, unique_id,
         measure=measure,
@@ -533,11 +1735,9 @@ def average_past_seconds(unique_id, unit, channel, past_seconds, measure=None):
         past_sec=past_seconds)
 
     if data:
-        settings = db_retrieve_table_daemon(Misc, entry='first')
-        if settings.measurement_db_name == 'influxdb':
-            for table in data:
-                for row in table.records:
-                    return row.values['_value']
+        for table in data:
+            for row in table.records:
+                return row.values['_value']
 
 
 def average_start_end_seconds(unique_id, unit, channel, str_start, str_end, measure=None):
@@ -551,15 +1751,18 @@ def average_start_end_seconds(unique_id, unit, channel, str_start, str_end, meas
         end_str=str_end)
 
     if data:
-        settings = db_retrieve_table_daemon(Misc, entry='first')
-        if settings.measurement_db_name == 'influxdb':
-            for table in data:
-                for row in table.records:
-                    return row.values['_value']
+        for table in data:
+            for row in table.records:
+                return row.values['_value']
 
 
 def sum_past_seconds(unique_id, unit, channel, past_seconds, measure=None):
     """Return measurement sum for the past x seconds."""
+    stats = ring_buffers.statistics(
+        series_key(unique_id, unit, channel, measure), past_seconds)
+    if stats is not None and stats['count']:
+        return stats['sum']
+
     data = query_string(
         unit, unique_id,
         measure=measure,
@@ -569,21 +1772,85 @@ def sum_past_seconds(unique_id, unit, channel, past_seconds, measure=None):
 
     if data:
         total_seconds = 0
-        settings = db_retrieve_table_daemon(Misc, entry='first')
-        if settings.measurement_db_name == 'influxdb':
-            if settings.measurement_db_version == '1':
-                # TODO: remove when influxdb 1.8.10 issue is fixed
-                for table in data:
-                    for row in table.records:
-                        total_seconds += row.values['_value']
-                return total_seconds
-            elif settings.measurement_db_version == '2':
-                for table in data:
-                    for row in table.records:
-                        total_seconds = row.values['_value']
+        settings = misc_settings.get()
+        if settings.measurement_db_name == 'influxdb' and settings.measurement_db_version == '2':
+            for table in data:
+                for row in table.records:
+                    total_seconds = row.values['_value']
+        else:
+            # Influxdb 1.x returns every measurement to be summed
+            # TODO: remove when influxdb 1.8.10 issue is fixed
+            for table in data:
+                for row in table.records:
+                    total_seconds += row.values['_value']
         return total_seconds
 
 
+def query_flux_statistics(unit, unique_id, past_seconds, measure=None, channel=None):
+    """
+    Query the statistics of the past past_seconds with one Flux query (influxdb 2.x)
+
+    :return: dict like window_statistics(), or None if influxdb cannot be queried
+    """
+    settings = misc_settings.get()
+    connection = influxdb_clients.get_connection(settings=settings, timeout=60000)
+    if not connection:
+        return
+
+    query = f'data = from(bucket: "{connection.bucket}")'
+    query += flux_range(past_sec=past_seconds)
+    query += flux_series_filter(unit, unique_id, channel=channel, measure=measure)
+    # Merge the tables of the series (e.g. with differing tags) so each statistic is one value
+    query += ' |> group()\n'
+    for stat, function in (('mean', 'mean()'),
+                           ('median', 'median(method: "exact_mean")'),
+                           ('min', 'min()'),
+                           ('max', 'max()'),
+                           ('stdev', 'stddev()'),
+                           ('count', 'count()')):
+        query += f'data |> {function} |> yield(name: "{stat}")\n'
+
+    logger.debug(f"query_flux_statistics() query: '{query}'")
+
+    stats = {}
+    for record in connection.query_api.query_stream(query):
+        stats.setdefault(record.values['result'], record.values['_value'])
+
+    stats['count'] = stats.get('count') or 0
+    if not stats['count']:
+        return {'count': 0}
+    stats.setdefault('stdev', None)
+    return add_stdev_bounds(stats)
+
+
+def statistics_past_seconds(unique_id, unit, channel, past_seconds, measure=None):
+    """
+    Return the statistics of a measurement for the past x seconds
+
+    Measurements of the period held in the ring buffers of this process are
+    used without a query. Otherwise, with influxdb 2.x the statistics are
+    calculated by influxdb with one query, and with other measurement
+    databases the values of the period are streamed and the statistics
+    calculated here.
+
+    :return: dict like window_statistics()
+    """
+    stats = ring_buffers.statistics(
+        series_key(unique_id, unit, channel, measure), past_seconds)
+    if stats is not None:
+        return stats
+
+    settings = misc_settings.get()
+    if settings.measurement_db_name == 'influxdb' and settings.measurement_db_version == '2':
+        return query_flux_statistics(
+            unit, unique_id, past_seconds, measure=measure, channel=channel)
+
+    return window_statistics([
+        value for _, value in query_string_stream(
+            unit, unique_id, measure=measure, channel=channel, past_sec=past_seconds)
+        if value is not None])
+
+
 def influx_time_str_to_milliseconds(timestamp):
     """Converts InfluxDB time string with "Z" from nanoseconds to milliseconds and removes the Z."""
     if type(timestamp) == datetime:
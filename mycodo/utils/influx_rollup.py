@@ -0,0 +1,148 @@
+# coding=utf-8
+import json
+import logging
+import math
+import os
+
+import filelock
+
+from mycodo.config import (MEASUREMENT_ROLLUP_STATE_FILE,
+                           MEASUREMENT_ROLLUP_TIERS)
+
+logger = logging.getLogger("mycodo.influx_rollup")
+
+
+def rollup_measurement(tier):
+    """Return the influxdb measurement name of a rollup tier."""
+    return f'rollup_{tier}'
+
+
+def floor_period(timestamp, period):
+    return math.floor(timestamp / period) * period
+
+
+def ceil_period(timestamp, period):
+    return math.ceil(timestamp / period) * period
+
+
+class RollupState:
+    """
+    Period covered by each rollup tier
+
+    The state is stored in a JSON file so it is shared by the daemon, which
+    updates the rollups, and the web interface, which queries them:
+        {'since': epoch, 'tiers': {'1m': epoch, '1h': epoch, ...}}
+    'since' is the start of the first window of every tier, and each tier
+    holds every window from 'since' until the time stored for the tier.
+    """
+    def __init__(self, path=MEASUREMENT_ROLLUP_STATE_FILE, tiers=MEASUREMENT_ROLLUP_TIERS):
+        self.path = path
+        self.tiers = tiers
+        self.lock_file = filelock.FileLock(f'{path}.lock', timeout=10)
+        self.cache = None
+        self.cache_mtime = None
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = {}
+        except ValueError:
+            logger.error(f"Invalid rollup state file {self.path}, rollups will be recomputed")
+            state = {}
+        state.setdefault('since', None)
+        state.setdefault('tiers', {})
+        return state
+
+    def read(self):
+        """Return the state, reloading the file only if it changed."""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return {'since': None, 'tiers': {}}
+        if self.cache is None or mtime != self.cache_mtime:
+            self.cache = self._load()
+            self.cache_mtime = mtime
+        return self.cache
+
+    def update(self, func):
+        """Modify the state with func(state) while holding the file lock."""
+        with self.lock_file:
+            state = self._load()
+            func(state)
+            path_tmp = f'{self.path}.tmp'
+            with open(path_tmp, 'w') as f:
+                json.dump(state, f)
+            os.replace(path_tmp, self.path)
+        return state
+
+    def rewind(self, timestamp):
+        """Mark the windows from timestamp onward as needing to be recomputed (e.g. for late points)."""
+        def set_rewind(state):
+            if state['since'] is None:
+                return
+            for name, period in self.tiers:
+                if name in state['tiers']:
+                    state['tiers'][name] = min(
+                        state['tiers'][name],
+                        max(state['since'], floor_period(timestamp, period)))
+        self.update(set_rewind)
+
+
+def rollup_segments(start, end, state, tiers=MEASUREMENT_ROLLUP_TIERS):
+    """
+    Split the period from start to end by the rollup tier able to answer each part
+
+    The coarsest tier covering at least one full window answers the middle of
+    the period, and the parts before and after it are split between the finer
+    tiers in the same way. Parts no tier covers are answered from the raw
+    measurements (tier None).
+    :return: list of (tier name or None, start, end), in time order
+    """
+    if start >= end:
+        return []
+
+    since = state.get('since')
+    if since is not None:
+        for index in reversed(range(len(tiers))):
+            name, period = tiers[index]
+            covered_end = state['tiers'].get(name)
+            if covered_end is None:
+                continue
+            first = max(ceil_period(start, period), since)
+            last = min(floor_period(end, period), covered_end)
+            if last - first >= period:
+                return (rollup_segments(start, first, state, tiers[:index]) +
+                        [(name, first, last)] +
+                        rollup_segments(last, end, state, tiers[:index]))
+
+    return [(None, start, end)]
+
+
+def merge_rollup_windows(parts, group_sec, start, end, create_empty=True):
+    """
+    Return the (time, mean) of each window of group_sec from (epoch, sum, count) parts
+
+    Parts are added to the window of group_sec containing their epoch, so
+    each mean is weighted by the number of measurements, and a window
+    split between segments is returned once. Like aggregateWindow(), the
+    time of a window is its end, and windows are aligned to the epoch.
+    With create_empty, windows without measurements have a mean of None.
+    """
+    sums = {}
+    counts = {}
+    for epoch, part_sum, part_count in parts:
+        if part_sum is None or not part_count:
+            continue
+        window = floor_period(epoch, group_sec)
+        sums[window] = sums.get(window, 0) + part_sum
+        counts[window] = counts.get(window, 0) + part_count
+
+    if create_empty:
+        windows = range(floor_period(start, group_sec), math.ceil(end), group_sec)
+    else:
+        windows = sorted(sums)
+    return [(min(window + group_sec, end),
+             sums[window] / counts[window] if window in sums else None)
+            for window in windows]
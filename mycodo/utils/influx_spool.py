@@ -0,0 +1,198 @@
+# coding=utf-8
+import logging
+import os
+import threading
+
+import filelock
+
+from mycodo.config import (MEASUREMENT_SPOOL_FILE,
+                           MEASUREMENT_SPOOL_MAX_BYTES)
+
+logger = logging.getLogger("mycodo.influx_spool")
+
+
+class MeasurementSpool:
+    """
+    Append-only on-disk spool of line protocol measurements
+
+    Batches that could not be written to influxdb are appended to the spool
+    file. The offset of the first line that has not been replayed is stored
+    in a separate file, so replaying only advances the offset. The replayed
+    part of the file is removed by compact(), which rewrites the remaining
+    lines to a new file. When the spool would grow past max_bytes, the
+    oldest lines are discarded.
+    """
+    def __init__(self, path=MEASUREMENT_SPOOL_FILE, max_bytes=MEASUREMENT_SPOOL_MAX_BYTES):
+        self.path = path
+        self.path_offset = f'{path}.offset'
+        self.max_bytes = max_bytes
+        self.lock_thread = threading.Lock()
+        self.lock_replay = threading.Lock()
+        self.lock_file = filelock.FileLock(f'{path}.lock', timeout=30)
+
+        self.stats = {
+            'spooled': 0,
+            'replayed': 0,
+            'dropped': 0,
+            'compactions': 0
+        }
+
+    def _read_offset(self):
+        try:
+            with open(self.path_offset) as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _write_offset(self, offset):
+        path_tmp = f'{self.path_offset}.tmp'
+        with open(path_tmp, 'w') as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path_tmp, self.path_offset)
+
+    def _identity(self):
+        """Return the identity of the spool file, which compact() replaces."""
+        try:
+            stat = os.stat(self.path)
+            return stat.st_dev, stat.st_ino
+        except FileNotFoundError:
+            return None
+
+    def _size(self):
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def _compact(self):
+        """Rewrite the lines that have not been replayed to a new spool file."""
+        offset = self._read_offset()
+        if not offset:
+            return
+
+        path_tmp = f'{self.path}.tmp'
+        with open(self.path, 'rb') as f_in, open(path_tmp, 'wb') as f_out:
+            f_in.seek(offset)
+            while True:
+                chunk = f_in.read(1024 * 1024)
+                if not chunk:
+                    break
+                f_out.write(chunk)
+            f_out.flush()
+            os.fsync(f_out.fileno())
+        os.replace(path_tmp, self.path)
+        self._write_offset(0)
+        self.stats['compactions'] += 1
+
+    def _drop_oldest(self, num_bytes):
+        """Advance the offset past at least num_bytes of the oldest lines."""
+        offset = self._read_offset()
+        dropped_bytes = 0
+        dropped_lines = 0
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            while dropped_bytes < num_bytes:
+                line = f.readline()
+                if not line:
+                    break
+                dropped_bytes += len(line)
+                dropped_lines += 1
+        self._write_offset(offset + dropped_bytes)
+        self.stats['dropped'] += dropped_lines
+        logger.error(
+            f"Measurement spool exceeded {self.max_bytes} bytes. "
+            f"Discarded the {dropped_lines} oldest measurements.")
+
+    def append(self, lines):
+        """Append line protocol strings to the spool. Returns True if stored."""
+        if not lines:
+            return True
+
+        data = ''.join(f'{line}\n' for line in lines).encode()
+        try:
+            with self.lock_thread, self.lock_file:
+                if self._size() + len(data) > self.max_bytes:
+                    self._compact()
+                    excess = self._size() + len(data) - self.max_bytes
+                    if excess > 0:
+                        self._drop_oldest(excess)
+                        self._compact()
+
+                with open(self.path, 'ab') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.stats['spooled'] += len(lines)
+            logger.debug(f"Spooled {len(lines)} measurements")
+            return True
+        except Exception:
+            logger.exception(f"Could not spool {len(lines)} measurements")
+            return False
+
+    def pending_bytes(self):
+        return max(self._size() - self._read_offset(), 0)
+
+    def has_pending(self):
+        return self._size() > 0 and self.pending_bytes() > 0
+
+    def replay(self, write_func, batch_size):
+        """
+        Write spooled lines in the order they were spooled, batch_size lines at a time
+
+        write_func receives a list of line protocol strings and returns True
+        if they were written. Replay stops at the first failed batch, leaving
+        it in the spool for the next attempt. Batches are written without
+        holding the spool locks, so appending is not blocked by the write.
+        :return: number of lines replayed
+        """
+        replayed = 0
+        with self.lock_replay:
+            while True:
+                with self.lock_thread, self.lock_file:
+                    offset = self._read_offset()
+                    identity = self._identity()
+                    batch = []
+                    batch_bytes = 0
+                    try:
+                        with open(self.path, 'rb') as f:
+                            f.seek(offset)
+                            while len(batch) < batch_size:
+                                line = f.readline()
+                                if not line:
+                                    break
+                                batch_bytes += len(line)
+                                line = line.decode().strip()
+                                if line:
+                                    batch.append(line)
+                    except FileNotFoundError:
+                        return replayed
+
+                    if not batch_bytes:
+                        # Everything has been replayed
+                        self._compact()
+                        break
+
+                if batch and not write_func(batch):
+                    break
+
+                with self.lock_thread, self.lock_file:
+                    if self._identity() != identity:
+                        # The spool was compacted by append() during the write, so the
+                        # offset of the batch is unknown. The batch is replayed again,
+                        # which rewrites the same points (spooled with their timestamps).
+                        continue
+                    # append() may have dropped the oldest lines, past the batch
+                    self._write_offset(max(self._read_offset(), offset + batch_bytes))
+                replayed += len(batch)
+                self.stats['replayed'] += len(batch)
+
+        if replayed:
+            logger.info(f"Replayed {replayed} spooled measurements")
+        return replayed
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['pending_bytes'] = self.pending_bytes()
+        return stats
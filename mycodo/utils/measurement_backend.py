@@ -0,0 +1,381 @@
+# coding=utf-8
+"""Measurement databases other than influxdb, selected with Misc.measurement_db_name."""
+import datetime
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from mycodo.config import (MEASUREMENT_SQLITE_PARTITION_SEC,
+                           MEASUREMENT_SQLITE_PATH)
+
+logger = logging.getLogger("mycodo.measurement_backend")
+
+
+class MeasurementRecord:
+    """A query result row, with the same values as an influxdb FluxRecord."""
+    def __init__(self, values):
+        self.values = values
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+
+class MeasurementTable:
+    """A list of query result rows, like an influxdb FluxTable."""
+    def __init__(self, records=None):
+        self.records = records or []
+
+    def __iter__(self):
+        return iter(self.records)
+
+
+class MeasurementBackend:
+    """
+    Interface of a measurement database
+
+    The functions of mycodo.utils.influx write and query measurements
+    through a backend when Misc.measurement_db_name is not 'influxdb'.
+    Queries return a list of tables of records with the same values as the
+    influxdb query results ('_time' as a UTC datetime, and '_value'), so
+    single values, lists, and aggregates (including sums) of measurements
+    are parsed the same way for every measurement database.
+    """
+    name = None
+
+    def write(self, points):
+        """
+        Store measurements
+
+        :param points: list of (epoch, unit, device_id, channel, measure, value)
+        """
+        raise NotImplementedError
+
+    def query(self, unit, unique_id,
+              value=None, measure=None, channel=None,
+              start=None, end=None, min_value=None, max_value=None,
+              group_sec=None, limit=None):
+        """
+        Query measurements of a series
+
+        :param start: epoch of the start of the period (inclusive), or None
+        :param end: epoch of the end of the period (exclusive), or None
+        :param value: aggregate to return (LAST, FIRST, MIN, MAX, COUNT, SUM, or MEAN), or None
+        :param group_sec: average measurements in windows of this many seconds
+        :param limit: return no more than this many measurements (before the aggregate)
+        :return: list of MeasurementTable
+        """
+        raise NotImplementedError
+
+    def stream(self, unit, unique_id,
+               measure=None, channel=None, start=None, end=None, group_sec=None):
+        """Return a generator of (epoch, value) of the measurements of a series."""
+        for table in self.query(
+                unit, unique_id, measure=measure, channel=channel,
+                start=start, end=end, group_sec=group_sec):
+            for row in table.records:
+                yield row.values['_time'].timestamp(), row.values['_value']
+
+    def close(self):
+        pass
+
+
+class SQLiteMeasurementBackend(MeasurementBackend):
+    """
+    Measurements stored in an embedded SQLite database
+
+    Measurements are stored in one table per period of
+    MEASUREMENT_SQLITE_PARTITION_SEC (named measurements_<period number>),
+    so queries only read the tables of the periods they cover and old
+    measurements can be removed by dropping whole tables. Each thread uses
+    its own connection, and the database uses write-ahead logging so the
+    daemon can write while the web interface reads.
+    """
+    name = 'sqlite'
+
+    def __init__(self, path=MEASUREMENT_SQLITE_PATH, partition_sec=MEASUREMENT_SQLITE_PARTITION_SEC):
+        self.path = path
+        self.partition_sec = partition_sec
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.created = set()
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    @staticmethod
+    def table_name(partition):
+        return f'measurements_{partition}'
+
+    def partition(self, epoch):
+        return math.floor(epoch / self.partition_sec)
+
+    def create_partition(self, conn, partition):
+        if partition in self.created:
+            return
+        table = self.table_name(partition)
+        conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {table} ('
+            f'time REAL NOT NULL, unit TEXT NOT NULL, device_id TEXT NOT NULL, '
+            f'channel TEXT, measure TEXT, value)')
+        conn.execute(
+            f'CREATE INDEX IF NOT EXISTS {table}_series '
+            f'ON {table} (device_id, unit, channel, time)')
+        with self.lock:
+            self.created.add(partition)
+
+    def partitions(self, conn, start=None, end=None):
+        """Return the existing partitions covering start to end, in time order."""
+        partitions = []
+        for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'measurements_%'"):
+            try:
+                partition = int(name.split('_', 1)[1])
+            except ValueError:
+                continue
+            if start is not None and partition < self.partition(start):
+                continue
+            if end is not None and partition > self.partition(end):
+                continue
+            partitions.append(partition)
+        return sorted(partitions)
+
+    def write(self, points):
+        by_partition = {}
+        for epoch, unit, device_id, channel, measure, value in points:
+            if value is None:
+                continue
+            if isinstance(value, bool):
+                value = int(value)
+            by_partition.setdefault(self.partition(epoch), []).append((
+                epoch, unit, device_id,
+                None if channel is None else str(channel),
+                measure or None,
+                value))
+
+        if not by_partition:
+            return
+
+        conn = self.connection()
+        with conn:
+            for partition, rows in by_partition.items():
+                self.create_partition(conn, partition)
+                conn.executemany(
+                    f'INSERT INTO {self.table_name(partition)} '
+                    f'(time, unit, device_id, channel, measure, value) VALUES (?, ?, ?, ?, ?, ?)',
+                    rows)
+
+    @staticmethod
+    def where(unit, unique_id, measure, channel, start, end, min_value, max_value):
+        clauses = ['device_id = ?', 'unit = ?']
+        args = [unique_id, unit]
+        if channel is not None:
+            clauses.append('channel = ?')
+            args.append(str(channel))
+        if measure:
+            clauses.append('measure = ?')
+            args.append(measure)
+        if start is not None:
+            clauses.append('time >= ?')
+            args.append(start)
+        if end is not None:
+            clauses.append('time < ?')
+            args.append(end)
+        if min_value:
+            clauses.append('value > ?')
+            args.append(float(min_value))
+        if max_value:
+            clauses.append('value < ?')
+            args.append(float(max_value))
+        return ' AND '.join(clauses), args
+
+    def rows(self, conn, partitions, where, args, group_sec=None, end=None):
+        """Return (epoch, value) of the measurements, or of the mean of each window of group_sec."""
+        if not group_sec:
+            rows = []
+            for partition in partitions:
+                rows.extend(conn.execute(
+                    f'SELECT time, value FROM {self.table_name(partition)} '
+                    f'WHERE {where} ORDER BY time', args))
+            return rows
+
+        # Windows are aligned to the epoch and stamped with the end of the
+        # window, like influxdb aggregateWindow(). A window can span partitions.
+        windows = {}
+        for partition in partitions:
+            for window, total, count in conn.execute(
+                    f'SELECT CAST(time / ? AS INTEGER) AS window, SUM(value), COUNT(value) '
+                    f'FROM {self.table_name(partition)} WHERE {where} GROUP BY window',
+                    [group_sec] + args):
+                if window in windows:
+                    windows[window][0] += total
+                    windows[window][1] += count
+                else:
+                    windows[window] = [total, count]
+
+        rows = []
+        for window in sorted(windows):
+            total, count = windows[window]
+            window_end = (window + 1) * group_sec
+            if end is not None:
+                window_end = min(window_end, end)
+            rows.append((window_end, total / count))
+        return rows
+
+    def aggregate(self, conn, partitions, where, args, value):
+        """Return (epoch, value) of an aggregate, computed by each partition and combined."""
+        if value in ('LAST', 'FIRST'):
+            order = 'DESC' if value == 'LAST' else 'ASC'
+            for partition in (reversed(partitions) if value == 'LAST' else partitions):
+                row = conn.execute(
+                    f'SELECT time, value FROM {self.table_name(partition)} '
+                    f'WHERE {where} ORDER BY time {order} LIMIT 1', args).fetchone()
+                if row:
+                    return row
+            return None
+
+        if value in ('MIN', 'MAX'):
+            # SQLite returns the time of the row with the minimum or maximum value
+            rows = []
+            for partition in partitions:
+                row = conn.execute(
+                    f'SELECT time, {value}(value) FROM {self.table_name(partition)} '
+                    f'WHERE {where}', args).fetchone()
+                if row and row[1] is not None:
+                    rows.append(row)
+            return aggregate_rows(rows, value)
+
+        total = 0
+        count = 0
+        for partition in partitions:
+            partition_total, partition_count = conn.execute(
+                f'SELECT SUM(value), COUNT(value) FROM {self.table_name(partition)} '
+                f'WHERE {where}', args).fetchone()
+            if partition_count:
+                total += partition_total
+                count += partition_count
+        if not count:
+            return None
+        if value == 'SUM':
+            return None, total
+        if value == 'COUNT':
+            return None, count
+        if value == 'MEAN':
+            return None, total / count
+
+    def stream(self, unit, unique_id,
+               measure=None, channel=None, start=None, end=None, group_sec=None):
+        """Return a generator of (epoch, value), read from the database as it is iterated."""
+        if group_sec:
+            yield from super().stream(
+                unit, unique_id, measure=measure, channel=channel,
+                start=start, end=end, group_sec=group_sec)
+            return
+
+        conn = self.connection()
+        where, args = self.where(unit, unique_id, measure, channel, start, end, None, None)
+        for partition in self.partitions(conn, start, end):
+            yield from conn.execute(
+                f'SELECT time, value FROM {self.table_name(partition)} '
+                f'WHERE {where} ORDER BY time', args)
+
+    def query(self, unit, unique_id,
+              value=None, measure=None, channel=None,
+              start=None, end=None, min_value=None, max_value=None,
+              group_sec=None, limit=None):
+        conn = self.connection()
+        partitions = self.partitions(conn, start, end)
+        if not partitions:
+            return []
+
+        where, args = self.where(unit, unique_id, measure, channel, start, end, min_value, max_value)
+
+        if value and not group_sec and not limit:
+            result = self.aggregate(conn, partitions, where, args, value)
+            if result is None:
+                return []
+            if value in ('SUM', 'COUNT', 'MEAN'):
+                # Like influxdb, these aggregates are stamped with the end of the period
+                result = (end if end is not None else time.time(), result[1])
+            rows = [result]
+        else:
+            rows = self.rows(conn, partitions, where, args, group_sec=group_sec, end=end)
+            if limit:
+                rows = rows[:int(limit)]
+            if value:
+                result = aggregate_rows(rows, value, end)
+                rows = [result] if result else []
+
+        if not rows:
+            return []
+
+        tags = {'_measurement': unit, 'device_id': unique_id}
+        if channel is not None:
+            tags['channel'] = str(channel)
+        if measure:
+            tags['measure'] = measure
+
+        return [MeasurementTable([
+            MeasurementRecord(dict(
+                tags,
+                _time=datetime.datetime.fromtimestamp(epoch, tz=datetime.timezone.utc),
+                _value=each_value))
+            for epoch, each_value in rows])]
+
+
+def aggregate_rows(rows, value, end=None):
+    """Return (epoch, value) of an aggregate of a list of (epoch, value)."""
+    rows = [each for each in rows if each[1] is not None]
+    if not rows:
+        return None
+    stamp = end if end is not None else time.time()
+    if value == 'LAST':
+        return rows[-1]
+    if value == 'FIRST':
+        return rows[0]
+    if value == 'MIN':
+        return min(rows, key=lambda each: each[1])
+    if value == 'MAX':
+        return max(rows, key=lambda each: each[1])
+    if value == 'COUNT':
+        return stamp, len(rows)
+    if value == 'SUM':
+        return stamp, sum(each[1] for each in rows)
+    if value == 'MEAN':
+        return stamp, sum(each[1] for each in rows) / len(rows)
+    return None
+
+
+MEASUREMENT_BACKENDS = {
+    SQLiteMeasurementBackend.name: SQLiteMeasurementBackend
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_measurement_backend(db_name):
+    """Return the backend of a measurement database, or None for influxdb."""
+    if db_name not in MEASUREMENT_BACKENDS:
+        return None
+    with _backends_lock:
+        if db_name not in _backends:
+            _backends[db_name] = MEASUREMENT_BACKENDS[db_name]()
+        return _backends[db_name]
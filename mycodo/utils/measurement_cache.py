@@ -0,0 +1,364 @@
+# coding=utf-8
+import bisect
+import calendar
+import datetime
+import math
+import statistics
+import threading
+import time
+from array import array
+
+from mycodo.config import (MEASUREMENT_CACHE_MAX_SERIES,
+                           MEASUREMENT_RING_BUFFER_MAX_SERIES,
+                           MEASUREMENT_RING_BUFFER_SIZE)
+from mycodo.utils.event_bus import event_bus
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def series_key(device_id, unit, channel=None, measure=None):
+    """Return the cache key of a measurement series."""
+    if channel is not None:
+        channel = str(channel)
+    return device_id, unit, channel, measure or None
+
+
+def measurement_epoch(each_measurement, use_same_timestamp, now):
+    """Return the epoch timestamp a measurement will be stored with."""
+    if use_same_timestamp or not each_measurement.get('timestamp_utc'):
+        return now
+    timestamp = each_measurement['timestamp_utc']
+    if isinstance(timestamp, datetime.datetime):
+        if timestamp.tzinfo is None:
+            return calendar.timegm(timestamp.timetuple()) + timestamp.microsecond / 1e6
+        return timestamp.timestamp()
+    return float(timestamp)
+
+
+class LastValueCache:
+    """
+    Last written value of each measurement series
+
+    The write path records every value with its timestamp so the most recent
+    value of a series can be returned without querying the measurement
+    database. Values older than the stored value (e.g. backfilled
+    measurements) do not replace it.
+
+    Each process only sees its own writes. Measurements written outside the
+    daemon (e.g. created with the API) are sent to the daemon with
+    DaemonControl.record_measurement() and are not cached by the writing
+    process, whose cache would otherwise miss the newer values of the daemon.
+    """
+    def __init__(self, max_series=MEASUREMENT_CACHE_MAX_SERIES):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.max_series = max_series
+        self.stats = {
+            'hits': 0,
+            'misses': 0
+        }
+
+    def set(self, key, timestamp, value):
+        with self.lock:
+            last = self.values.get(key)
+            if last and last[0] > timestamp:
+                return
+            if not last and len(self.values) >= self.max_series:
+                return
+            self.values[key] = (timestamp, value)
+
+    def update_measurements(self, unique_id, measurements, use_same_timestamp=True, now=None):
+        """Record a dict of measurements, as passed to add_measurements_influxdb()."""
+        if now is None:
+            now = time.time()
+        for each_channel, each_measurement in measurements.items():
+            if 'value' not in each_measurement or each_measurement['value'] is None:
+                continue
+            key = series_key(
+                unique_id,
+                each_measurement['unit'],
+                each_channel,
+                each_measurement.get('measurement'))
+            self.set(
+                key,
+                measurement_epoch(each_measurement, use_same_timestamp, now),
+                each_measurement['value'])
+
+    def get(self, key, max_age):
+        """Return [timestamp, value] if the last value is newer than max_age seconds, else None."""
+        with self.lock:
+            last = self.values.get(key)
+            if last and max_age is not None and time.time() - last[0] <= float(max_age):
+                self.stats['hits'] += 1
+                return [last[0], last[1]]
+            self.stats['misses'] += 1
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['series'] = len(self.values)
+            return stats
+
+
+class MeasurementRingBuffer:
+    """
+    Fixed-capacity history of one measurement series
+
+    Timestamps and values are stored in float64 arrays. Every point is
+    written twice, at index i and i + size, so the points currently in
+    the buffer are always a contiguous run of the arrays and a time window
+    can be returned as a slice without copying. The arrays start small and
+    double in size until they reach capacity.
+
+    covered_since is the time after which the buffer holds every point of
+    the series written by this process: the time the buffer was created,
+    or the time of the last point that was overwritten. The buffers of the
+    daemon also receive the measurements created with the API, through
+    DaemonControl.record_measurement(), and other processes do not buffer
+    their writes, so no process buffers a series it only sees part of.
+    """
+    def __init__(self, capacity, created=None, initial_capacity=16):
+        self.capacity = capacity
+        self.size = min(initial_capacity, capacity)
+        self.times = array('d', bytes(16 * self.size))
+        self.values = array('d', bytes(16 * self.size))
+        self.start = 0
+        self.count = 0
+        self.covered_since = time.time() if created is None else created
+
+    def _grow(self):
+        size = min(self.size * 2, self.capacity)
+        times = array('d', bytes(16 * size))
+        values = array('d', bytes(16 * size))
+        times[:self.count] = times[size:size + self.count] = self.times[self.start:self.start + self.count]
+        values[:self.count] = values[size:size + self.count] = self.values[self.start:self.start + self.count]
+        self.times, self.values, self.size, self.start = times, values, size, 0
+
+    def append(self, timestamp, value):
+        if self.count and timestamp < self.times[self.start + self.count - 1]:
+            # Points must be in time order. An older point cannot be
+            # inserted, so stop answering for windows that include it.
+            self.covered_since = max(self.covered_since, timestamp)
+            return
+
+        if self.count == self.size and self.size < self.capacity:
+            self._grow()
+
+        if self.count == self.size:
+            self.covered_since = max(self.covered_since, self.times[self.start])
+            self.start = (self.start + 1) % self.size
+            self.count -= 1
+
+        index = (self.start + self.count) % self.size
+        self.times[index] = self.times[index + self.size] = timestamp
+        self.values[index] = self.values[index + self.size] = float(value)
+        self.count += 1
+
+    def window(self, start_time, end_time=None):
+        """
+        Return (times, values) views of the points from start_time to end_time
+
+        Returns None if the buffer does not hold every point of the window.
+        The views are NumPy arrays if NumPy is installed, otherwise memoryviews.
+        """
+        if start_time <= self.covered_since:
+            return
+
+        if np is not None:
+            times = np.frombuffer(self.times, dtype=np.float64)[self.start:self.start + self.count]
+            values = np.frombuffer(self.values, dtype=np.float64)[self.start:self.start + self.count]
+            first = int(np.searchsorted(times, start_time, side='left'))
+            last = self.count if end_time is None else int(np.searchsorted(times, end_time, side='right'))
+        else:
+            times = memoryview(self.times)[self.start:self.start + self.count]
+            values = memoryview(self.values)[self.start:self.start + self.count]
+            first = bisect.bisect_left(times, start_time)
+            last = self.count if end_time is None else bisect.bisect_right(times, end_time)
+
+        return times[first:last], values[first:last]
+
+
+# Statistics in the order of the channels of the statistics functions
+WINDOW_STATISTICS = (
+    'mean', 'median', 'min', 'max', 'stdev', 'stdev_mean_upper', 'stdev_mean_lower')
+
+
+def add_stdev_bounds(stats):
+    """Add the mean plus and minus one standard deviation to window statistics."""
+    if stats.get('stdev') is None:
+        stats['stdev_mean_upper'] = stats['stdev_mean_lower'] = None
+    else:
+        stats['stdev_mean_upper'] = stats['mean'] + stats['stdev']
+        stats['stdev_mean_lower'] = stats['mean'] - stats['stdev']
+    return stats
+
+
+def window_statistics(values):
+    """
+    Return count, sum, mean, median, min, max and stdev of a window of values
+
+    The standard deviation (and the mean plus and minus one standard
+    deviation) is None for fewer than 2 values.
+    """
+    count = len(values)
+    if not count:
+        return {'count': 0}
+
+    if np is not None:
+        values = np.asarray(values)
+        stats = {
+            'count': count,
+            'sum': float(values.sum()),
+            'mean': float(values.mean()),
+            'median': float(np.median(values)),
+            'min': float(values.min()),
+            'max': float(values.max()),
+            'stdev': float(values.std(ddof=1)) if count > 1 else None
+        }
+    else:
+        values = values.tolist() if isinstance(values, memoryview) else list(values)
+        total = math.fsum(values)
+        stats = {
+            'count': count,
+            'sum': total,
+            'mean': total / count,
+            'median': statistics.median(values),
+            'min': min(values),
+            'max': max(values),
+            'stdev': statistics.stdev(values) if count > 1 else None
+        }
+    return add_stdev_bounds(stats)
+
+
+class RingBufferRegistry:
+    """Ring buffers of recently written points, one per measurement series."""
+    def __init__(self,
+                 capacity=MEASUREMENT_RING_BUFFER_SIZE,
+                 max_series=MEASUREMENT_RING_BUFFER_MAX_SERIES):
+        self.lock = threading.Lock()
+        self.buffers = {}
+        self.capacity = capacity
+        self.max_series = max_series
+        self.stats = {
+            'hits': 0,
+            'misses': 0
+        }
+
+    def append(self, key, timestamp, value):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return
+        with self.lock:
+            buffer = self.buffers.get(key)
+            if buffer is None:
+                if len(self.buffers) >= self.max_series:
+                    return
+                buffer = self.buffers[key] = MeasurementRingBuffer(self.capacity)
+            buffer.append(timestamp, value)
+
+    def update_measurements(self, unique_id, measurements, use_same_timestamp=True, now=None):
+        """Record a dict of measurements, as passed to add_measurements_influxdb()."""
+        if now is None:
+            now = time.time()
+        for each_channel, each_measurement in measurements.items():
+            if 'value' not in each_measurement or each_measurement['value'] is None:
+                continue
+            key = series_key(
+                unique_id,
+                each_measurement['unit'],
+                each_channel,
+                each_measurement.get('measurement'))
+            self.append(
+                key,
+                measurement_epoch(each_measurement, use_same_timestamp, now),
+                each_measurement['value'])
+
+    def window(self, key, max_age):
+        """
+        Return (times, values) of the points from the past max_age seconds
+
+        Returns None if the series is not buffered for the full window.
+        """
+        if not max_age:
+            return
+        with self.lock:
+            buffer = self.buffers.get(key)
+            window = buffer.window(time.time() - float(max_age)) if buffer else None
+            if window is None:
+                self.stats['misses'] += 1
+            else:
+                self.stats['hits'] += 1
+                # Copy while locked, since the buffer may be overwritten after release
+                if np is not None:
+                    window = window[0].copy(), window[1].copy()
+                else:
+                    window = array('d', window[0]), array('d', window[1])
+            return window
+
+    def statistics(self, key, max_age):
+        """Return window_statistics() of the past max_age seconds, or None if not buffered."""
+        if not max_age:
+            return
+        with self.lock:
+            buffer = self.buffers.get(key)
+            window = buffer.window(time.time() - float(max_age)) if buffer else None
+            if window is None:
+                self.stats['misses'] += 1
+                return
+            self.stats['hits'] += 1
+            return window_statistics(window[1])
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['series'] = len(self.buffers)
+            stats['points'] = sum(each.count for each in self.buffers.values())
+            return stats
+
+
+last_value_cache = LastValueCache()
+ring_buffers = RingBufferRegistry()
+
+
+def record_measurements(unique_id, measurements, use_same_timestamp=True):
+    """Add written measurements to the last value cache and the ring buffers, and publish them."""
+    now = time.time()
+    last_value_cache.update_measurements(unique_id, measurements, use_same_timestamp, now=now)
+    ring_buffers.update_measurements(unique_id, measurements, use_same_timestamp, now=now)
+    if event_bus.has_subscribers('measurement_written'):
+        for each_channel, each_measurement in measurements.items():
+            if 'value' not in each_measurement or each_measurement['value'] is None:
+                continue
+            publish_measurement(
+                series_key(unique_id, each_measurement['unit'], each_channel,
+                           each_measurement.get('measurement')),
+                measurement_epoch(each_measurement, use_same_timestamp, now),
+                each_measurement['value'])
+
+
+def record_value(key, timestamp, value):
+    """Add a written value to the last value cache and the ring buffers, and publish it."""
+    last_value_cache.set(key, timestamp, value)
+    ring_buffers.append(key, timestamp, value)
+    if event_bus.has_subscribers('measurement_written'):
+        publish_measurement(key, timestamp, value)
+
+
+def publish_measurement(key, timestamp, value):
+    device_id, unit, channel, measure = key
+    event_bus.publish(
+        'measurement_written',
+        device_id=device_id,
+        unit=unit,
+        channel=channel,
+        measure=measure,
+        value=value,
+        timestamp=timestamp)
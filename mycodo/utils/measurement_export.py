@@ -0,0 +1,200 @@
+# coding=utf-8
+"""Export several measurements into one compressed CSV file, in the background."""
+import csv
+import datetime
+import gzip
+import heapq
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+
+from mycodo.config import (MEASUREMENT_EXPORT_CHUNK_SEC,
+                           MEASUREMENT_EXPORT_KEEP_SEC,
+                           MEASUREMENT_EXPORT_MAX_RUNNING,
+                           MEASUREMENT_EXPORT_PATH)
+from mycodo.utils.influx import flux_time, query_string_stream
+
+logger = logging.getLogger("mycodo.measurement_export")
+
+
+def export_periods(start, end, chunk_sec=MEASUREMENT_EXPORT_CHUNK_SEC, align_sec=None):
+    """
+    Split the period from start to end into periods of no more than chunk_sec
+
+    Periods begin and end at multiples of chunk_sec (except the first and
+    last), and chunk_sec is rounded to a multiple of align_sec, so no
+    averaging window spans two periods.
+    """
+    if align_sec:
+        chunk_sec = max(align_sec, chunk_sec // align_sec * align_sec)
+    periods = []
+    period_start = start
+    while period_start < end:
+        period_end = min(end, (math.floor(period_start / chunk_sec) + 1) * chunk_sec)
+        periods.append((period_start, period_end))
+        period_start = period_end
+    return periods
+
+
+def align_rows(series_points):
+    """
+    Join the points of several series by time
+
+    :param series_points: list with the (epoch, value) points of each series, in time order
+    :return: generator of rows [epoch, value of each series ('' if it has no point at the time)]
+    """
+    def series_values(index, points):
+        for epoch, value in points:
+            if value is not None:
+                yield epoch, index, value
+
+    merged = heapq.merge(
+        *[series_values(index, points) for index, points in enumerate(series_points)],
+        key=lambda each: each[0])
+
+    row = None
+    for epoch, index, value in merged:
+        if row is None or epoch != row[0]:
+            if row is not None:
+                yield row
+            row = [epoch] + [''] * len(series_points)
+        row[index + 1] = value
+    if row is not None:
+        yield row
+
+
+class MeasurementExportJob(threading.Thread):
+    """
+    Export of several measurements over a period, running in the background
+
+    The period is queried in parts of MEASUREMENT_EXPORT_CHUNK_SEC, and the
+    measurements of each part are joined into rows of a gzip-compressed CSV
+    file with a column for each measurement, so memory use does not depend
+    on the length of the period. With align_sec, each measurement is
+    averaged in windows of align_sec so all measurements share the same
+    times; otherwise every time of any measurement has a row.
+
+    :param series: list of dicts with the keys 'unique_id', 'unit',
+        'channel', 'measure', and 'name' (the column name)
+    """
+    def __init__(self, series, start, end, align_sec=None, path=MEASUREMENT_EXPORT_PATH):
+        super().__init__(daemon=True)
+        self.job_id = str(uuid.uuid4())
+        self.series = series
+        self.start_time = start
+        self.end_time = end
+        self.align_sec = align_sec or None
+        self.path = os.path.join(path, f'{self.job_id}.csv.gz')
+        self.filename = 'Mycodo_Measurements_{start}_{end}.csv.gz'.format(
+            start=datetime.datetime.fromtimestamp(start).strftime('%Y-%m-%d_%H-%M'),
+            end=datetime.datetime.fromtimestamp(end).strftime('%Y-%m-%d_%H-%M'))
+
+        self.status = 'queued'
+        self.progress = 0.0
+        self.rows = 0
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+
+    def run(self):
+        self.status = 'running'
+        path_tmp = f'{self.path}.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            periods = export_periods(self.start_time, self.end_time, align_sec=self.align_sec)
+
+            with gzip.open(path_tmp, 'wt', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['timestamp (UTC)'] + [each['name'] for each in self.series])
+
+                for index, (period_start, period_end) in enumerate(periods):
+                    series_points = [
+                        list(query_string_stream(
+                            each['unit'], each['unique_id'],
+                            measure=each.get('measure'), channel=each.get('channel'),
+                            start_str=flux_time(period_start), end_str=flux_time(period_end),
+                            group_sec=self.align_sec))
+                        for each in self.series]
+
+                    for row in align_rows(series_points):
+                        writer.writerow(row)
+                        self.rows += 1
+
+                    self.progress = (index + 1) / len(periods)
+
+            os.replace(path_tmp, self.path)
+            self.progress = 1.0
+            self.status = 'finished'
+        except Exception as err:
+            logger.exception(f"Measurement export {self.job_id}")
+            self.error = str(err)
+            self.status = 'failed'
+        finally:
+            self.finished = time.time()
+            if os.path.exists(path_tmp):
+                os.remove(path_tmp)
+
+    def get_status(self):
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'progress': round(self.progress * 100, 1),
+            'rows': self.rows,
+            'measurements': len(self.series),
+            'error': self.error,
+            'filename': self.filename,
+            'elapsed_sec': round((self.finished or time.time()) - self.created, 1)
+        }
+
+
+class MeasurementExportJobs:
+    """
+    Measurement export jobs of the web process
+
+    Jobs and their files are removed MEASUREMENT_EXPORT_KEEP_SEC after they
+    finish, and no more than MEASUREMENT_EXPORT_MAX_RUNNING jobs run at once.
+    """
+    def __init__(self, path=MEASUREMENT_EXPORT_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.jobs = {}
+
+    def start(self, series, start, end, align_sec=None):
+        """Start an export job, or return None if too many jobs are running."""
+        with self.lock:
+            self.prune()
+            if sum(1 for each in self.jobs.values() if each.is_alive()) >= MEASUREMENT_EXPORT_MAX_RUNNING:
+                return None
+            job = MeasurementExportJob(series, start, end, align_sec=align_sec, path=self.path)
+            self.jobs[job.job_id] = job
+            job.start()
+            return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def prune(self):
+        """Remove expired jobs, and files left by jobs of previous processes."""
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.finished and job.finished < now - MEASUREMENT_EXPORT_KEEP_SEC:
+                del self.jobs[job_id]
+
+        if not os.path.isdir(self.path):
+            return
+        for filename in os.listdir(self.path):
+            if filename.split('.')[0] in self.jobs:
+                continue
+            file_path = os.path.join(self.path, filename)
+            try:
+                if os.path.getmtime(file_path) < now - MEASUREMENT_EXPORT_KEEP_SEC:
+                    os.remove(file_path)
+            except OSError:
+                pass
+
+
+measurement_exports = MeasurementExportJobs()
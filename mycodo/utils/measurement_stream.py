@@ -0,0 +1,56 @@
+# coding=utf-8
+"""Encode streamed measurements into HTTP response chunks."""
+import csv
+import itertools
+import json
+from io import StringIO
+
+from mycodo.config import MEASUREMENT_STREAM_CHUNK_ROWS
+
+_encode_json = json.JSONEncoder(separators=(',', ':')).encode
+
+
+def peek(iterator):
+    """
+    Return the iterator, with its first item still included, or None if it is empty
+
+    Used to run a streamed query (and return an error or an empty response)
+    before the response begins.
+    """
+    iterator = iter(iterator)
+    first = next(iterator, None)
+    if first is None:
+        return None
+    return itertools.chain([first], iterator)
+
+
+def csv_chunks(rows, header=None, chunk_rows=MEASUREMENT_STREAM_CHUNK_ROWS):
+    """Return a generator of CSV text, chunk_rows rows at a time."""
+    line = StringIO()
+    writer = csv.writer(line)
+    if header:
+        writer.writerow(header)
+
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count >= chunk_rows:
+            yield line.getvalue()
+            line.seek(0)
+            line.truncate(0)
+            count = 0
+
+    if line.tell():
+        yield line.getvalue()
+
+
+def json_chunks(points, chunk_rows=MEASUREMENT_STREAM_CHUNK_ROWS):
+    """Return a generator of the JSON array of (time, value) points, chunk_rows points at a time."""
+    points = iter(points)
+    yield '['
+    separator = ''
+    for chunk in iter(lambda: list(itertools.islice(points, chunk_rows)), []):
+        yield separator + ','.join(_encode_json(each) for each in chunk)
+        separator = ','
+    yield ']'
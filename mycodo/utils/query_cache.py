@@ -0,0 +1,149 @@
+# coding=utf-8
+import collections
+import threading
+import time
+
+from mycodo.config import (QUERY_CACHE_IMMUTABLE_AGE_SEC,
+                           QUERY_CACHE_MAX_BYTES, QUERY_CACHE_MAX_ENTRIES,
+                           QUERY_CACHE_TTL_SEC)
+
+
+def estimate_size(value):
+    """Return the approximate memory used by a query result, in bytes."""
+    if value is None or isinstance(value, (bool, int, float)):
+        return 24
+    if isinstance(value, (str, bytes)):
+        return 49 + len(value)
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return 56
+        if isinstance(value[0], (list, tuple)) and len(value) > 100:
+            # Estimate long lists of points from the first point
+            return 56 + len(value) * (8 + estimate_size(value[0]))
+        return 56 + sum(8 + estimate_size(each) for each in value)
+    if isinstance(value, dict):
+        return 232 + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    return 64
+
+
+class QueryResultCache:
+    """
+    Shared cache of measurement query results in the web process
+
+    Results are stored by a normalized query key and the current time
+    bucket (ttl_sec long), so every request for the same series in the same
+    bucket receives the same result from one query. If a query is already
+    running for a key, identical requests wait for its result instead of
+    querying again. Results of periods that ended more than
+    QUERY_CACHE_IMMUTABLE_AGE_SEC ago no longer change and are cached
+    without expiring. The least recently used results are evicted when
+    there are more than max_entries results or they use more than
+    max_bytes.
+    """
+    def __init__(self,
+                 ttl_sec=QUERY_CACHE_TTL_SEC,
+                 max_entries=QUERY_CACHE_MAX_ENTRIES,
+                 max_bytes=QUERY_CACHE_MAX_BYTES):
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()  # key: (expires or None, size, result)
+        self.in_flight = {}
+        self.bytes = 0
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'waits': 0,
+            'evictions': 0
+        }
+
+    @staticmethod
+    def is_immutable(end_epoch):
+        """Return True if a period ending at end_epoch will no longer change."""
+        return bool(end_epoch) and end_epoch < time.time() - QUERY_CACHE_IMMUTABLE_AGE_SEC
+
+    def _remove(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.bytes -= size
+
+    def _evict(self):
+        now = time.time()
+        for key in [k for k, (expires, _, _) in self.entries.items() if expires and expires <= now]:
+            self._remove(key)
+        while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+            self._remove(next(iter(self.entries)))
+            self.stats['evictions'] += 1
+
+    def get(self, key, func, immutable=False):
+        """
+        Return the cached result of key, or run func() and cache its result
+
+        :param key: tuple that identifies the query (function and arguments)
+        :param func: function that runs the query
+        :param immutable: the result will no longer change, cache it without expiring
+        """
+        if not self.ttl_sec and not immutable:
+            return func()
+
+        now = time.time()
+        if immutable:
+            key = key + (None,)
+            expires = None
+        else:
+            bucket = int(now // self.ttl_sec)
+            key = key + (bucket,)
+            expires = (bucket + 1) * self.ttl_sec
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and (entry[0] is None or entry[0] > now):
+                self.entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry[2]
+            event = self.in_flight.get(key)
+            if event is None:
+                self.in_flight[key] = threading.Event()
+                self.stats['misses'] += 1
+            else:
+                self.stats['waits'] += 1
+
+        if event is not None:
+            # Another request is running the same query
+            event.wait(60)
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry:
+                    return entry[2]
+            return func()
+
+        try:
+            result = func()
+            size = estimate_size(result)
+            with self.lock:
+                if key in self.entries:
+                    self._remove(key)
+                if size <= self.max_bytes:
+                    self.entries[key] = (expires, size, result)
+                    self.bytes += size
+                    self._evict()
+            return result
+        finally:
+            with self.lock:
+                self.in_flight.pop(key).set()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self.entries)
+            stats['bytes'] = self.bytes
+            return stats
+
+
+query_cache = QueryResultCache()
@@ -0,0 +1,155 @@
+# coding=utf-8
+"""Count and time the SQL queries of each web request and controller loop."""
+import heapq
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from mycodo.config import (QUERY_STATS_ENABLED, QUERY_STATS_LOG_MS,
+                           QUERY_STATS_LOG_QUERIES, QUERY_STATS_SLOWEST,
+                           QUERY_STATS_STATEMENT_LENGTH)
+
+logger = logging.getLogger("mycodo.query_stats")
+
+_local = threading.local()
+
+
+class QueryScope:
+    """SQL queries executed by one thread during one request or loop."""
+    __slots__ = ('name', 'queries', 'time_ms', 'slowest', 'parent')
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.queries = 0
+        self.time_ms = 0.0
+        self.slowest = []  # Heap of the (time_ms, statement) of the slowest queries
+        self.parent = parent
+
+    def add(self, statement, time_ms):
+        self.queries += 1
+        self.time_ms += time_ms
+        if len(self.slowest) < QUERY_STATS_SLOWEST:
+            heapq.heappush(self.slowest, (time_ms, statement))
+        elif time_ms > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (time_ms, statement))
+
+
+class QueryStats:
+    """
+    SQL query counters of the process, by request or controller loop
+
+    For each scope name (e.g. a URL rule or a controller), the number of
+    times it ran, its total and largest number of queries and query time,
+    and the slowest statements of the process are kept. A scope with more
+    than QUERY_STATS_LOG_QUERIES queries or QUERY_STATS_LOG_MS of query
+    time is logged.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.scopes = {}
+        self.slowest = []
+
+    def record(self, scope):
+        with self.lock:
+            stats = self.scopes.get(scope.name)
+            if stats is None:
+                stats = self.scopes[scope.name] = {
+                    'name': scope.name,
+                    'calls': 0,
+                    'queries': 0,
+                    'max_queries': 0,
+                    'time_ms': 0.0,
+                    'max_time_ms': 0.0
+                }
+            stats['calls'] += 1
+            stats['queries'] += scope.queries
+            stats['max_queries'] = max(stats['max_queries'], scope.queries)
+            stats['time_ms'] += scope.time_ms
+            stats['max_time_ms'] = max(stats['max_time_ms'], scope.time_ms)
+
+            for time_ms, statement in scope.slowest:
+                entry = (time_ms, statement, scope.name)
+                if len(self.slowest) < QUERY_STATS_SLOWEST:
+                    heapq.heappush(self.slowest, entry)
+                elif time_ms > self.slowest[0][0]:
+                    heapq.heapreplace(self.slowest, entry)
+
+        if scope.queries > QUERY_STATS_LOG_QUERIES or scope.time_ms > QUERY_STATS_LOG_MS:
+            slowest = max(scope.slowest)[1] if scope.slowest else ''
+            logger.warning(
+                f"{scope.name}: {scope.queries} SQL queries in {scope.time_ms:.1f} ms. "
+                f"Slowest: {slowest}")
+
+    def get_stats(self):
+        """Return the scopes with the most queries per call first, and the slowest statements."""
+        with self.lock:
+            scopes = [dict(each) for each in self.scopes.values()]
+            slowest = sorted(self.slowest, reverse=True)
+        for each in scopes:
+            each['mean_queries'] = each['queries'] / each['calls']
+            each['mean_time_ms'] = each['time_ms'] / each['calls']
+        scopes.sort(key=lambda each: each['mean_queries'], reverse=True)
+        return {
+            'scopes': scopes,
+            'slowest': [{'time_ms': time_ms, 'statement': statement, 'name': name}
+                        for time_ms, statement, name in slowest]
+        }
+
+    def reset(self):
+        with self.lock:
+            self.scopes.clear()
+            self.slowest.clear()
+
+
+query_stats = QueryStats()
+
+
+def begin_scope(name):
+    """Begin counting the SQL queries of the current thread."""
+    scope = QueryScope(name, parent=getattr(_local, 'scope', None))
+    _local.scope = scope
+    return scope
+
+
+def end_scope(scope):
+    """Stop counting the SQL queries of a scope and record them."""
+    _local.scope = scope.parent
+    query_stats.record(scope)
+
+
+@contextmanager
+def query_scope(name):
+    """Count the SQL queries of the current thread while in the context."""
+    if not QUERY_STATS_ENABLED:
+        yield None
+        return
+    scope = begin_scope(name)
+    try:
+        yield scope
+    finally:
+        end_scope(scope)
+
+
+def query_stats_summary():
+    """Return the SQL query counters of this process."""
+    return query_stats.get_stats()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and getattr(_local, 'scope', None) is not None:
+        context._query_stats_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    scope = getattr(_local, 'scope', None)
+    start = getattr(context, '_query_stats_start', None)
+    if scope is None or start is None:
+        return
+    scope.add(statement[:QUERY_STATS_STATEMENT_LENGTH],
+              (time.perf_counter() - start) * 1000)
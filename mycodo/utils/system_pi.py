@@ -21,11 +21,10 @@ from mycodo.config_devices_units import MEASUREMENTS
 from mycodo.config_devices_units import UNITS
 from mycodo.config_devices_units import UNIT_CONVERSIONS
 from mycodo.databases.models import CustomController
-from mycodo.databases.models import DeviceMeasurements
 from mycodo.databases.models import Input
 from mycodo.databases.models import Output
+from mycodo.utils.config_cache import get_measurement_conversion
 from mycodo.utils.database import db_retrieve_table
-from mycodo.utils.database import db_retrieve_table_daemon
 
 logger = logging.getLogger("mycodo.system_pi")
 
@@ -425,9 +424,7 @@ def all_conversions(conversions):
 
 def get_measurement(measurement_id):
     """Find measurement."""
-    device_measurement = db_retrieve_table_daemon(
-        DeviceMeasurements).filter(
-        DeviceMeasurements.unique_id == measurement_id).first()
+    device_measurement, _ = get_measurement_conversion(measurement_id)
     if device_measurement:
         return device_measurement
     else:
@@ -19,6 +19,7 @@ from mycodo.config import (INSTALL_DIRECTORY, PATH_ACTIONS_CUSTOM,
                            USAGE_REPORTS_PATH)
 from mycodo.databases.models import (Conversion, DeviceMeasurements,
                                      EnergyUsage, Misc, Output, OutputChannel)
+from mycodo.databases.utils import checkpoint_sqlite
 from mycodo.utils.database import db_retrieve_table_daemon
 from mycodo.utils.influx import (average_past_seconds,
                                  average_start_end_seconds, output_sec_on)
@@ -84,6 +85,7 @@ def create_measurements_export(influxdb_version, save_path=None):
 
 def create_settings_export(save_path=None):
     try:
+        checkpoint_sqlite(SQL_DATABASE_MYCODO)
         data = io.BytesIO()
         with zipfile.ZipFile(data, mode='w') as z:
             z.write(SQL_DATABASE_MYCODO,
@@ -265,19 +265,27 @@ WIDGET_INFORMATION = {
     });
   }
 
-  // Repeat function for getLastDataGaugeAngular()
+  // Repeat function for getLastDataGaugeAngular(), when the live stream has no recent update
   function repeatLastDataGaugeAngular(widget_id,
                           dev_id,
                           measure_type,
                           measurement_id,
                           period_sec,
                           max_measure_age_sec) {
-    setInterval(function () {
+    const refresh = function () {
       getLastDataGaugeAngular(widget_id,
                   dev_id,
                   measure_type,
                   measurement_id,
                   max_measure_age_sec)
+    };
+    liveStream.subscribe('measurement', dev_id + ',' + measurement_id, function (timestamp, measurement) {
+      widget[widget_id].series[0].points[0].update(measurement);
+    }, refresh);
+    setInterval(function () {
+      if (!liveStream.isFresh('measurement', dev_id + ',' + measurement_id, max_measure_age_sec)) {
+        refresh();
+      }
     }, period_sec * 1000);
   }
 """,
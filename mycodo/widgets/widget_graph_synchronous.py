@@ -27,8 +27,10 @@ import logging
 import re
 
 import flask_login
+from flask import Response
 from flask import flash
 from flask import jsonify
+from flask import request
 from flask_babel import lazy_gettext
 from flask_login import current_user
 
@@ -44,7 +46,12 @@ from mycodo.databases.models import Output
 from mycodo.databases.models import PID
 from mycodo.mycodo_flask.utils.utils_general import use_unit_generate
 from mycodo.utils.constraints_pass import constraints_pass_positive_value
+from mycodo.utils.downsample import downsample_lttb
+from mycodo.utils.influx import query_string_stream
 from mycodo.utils.influx import read_influxdb_list
+from mycodo.utils.measurement_stream import json_chunks
+from mycodo.utils.measurement_stream import peek
+from mycodo.utils.query_cache import query_cache
 from mycodo.utils.system_pi import add_custom_measurements
 from mycodo.utils.system_pi import return_measurement_info
 from mycodo.utils.system_pi import str_is_float
@@ -53,7 +60,12 @@ logger = logging.getLogger(__name__)
 
 
 def past_data(unique_id, measure_type, measurement_id, past_seconds):
-    """Return data from past_seconds until present from influxdb."""
+    """
+    Return data from past_seconds until present from influxdb.
+    The measurements are streamed into the response as they are read.
+    With the request arguments "method=lttb&points=N", the data is
+    downsampled to N points with Largest-Triangle-Three-Buckets.
+    """
     if not current_user.is_authenticated:
         return "You are not logged in and cannot access this endpoint"
     if not str_is_float(past_seconds):
@@ -107,15 +119,33 @@ def past_data(unique_id, measure_type, measurement_id, past_seconds):
                     _, unit, measurement = return_measurement_info(setpoint_measurement, conversion)
 
         try:
-            list_data = read_influxdb_list(
-                unique_id, unit,
-                channel=channel,
-                measure=measurement,
-                duration_sec=past_seconds)
+            if request.args.get('method') != 'lttb':
+                # Stream the measurements into the response as they are read
+                points = peek(query_string_stream(
+                    unit, unique_id,
+                    measure=measurement,
+                    channel=channel,
+                    past_sec=past_seconds))
+
+                if not points:
+                    return '', 204
+
+                return Response(json_chunks(points), mimetype='application/json')
+
+            list_data = query_cache.get(
+                ('past', unique_id, unit, channel, measurement, past_seconds),
+                lambda: read_influxdb_list(
+                    unique_id, unit,
+                    channel=channel,
+                    measure=measurement,
+                    duration_sec=past_seconds))
 
             if not list_data:
                 return '', 204
 
+            list_data = downsample_lttb(
+                list_data, request.args.get('points', default=0, type=int))
+
             return jsonify(list_data)
         except Exception as err:
             logger.debug(f"URL for 'past_data' raised and error: {err}")
@@ -351,6 +381,25 @@ WIDGET_INFORMATION = {
             'name': 'Graph Title Font Size (em)',
             'phrase': 'The size of the fonts on the title of the graph'
         },
+        {
+            'id': 'downsample_method',
+            'type': 'select',
+            'default_value': 'none',
+            'options_select': [
+                ('none', 'None (All Points)'),
+                ('lttb', 'Largest-Triangle-Three-Buckets')
+            ],
+            'name': 'Downsampling',
+            'phrase': 'Reduce the number of points loaded for each series, while preserving peaks'
+        },
+        {
+            'id': 'downsample_max_points',
+            'type': 'integer',
+            'default_value': 700,
+            'constraints_pass': constraints_pass_positive_value,
+            'name': 'Downsampling Maximum Points',
+            'phrase': 'The maximum number of points loaded for each series when downsampling'
+        },
         {'type': 'new_line'},
         {
             'id': 'measurements_input',
@@ -618,9 +667,11 @@ WIDGET_INFORMATION = {
                        unique_id,
                        measure_type,
                        measurement_id,
-                       past_seconds) {
+                       past_seconds,
+                       downsample_points) {
     const epoch_mil = new Date().getTime();
-    const url = '/past/' + unique_id + '/' + measure_type + '/' + measurement_id + '/' + past_seconds;
+    let url = '/past/' + unique_id + '/' + measure_type + '/' + measurement_id + '/' + past_seconds;
+    if (downsample_points) url += '?method=lttb&points=' + downsample_points;
     const update_id = widget_id + "-" + series + "-" + unique_id + "-" + measure_type + '-' + measurement_id;
 
     $.getJSON(url,
@@ -775,6 +826,11 @@ WIDGET_INFORMATION = {
 {% set graph_function_ids = widget_options['measurements_function'] %}
 {% set graph_pid_ids = widget_options['measurements_pid'] %}
 {% set graph_note_tag_ids = widget_options['measurements_note_tag'] %}
+{% if widget_options['downsample_method'] == 'lttb' -%}
+  {% set downsample_points = widget_options['downsample_max_points'] %}
+{%- else -%}
+  {% set downsample_points = 0 %}
+{%- endif %}
 
   widget['{{each_widget.unique_id}}'] = new Highcharts.StockChart({
     chart : {
@@ -795,7 +851,7 @@ WIDGET_INFORMATION = {
             {%- set all_output = table_output.query.filter(table_output.unique_id == output_id).all() -%}
             {%- if all_output -%}
               {% for each_output in all_output %}
-          getPastDataSynchronousGraph('{{each_widget.unique_id}}', {{count_series|count}}, '{{each_output.unique_id}}', 'output', '{{measurement_id}}', {{widget_options['x_axis_minutes']*60}});
+          getPastDataSynchronousGraph('{{each_widget.unique_id}}', {{count_series|count}}, '{{each_output.unique_id}}', 'output', '{{measurement_id}}', {{widget_options['x_axis_minutes']*60}}, {{downsample_points}});
                 {% if widget_options['enable_auto_refresh'] -%}
           getLiveDataSynchronousGraph('{{each_widget.unique_id}}', {{count_series|count}}, '{{each_output.unique_id}}', 'output', '{{measurement_id}}', {{widget_options['x_axis_minutes']}}, {{widget_options['enable_xaxis_reset']|int}}, {{widget_options['refresh_seconds']}});
                 {%- endif -%}
@@ -810,7 +866,7 @@ WIDGET_INFORMATION = {
             {%- set all_input = table_input.query.filter(table_input.unique_id == input_id).all() -%}
             {%- if all_input -%}
               {% for each_input in all_input %}
-          getPastDataSynchronousGraph('{{each_widget.unique_id}}', {{count_series|count}}, '{{each_input.unique_id}}', 'input', '{{measurement_id}}', {{widget_options['x_axis_minutes']*60}});
+          getPastDataSynchronousGraph('{{each_widget.unique_id}}', {{count_series|count}}, '{{each_input.unique_id}}', 'input', '{{measurement_id}}', {{widget_options['x_axis_minutes']*60}}, {{downsample_points}});
                 {% if widget_options['enable_auto_refresh'] -%}
           getLiveDataSynchronousGraph('{{each_widget.unique_id}}', {{count_series|count}}, '{{each_input.unique_id}}', 'input', '{{measurement_id}}', {{widget_options['x_axis_minutes']}}, {{widget_options['enable_xaxis_reset']|int}}, {{widget_options['refresh_seconds']}});
                 {%- endif -%}
@@ -825,7 +881,7 @@ WIDGET_INFORMATION = {
             {%- set all_function = table_function.query.filter(table_function.unique_id == function_id).all() -%}
             {%- if all_function -%}
               {% for each_function in all_function %}
-          getPastDataSynchronousGraph('{{each_widget.unique_id}}', {{count_series|count}}, '{{each_function.unique_id}}', 'function', '{{measurement_id}}', {{widget_options['x_axis_minutes']*60}});
+          getPastDataSynchronousGraph('{{each_widget.unique_id}}', {{count_series|count}}, '{{each_function.unique_id}}', 'function', '{{measurement_id}}', {{widget_options['x_axis_minutes']*60}}, {{downsample_points}});
                 {% if widget_options['enable_auto_refresh'] %}
           getLiveDataSynchronousGraph('{{each_widget.unique_id}}', {{count_series|count}}, '{{each_function.unique_id}}', 'function', '{{measurement_id}}', {{widget_options['x_axis_minutes']}}, {{widget_options['enable_xaxis_reset']|int}}, {{widget_options['refresh_seconds']}});
                 {% endif %}
@@ -837,7 +893,7 @@ WIDGET_INFORMATION = {
           {%- for each_pid in pid -%}
             {%- for pid_and_measurement_id in graph_pid_ids if each_pid.unique_id == pid_and_measurement_id.split(',')[0] %}
               {%- set measurement_id = pid_and_measurement_id.split(',')[1] -%}
-          getPastDataSynchronousGraph('{{each_widget.unique_id}}', {{count_series|count}}, '{{each_pid.unique_id}}', 'pid', '{{measurement_id}}', {{widget_options['x_axis_minutes']*60}});
+          getPastDataSynchronousGraph('{{each_widget.unique_id}}', {{count_series|count}}, '{{each_pid.unique_id}}', 'pid', '{{measurement_id}}', {{widget_options['x_axis_minutes']*60}}, {{downsample_points}});
           {% if widget_options['enable_auto_refresh'] %}
           getLiveDataSynchronousGraph('{{each_widget.unique_id}}', {{count_series|count}}, '{{each_pid.unique_id}}', 'pid', '{{measurement_id}}', {{widget_options['x_axis_minutes']}}, {{widget_options['enable_xaxis_reset']|int}}, {{widget_options['refresh_seconds']}});
           {% endif %}
@@ -848,7 +904,7 @@ WIDGET_INFORMATION = {
           {%- for each_tag in tags -%}
             {%- for tag_and_measurement_id in graph_note_tag_ids if each_tag.unique_id == tag_and_measurement_id.split(',')[0] %}
               {%- set measurement_id = tag_and_measurement_id.split(',')[1] -%}
-          getPastDataSynchronousGraph('{{each_widget.unique_id}}', {{count_series|count}}, '{{each_tag.unique_id}}', 'tag', '{{measurement_id}}', {{widget_options['x_axis_minutes']*60}});
+          getPastDataSynchronousGraph('{{each_widget.unique_id}}', {{count_series|count}}, '{{each_tag.unique_id}}', 'tag', '{{measurement_id}}', {{widget_options['x_axis_minutes']*60}}, {{downsample_points}});
           {% if widget_options['enable_auto_refresh'] %}
           getLiveDataSynchronousGraph('{{each_widget.unique_id}}', {{count_series|count}}, '{{each_tag.unique_id}}', 'tag', '{{measurement_id}}', {{widget_options['x_axis_minutes']}}, {{widget_options['enable_xaxis_reset']|int}}, {{widget_options['refresh_seconds']}});
           {% endif %}
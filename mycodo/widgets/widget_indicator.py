@@ -96,6 +96,34 @@ WIDGET_INFORMATION = {
     'widget_dashboard_body': """<div class="widget-indicator-body"><img id="value-{{each_widget.unique_id}}" src="" alt=""></div>""",
 
     'widget_dashboard_js': """
+  // Show an output state in the indicator widget
+  function showOutputStateIndicator(widget_id, state, invert) {
+    if (state !== 'off') {
+      document.getElementById('value-' + widget_id).title = "{{_('On')}}";
+    } else {
+      document.getElementById('value-' + widget_id).title = "{{_('Off')}}";
+    }
+    if ((state !== 'off' && !invert) || (state === 'off' && invert)) {
+      document.getElementById('value-' + widget_id).src = '/static/img/button-green.png';
+    }
+    else {
+      document.getElementById('value-' + widget_id).src = '/static/img/button-red.png';
+    }
+  }
+
+  // Show a measurement in the indicator widget
+  function showDataIndicator(widget_id, measurement, decimal_places, invert) {
+    if (decimal_places === null) {
+      decimal_places = 1;
+    }
+    if ((measurement && !invert) || (!measurement && invert)) {
+      document.getElementById('value-' + widget_id).src = '/static/img/button-green.png';
+    } else {
+      document.getElementById('value-' + widget_id).src = '/static/img/button-red.png';
+    }
+    document.getElementById('value-' + widget_id).title = "{{_('Value')}}: " + measurement.toFixed(decimal_places);
+  }
+
   // Retrieve the latest/last measurement for indicator widget
   function getLastDataIndicator(widget_id,
                        unique_id,
@@ -115,17 +143,7 @@ WIDGET_INFORMATION = {
         success: function (data, responseText, jqXHR) {
           if (jqXHR.status !== 204) {
             if (data !== null) {
-              if (data !== 'off') {
-                document.getElementById('value-' + widget_id).title = "{{_('On')}}";
-              } else {
-                document.getElementById('value-' + widget_id).title = "{{_('Off')}}";
-              }
-              if ((data !== 'off' && !invert) || (data === 'off' && invert)) {
-                document.getElementById('value-' + widget_id).src = '/static/img/button-green.png';
-              }
-              else {
-                document.getElementById('value-' + widget_id).src = '/static/img/button-red.png';
-              }
+              showOutputStateIndicator(widget_id, data, invert);
             }
           } else {
             document.getElementById('value-' + widget_id).src = '/static/img/button-yellow.png';
@@ -147,14 +165,7 @@ WIDGET_INFORMATION = {
             document.getElementById('value-' + widget_id).innerHTML = 'NO DATA';
           }
           else {
-            const formattedTime = epoch_to_timestamp(data[0] * 1000);
-            const measurement = data[1];
-            if ((measurement && !invert) || (!measurement && invert)) {
-              document.getElementById('value-' + widget_id).src = '/static/img/button-green.png';
-            } else {
-              document.getElementById('value-' + widget_id).src = '/static/img/button-red.png';
-            }
-            document.getElementById('value-' + widget_id).title = "{{_('Value')}}: " + measurement.toFixed(decimal_places);
+            showDataIndicator(widget_id, data[1], decimal_places, invert);
           }
         },
         error: function(jqXHR, textStatus, errorThrown) {
@@ -164,7 +175,7 @@ WIDGET_INFORMATION = {
     }
   }
 
-  // Repeat function for getLastDataIndicator()
+  // Repeat function for getLastDataIndicator(), when the live stream has no recent update
   function repeatLastDataIndicator(widget_id,
                                    dev_id,
                                    measure_type,
@@ -173,7 +184,7 @@ WIDGET_INFORMATION = {
                                    max_measure_age_sec,
                                    decimal_places,
                                    invert) {
-    setInterval(function () {
+    const refresh = function () {
       getLastDataIndicator(widget_id,
                            dev_id,
                            measure_type,
@@ -181,6 +192,20 @@ WIDGET_INFORMATION = {
                            max_measure_age_sec,
                            decimal_places,
                            invert)
+    };
+    const stream_type = measure_type === "output" ? 'output' : 'measurement';
+    const stream_max_age_sec = measure_type === "output" ? 0 : max_measure_age_sec;
+    liveStream.subscribe(stream_type, dev_id + ',' + measurement_id, function (timestamp, value) {
+      if (measure_type === "output") {
+        showOutputStateIndicator(widget_id, value, invert);
+      } else {
+        showDataIndicator(widget_id, value, decimal_places, invert);
+      }
+    }, refresh);
+    setInterval(function () {
+      if (!liveStream.isFresh(stream_type, dev_id + ',' + measurement_id, stream_max_age_sec)) {
+        refresh();
+      }
     }, period_sec * 1000);
   }
 """,
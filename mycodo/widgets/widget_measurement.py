@@ -331,6 +331,29 @@ WIDGET_INFORMATION = {
 """,
 
     'widget_dashboard_js': """
+  // Show a measurement in the Measurement widget
+  function showDataMeasurement(widget_id, timestamp, measurement, decimal_places) {
+    if (decimal_places === null) {
+      decimal_places = 1;
+    }
+    const formattedTime = epoch_to_timestamp(timestamp * 1000);
+    if (document.getElementById('value-' + widget_id)) {
+      document.getElementById('value-' + widget_id).innerHTML = measurement.toFixed(decimal_places);
+    }
+    const range_exists = document.getElementById("range_" + widget_id);
+    if (range_exists != null) {  // Update range slider value
+      if (document.getElementById("range_" + widget_id)) {
+        document.getElementById("range_" + widget_id).value = measurement.toFixed(0);
+      }
+      if (document.getElementById("range_val_" + widget_id)) {
+        document.getElementById("range_val_" + widget_id).innerHTML = measurement.toFixed(0);
+      }
+    }
+    if (document.getElementById('timestamp-' + widget_id)) {
+      document.getElementById('timestamp-' + widget_id).innerHTML = formattedTime;
+    }
+  }
+
   // Retrieve the latest/last measurement for Measurement widget
   function getLastDataMeasurement(widget_id,
                        unique_id,
@@ -354,23 +377,7 @@ WIDGET_INFORMATION = {
           }
         }
         else {
-          const formattedTime = epoch_to_timestamp(data[0] * 1000);
-          const measurement = data[1];
-          if (document.getElementById('value-' + widget_id)) {
-            document.getElementById('value-' + widget_id).innerHTML = measurement.toFixed(decimal_places);
-          }
-          const range_exists = document.getElementById("range_" + widget_id);
-          if (range_exists != null) {  // Update range slider value
-            if (document.getElementById("range_" + widget_id)) {
-              document.getElementById("range_" + widget_id).value = measurement.toFixed(0);
-            }
-            if (document.getElementById("range_val_" + widget_id)) {
-              document.getElementById("range_val_" + widget_id).innerHTML = measurement.toFixed(0);
-            }
-          }
-          if (document.getElementById('timestamp-' + widget_id)) {
-            document.getElementById('timestamp-' + widget_id).innerHTML = formattedTime;
-          }
+          showDataMeasurement(widget_id, data[0], data[1], decimal_places);
         }
       },
       error: function(jqXHR, textStatus, errorThrown) {
@@ -384,7 +391,7 @@ WIDGET_INFORMATION = {
     });
   }
 
-  // Repeat function for getLastData()
+  // Repeat function for getLastData(), when the live stream has no recent update
   function repeatLastDataMeasurement(widget_id,
                           dev_id,
                           measure_type,
@@ -392,13 +399,21 @@ WIDGET_INFORMATION = {
                           period_sec,
                           max_measure_age_sec,
                           decimal_places) {
-    setInterval(function () {
+    const refresh = function () {
       getLastDataMeasurement(widget_id,
                   dev_id,
                   measure_type,
                   measurement_id,
                   max_measure_age_sec,
                   decimal_places)
+    };
+    liveStream.subscribe('measurement', dev_id + ',' + measurement_id, function (timestamp, measurement) {
+      showDataMeasurement(widget_id, timestamp, measurement, decimal_places);
+    }, refresh);
+    setInterval(function () {
+      if (!liveStream.isFresh('measurement', dev_id + ',' + measurement_id, max_measure_age_sec)) {
+        refresh();
+      }
     }, period_sec * 1000);
   }
 """,
@@ -285,6 +285,22 @@ WIDGET_INFORMATION = {
     });
   }
 
+  // Show a measurement of the output
+  function showDataOutput(widget_id, measurement_id, timestamp, measurement, decimal_places) {
+    if (decimal_places === null) {
+      decimal_places = 1;
+    }
+    const formattedTime = epoch_to_timestamp(timestamp * 1000);
+    document.getElementById('value-' + measurement_id).innerHTML = measurement.toFixed(decimal_places);
+
+    const range_exists = document.getElementById("range_" + widget_id);
+    if (range_exists != null) {  // Update range slider value
+      document.getElementById("range_" + widget_id).value = measurement.toFixed(0);
+      document.getElementById("range_val_" + widget_id).innerHTML = measurement.toFixed(0);
+    }
+    document.getElementById('timestamp-' + measurement_id).innerHTML = formattedTime;
+  }
+
   // Retrieve the latest/last measurement for gauges/outputs
   function getLastDataOutput(widget_id,
                        unique_id,
@@ -304,16 +320,7 @@ WIDGET_INFORMATION = {
           document.getElementById('timestamp-' + measurement_id).innerHTML = 'TOO OLD';
         }
         else {
-          const formattedTime = epoch_to_timestamp(data[0] * 1000);
-          const measurement = data[1];
-            document.getElementById('value-' + measurement_id).innerHTML = measurement.toFixed(decimal_places);
-
-            const range_exists = document.getElementById("range_" + widget_id);
-            if (range_exists != null) {  // Update range slider value
-              document.getElementById("range_" + widget_id).value = measurement.toFixed(0);
-              document.getElementById("range_val_" + widget_id).innerHTML = measurement.toFixed(0);
-            }
-          document.getElementById('timestamp-' + measurement_id).innerHTML = formattedTime;
+          showDataOutput(widget_id, measurement_id, data[0], data[1], decimal_places);
         }
       },
       error: function(jqXHR, textStatus, errorThrown) {
@@ -323,7 +330,7 @@ WIDGET_INFORMATION = {
     });
   }
 
-  // Repeat function for getLastData()
+  // Repeat function for getLastData(), when the live stream has no recent update
   function repeatLastDataOutput(widget_id,
                           dev_id,
                           measure_type,
@@ -332,7 +339,7 @@ WIDGET_INFORMATION = {
                           max_measure_age_sec,
                           decimal_places,
                           extra) {
-    setInterval(function () {
+    const refresh = function () {
       getLastDataOutput(widget_id,
                   dev_id,
                   measure_type,
@@ -340,27 +347,39 @@ WIDGET_INFORMATION = {
                   max_measure_age_sec,
                   decimal_places,
                   extra)
+    };
+    liveStream.subscribe('measurement', dev_id + ',' + measurement_id, function (timestamp, measurement) {
+      showDataOutput(widget_id, measurement_id, timestamp, measurement, decimal_places);
+    }, refresh);
+    setInterval(function () {
+      if (!liveStream.isFresh('measurement', dev_id + ',' + measurement_id, max_measure_age_sec)) {
+        refresh();
+      }
     }, period_sec * 1000);
   }
 
+  function showGPIOStateOutput(widget_id, state) {
+    document.getElementById("container-output-" + widget_id).className = "active-background";
+    if (state !== 'off') {
+      if (state === 'on') {
+        document.getElementById("text-output-state-" + widget_id).innerHTML = '({{_('Active')}})';
+      } else {
+        document.getElementById("text-output-state-" + widget_id).innerHTML = '({{_('Active')}}, ' + state.toFixed(1) + '%)';
+      }
+    }
+    else {
+      document.getElementById("container-output-" + widget_id).className = "inactive-background";
+      document.getElementById("text-output-state-" + widget_id).innerHTML = '({{_('Inactive')}})';
+    }
+  }
+
   function getGPIOStateOutput(widget_id, unique_id, channel_id) {
     const url = '/outputstate_unique_id/' + unique_id + '/' + channel_id;
     $.getJSON(url,
       function(state, responseText, jqXHR) {
         if (jqXHR.status !== 204) {
           if (state !== null) {
-            document.getElementById("container-output-" + widget_id).className = "active-background";
-            if (state !== 'off') {
-              if (state === 'on') {
-                document.getElementById("text-output-state-" + widget_id).innerHTML = '({{_('Active')}})';
-              } else {
-                document.getElementById("text-output-state-" + widget_id).innerHTML = '({{_('Active')}}, ' + state.toFixed(1) + '%)';
-              }
-            }
-            else {
-              document.getElementById("container-output-" + widget_id).className = "inactive-background";
-              document.getElementById("text-output-state-" + widget_id).innerHTML = '({{_('Inactive')}})';
-            }
+            showGPIOStateOutput(widget_id, state);
           }
         }
         else {
@@ -371,9 +390,20 @@ WIDGET_INFORMATION = {
     );
   }
 
+  // Output state changes are sent by the live stream, so only poll while it is not connected
   function repeatGPIOStateOutput(widget_id, unique_id, channel_id, refresh_duration) {
-    setInterval(function () {
+    const refresh = function () {
       getGPIOStateOutput(widget_id, unique_id, channel_id);
+    };
+    liveStream.subscribe('output', unique_id + ',' + channel_id, function (timestamp, state) {
+      if (state !== null) {
+        showGPIOStateOutput(widget_id, state);
+      }
+    }, refresh);
+    setInterval(function () {
+      if (!liveStream.isFresh('output', unique_id + ',' + channel_id, 0)) {
+        refresh();
+      }
     }, refresh_duration * 1000);  // Refresh duration in milliseconds
   }
 """,
@@ -230,6 +230,25 @@ WIDGET_INFORMATION = {
     modOutputPWM(cmd_send);
   }
 
+  // Show a measurement of the PWM output
+  function showDataPWMSlider(widget_id, timestamp, measurement, invert_status, decimal_places) {
+    if (decimal_places === null) {
+      decimal_places = 1;
+    }
+    const formattedTime = epoch_to_timestamp(timestamp * 1000);
+    if (invert_status) {
+      measurement = 100 - measurement;
+    }
+    document.getElementById('value-' + widget_id).innerHTML = measurement.toFixed(decimal_places);
+
+    const range_exists = document.getElementById("range_" + widget_id);
+    if (range_exists != null) {  // Update range slider value
+      document.getElementById("range_" + widget_id).value = measurement.toFixed(0);
+      document.getElementById("range_val_" + widget_id).innerHTML = measurement.toFixed(0);
+    }
+    document.getElementById('timestamp-' + widget_id).innerHTML = formattedTime;
+  }
+
   // Retrieve the latest/last measurement for gauges/outputs
   function getLastDataPWMSlider(widget_id,
                        unique_id,
@@ -249,20 +268,7 @@ WIDGET_INFORMATION = {
           document.getElementById('timestamp-' + widget_id).innerHTML = 'MAX AGE EXCEEDED';
         }
         else {
-          const formattedTime = epoch_to_timestamp(data[0] * 1000);
-          let measurement = data[1];
-          
-          if (invert_status) {
-            measurement = 100 - measurement;
-          }          
-          document.getElementById('value-' + widget_id).innerHTML = measurement.toFixed(decimal_places);
-   
-          const range_exists = document.getElementById("range_" + widget_id);
-          if (range_exists != null) {  // Update range slider value
-            document.getElementById("range_" + widget_id).value = measurement.toFixed(0);
-            document.getElementById("range_val_" + widget_id).innerHTML = measurement.toFixed(0);
-          }
-          document.getElementById('timestamp-' + widget_id).innerHTML = formattedTime;
+          showDataPWMSlider(widget_id, data[0], data[1], invert_status, decimal_places);
         }
       },
       error: function(jqXHR, textStatus, errorThrown) {
@@ -272,7 +278,7 @@ WIDGET_INFORMATION = {
     });
   }
 
-  // Repeat function for getLastData()
+  // Repeat function for getLastData(), when the live stream has no recent update
   function repeatLastDataPWMSlider(widget_id,
                           dev_id,
                           measure_type,
@@ -281,7 +287,7 @@ WIDGET_INFORMATION = {
                           max_measure_age_sec,
                           invert_status,
                           decimal_places) {
-    setInterval(function () {
+    const refresh = function () {
       getLastDataPWMSlider(widget_id,
                   dev_id,
                   measure_type,
@@ -289,9 +295,45 @@ WIDGET_INFORMATION = {
                   max_measure_age_sec,
                   invert_status,
                   decimal_places)
+    };
+    liveStream.subscribe('measurement', dev_id + ',' + measurement_id, function (timestamp, measurement) {
+      showDataPWMSlider(widget_id, timestamp, measurement, invert_status, decimal_places);
+    }, refresh);
+    setInterval(function () {
+      if (!liveStream.isFresh('measurement', dev_id + ',' + measurement_id, max_measure_age_sec)) {
+        refresh();
+      }
     }, period_sec * 1000);
   }
   
+  function showGPIOStatePWMSlider(widget_id, state, invert_status, decimal_places) {
+    document.getElementById("container-output-" + widget_id).className = "active-background";
+
+    if (invert_status) {
+      if (state === 100) {
+        document.getElementById("container-output-" + widget_id).className = "inactive-background";
+        document.getElementById("text-output-state-" + widget_id).innerHTML = '({{_('Inactive')}})';
+      } else {
+        if (state === 'off') state = 100;
+        else state = 100 - state;
+        document.getElementById("text-output-state-" + widget_id).innerHTML = '({{_('Active')}}, ' + state.toFixed(decimal_places) + '%)';
+      }
+    }
+    else {
+      if (state !== 'off') {
+        if (state === 'on') {
+          document.getElementById("text-output-state-" + widget_id).innerHTML = '({{_('Active')}})';
+        } else {
+          document.getElementById("text-output-state-" + widget_id).innerHTML = '({{_('Active')}}, ' + state.toFixed(decimal_places) + '%)';
+        }
+      }
+      else {
+        document.getElementById("container-output-" + widget_id).className = "inactive-background";
+        document.getElementById("text-output-state-" + widget_id).innerHTML = '({{_('Inactive')}})';
+      }
+    }
+  }
+
   function getGPIOStatePWMSlider(widget_id, unique_id, channel_id, invert_status, decimal_places) {
     if (decimal_places === null) {
       decimal_places = 1;
@@ -301,32 +343,7 @@ WIDGET_INFORMATION = {
       function(state, responseText, jqXHR) {
         if (jqXHR.status !== 204) {
           if (state !== null) {
-            document.getElementById("container-output-" + widget_id).className = "active-background";
-            
-            if (invert_status) {
-              if (state === 100) {
-                document.getElementById("container-output-" + widget_id).className = "inactive-background";
-                document.getElementById("text-output-state-" + widget_id).innerHTML = '({{_('Inactive')}})';
-              } else {
-                if (state === 'off') state = 100;
-                else state = 100 - state;
-                document.getElementById("text-output-state-" + widget_id).innerHTML = '({{_('Active')}}, ' + state.toFixed(decimal_places) + '%)';
-              }
-            }
-            else {
-              if (state !== 'off') {
-                if (state === 'on') {
-                  document.getElementById("text-output-state-" + widget_id).innerHTML = '({{_('Active')}})';
-                } else {
-                  document.getElementById("text-output-state-" + widget_id).innerHTML = '({{_('Active')}}, ' + state.toFixed(decimal_places) + '%)';
-                }
-              }
-              else {
-                document.getElementById("container-output-" + widget_id).className = "inactive-background";
-                document.getElementById("text-output-state-" + widget_id).innerHTML = '({{_('Inactive')}})';
-              }
-            }
-
+            showGPIOStatePWMSlider(widget_id, state, invert_status, decimal_places);
           }
         }
         else {
@@ -337,9 +354,20 @@ WIDGET_INFORMATION = {
     );
   }
 
+  // Output state changes are sent by the live stream, so only poll while it is not connected
   function repeatGPIOStatePWMSlider(widget_id, unique_id, channel_id, refresh_seconds, invert_status, decimal_places) {
-    setInterval(function () {
+    const refresh = function () {
       getGPIOStatePWMSlider(widget_id, unique_id, channel_id, invert_status, decimal_places);
+    };
+    liveStream.subscribe('output', unique_id + ',' + channel_id, function (timestamp, state) {
+      if (state !== null) {
+        showGPIOStatePWMSlider(widget_id, state, invert_status, decimal_places === null ? 1 : decimal_places);
+      }
+    }, refresh);
+    setInterval(function () {
+      if (!liveStream.isFresh('output', unique_id + ',' + channel_id, 0)) {
+        refresh();
+      }
     }, refresh_seconds * 1000);  // Refresh duration in milliseconds
   }
 """,